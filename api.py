@@ -3,11 +3,20 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
 from supabase import create_client, Client
-from main import scrape_pricecharting, parse_sales_for_grade, parse_pop_report, fetch
+import http_client
+from main import scrape_pricecharting, extract_product_page, fetch_tree
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Interactive lookups: a few concurrent requests shouldn't queue behind the batch
+# scrapers' 0.5 req/s default. A product costs 1-3 requests (search, page, pop).
+API_REQUEST_RATE = 5.0
+API_REQUEST_BURST = 10
+
+# "Scrape now" must see the live page, never a cached copy (even if HTTP_CACHE is set)
+http_client.configure(rate=API_REQUEST_RATE, burst=API_REQUEST_BURST, cache=False)
+
 # Supabase connection
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -107,6 +116,20 @@ def save_graded_sales(product_id, scraped_data):
         return False, str(e)
 
 
+def refresh_graded_prices(product_id):
+    """
+    Reprice the product inside Postgres (graded_prices and graded_price_state,
+    sql/008 refresh_graded_prices) so sales saved here reach the prices.
+    Returns (success, error message or None).
+    """
+    try:
+        supabase.rpc("refresh_graded_prices", {"p_product_ids": [product_id]}).execute()
+        return True, None
+    except Exception as e:
+        print(f"❌ Error refreshing graded prices for {product_id}: {e}")
+        return False, str(e)
+
+
 def update_product_data(product_id, pop_count, pricecharting_url):
     """Update the products table with pop_count and pricecharting_url."""
     try:
@@ -149,7 +172,7 @@ def scrape_product_internal(product_data):
     try:
         # If we already have a pricecharting_url, use it directly
         if pricecharting_url:
-            soup = fetch(pricecharting_url)
+            tree = fetch_tree(pricecharting_url)
 
             result = {
                 "product_url": pricecharting_url,
@@ -164,11 +187,11 @@ def scrape_product_internal(product_data):
                 "completed-auctions-manual-only": "PSA 10"
             }
 
+            page = extract_product_page(tree)
             for css_class, grade in grade_tabs.items():
-                sales = parse_sales_for_grade(pricecharting_url, css_class, soup=soup)
-                result["grades"][grade] = sales
+                result["grades"][grade] = page["sales"].get(css_class, [])
 
-            result["pop_report"] = parse_pop_report(pricecharting_url, soup=soup)
+            result["pop_report"] = page["pop_report"]
 
         else:
             # Need to search for the product first
@@ -188,9 +211,12 @@ def scrape_product_internal(product_data):
 
         # Save to database
         sales_success, sales_count = save_graded_sales(product_id, result)
+        prices_refreshed, refresh_error = False, None
+        if sales_success and sales_count:
+            prices_refreshed, refresh_error = refresh_graded_prices(product_id)
         product_success = update_product_data(product_id, result.get("pop_report", {}), result.get("product_url"))
 
-        return {
+        response = {
             "success": True,
             "variant_key": variant_key,
             "product_id": product_id,
@@ -198,10 +224,15 @@ def scrape_product_internal(product_data):
             "stats": {
                 "total_sales": total_sales,
                 "pop_grades": pop_count,
-                "sales_saved": sales_count if isinstance(sales_count, int) else 0
+                "sales_saved": sales_count if isinstance(sales_count, int) else 0,
+                "prices_refreshed": prices_refreshed
             },
             "pricecharting_url": result.get("product_url")
         }
+        # Sales are saved, so the scrape succeeded; the prices catch up on the next refresh
+        if refresh_error:
+            response["warning"] = f"Sales saved but graded prices were not refreshed: {refresh_error}"
+        return response
 
     except Exception as e:
         return {
@@ -249,7 +280,8 @@ def scrape_product_api(variant_key):
         "stats": {
             "total_sales": 45,
             "pop_grades": 10,
-            "sales_saved": 45
+            "sales_saved": 45,
+            "prices_refreshed": true
         },
         "pricecharting_url": "https://..."
     }
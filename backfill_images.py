@@ -14,14 +14,13 @@ Usage:
 
 import os
 import argparse
-import time
-import random
 import concurrent.futures
 import logging
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import requests
-from bs4 import BeautifulSoup
+import http_client
+from bulk_writes import bulk_update
+from main import parse_product_html
 
 # Load environment variables from .env file
 load_dotenv()
@@ -39,29 +38,18 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Global session for connection reuse
-session = requests.Session()
 
-
-def fetch_page(url, retries=3):
-    """Fetch HTML content from the given URL with retries."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-
-    for i in range(retries):
-        try:
-            response = session.get(url, headers=headers, timeout=20)
-            if response.status_code == 404:
-                return None
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            logger.warning(f"Attempt {i+1} failed for {url}: {e}")
-            time.sleep(2 * (i + 1))
-
-    logger.error(f"Failed to fetch {url} after {retries} attempts")
-    return None
+def fetch_page(url):
+    """Fetch HTML content through the shared client (pooled, rate-limited, retried)."""
+    try:
+        response = http_client.get(url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        logger.error(f"Failed to fetch {url}: {e}")
+        return None
 
 
 def scrape_image_url(pricecharting_url):
@@ -70,7 +58,7 @@ def scrape_image_url(pricecharting_url):
     if not html:
         return None
 
-    soup = BeautifulSoup(html, "lxml")
+    soup = parse_product_html(html, restricted=("images",))
 
     # Try primary selector: div.cover img
     img = soup.select_one('div.cover img')
@@ -134,9 +122,6 @@ def process_product(product, idx, total):
     number = product.get("number", "")
     url = product["pricecharting_url"]
 
-    # Random delay to avoid burst patterns
-    time.sleep(random.uniform(0.5, 1.5))
-
     display_name = f"{name} #{number}" if number else name
     logger.info(f"[{idx}/{total}] Scraping image for: {display_name}")
 
@@ -155,17 +140,12 @@ def update_products_batch(updates):
     if not updates:
         return 0
 
-    success_count = 0
-    for update in updates:
-        try:
-            supabase.table("products").update({
-                "image": update["image"]
-            }).eq("id", update["id"]).execute()
-            success_count += 1
-        except Exception as e:
-            logger.error(f"Error updating product {update['id']}: {e}")
-
-    return success_count
+    rows = [{"id": update["id"], "image": update["image"]} for update in updates]
+    try:
+        return bulk_update(supabase, "products", rows)
+    except Exception as e:
+        logger.error(f"Error updating {len(rows)} products: {e}")
+        return 0
 
 
 def main():
@@ -173,13 +153,16 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Preview without updating")
     parser.add_argument("--limit", type=int, default=None, help="Maximum products to process")
     parser.add_argument("--batch-size", type=int, default=50, help="Products per batch before writing")
-    parser.add_argument("--delay", type=float, default=2.0, help="Delay between requests (seconds)")
+    parser.add_argument("--delay", type=float, default=2.0, help="Starting delay between requests per worker (seconds); adapts to upstream health")
     parser.add_argument("--workers", type=int, default=3, help="Number of parallel workers")
     args = parser.parse_args()
 
+    # Workers share one rate limit: each still averages one request per --delay
+    http_client.configure(rate=args.workers / args.delay, pool_size=max(args.workers, 1))
+
     logger.info("🖼️  Starting Image Backfill...")
     logger.info(f"   Batch size: {args.batch_size}")
-    logger.info(f"   Delay: {args.delay}s")
+    logger.info(f"   Delay: {args.delay}s per worker ({args.workers / args.delay:.2f} requests/s total)")
     logger.info(f"   Workers: {args.workers}")
     if args.limit:
         logger.info(f"   Limit: {args.limit} products")
@@ -201,7 +184,6 @@ def main():
 
     def process_wrapper(args_tuple):
         product, idx, total = args_tuple
-        time.sleep(random.uniform(0.5, args.delay))
         return process_product(product, idx, len(products))
 
     # Use thread pool for parallel processing
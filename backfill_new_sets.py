@@ -15,14 +15,14 @@ import os
 import argparse
 import time
 import re
-import random
 import concurrent.futures
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import requests
-from bs4 import BeautifulSoup
+import http_client
+from main import parse_product_html
+from scrape_helpers import fetch_page, parse_price, scrape_set_cards_list, parse_card_name_number
 
 # Load environment variables from .env file
 load_dotenv()
@@ -40,144 +40,10 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Global session for connection reuse
-session = requests.Session()
-
-
-def fetch_page(url, retries=3):
-    """Fetch HTML content from the given URL with retries."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-
-    # Rate limiting
-    time.sleep(2)
-
-    for i in range(retries):
-        try:
-            response = session.get(url, headers=headers, timeout=20)
-            if response.status_code == 404:
-                return None
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            logger.warning(f"Attempt {i+1} failed for {url}: {e}")
-            time.sleep(2 * (i + 1))
-
-    logger.error(f"Failed to fetch {url} after {retries} attempts")
-    return None
-
-
-def parse_price(price_str):
-    """Clean and convert price string to float. Returns None if invalid."""
-    if not price_str:
-        return None
-    clean_str = re.sub(r'[^\d.]', '', price_str)
-    if not clean_str:
-        return None
-    try:
-        return float(clean_str)
-    except ValueError:
-        return None
-
-
-def scrape_set_cards_list(set_url):
-    """Scrape the list of cards from a set page, handling pagination."""
-    all_cards = []
-    cursor = None
-    page = 1
-
-    while True:
-        if page == 1:
-            logger.info(f"Fetching page {page} for {set_url}")
-            html = fetch_page(set_url)
-        else:
-            if not cursor:
-                break
-            logger.info(f"Fetching page {page} (cursor: {cursor})")
-            try:
-                time.sleep(2)
-                response = session.post(set_url, data={"cursor": cursor}, headers={
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                }, timeout=20)
-                if response.status_code != 200:
-                    logger.warning(f"Failed to fetch page {page}: Status {response.status_code}")
-                    break
-                html = response.text
-            except Exception as e:
-                logger.error(f"Error fetching page {page}: {e}")
-                break
-
-        if not html:
-            break
-
-        soup = BeautifulSoup(html, "lxml")
-
-        # Try different table selectors
-        table = soup.find("table", id="games_table")
-        if not table:
-            table = soup.find("table", class_="hover_table")
-
-        if not table:
-            if page == 1:
-                logger.warning(f"Could not find card table for {set_url}")
-            break
-
-        # Parse rows
-        rows = table.find_all("tr")
-        current_page_cards = []
-
-        for row in rows:
-            # Extract Product ID
-            product_id = row.get("data-product")
-            if not product_id:
-                row_id = row.get("id", "")
-                if row_id.startswith("product-"):
-                    product_id = row_id.replace("product-", "")
-
-            if not product_id:
-                continue
-
-            # Extract Title and URL
-            title_cell = row.find("td", class_="title")
-            if not title_cell:
-                continue
-
-            link = title_cell.find("a")
-            if not link:
-                continue
-
-            name = link.text.strip()
-            href = link.get("href")
-            if not href:
-                continue
-
-            full_url = "https://www.pricecharting.com" + href
-
-            # Extract Price (Ungraded)
-            price_cell = row.select_one("td.used_price .js-price")
-            price_str = price_cell.text.strip() if price_cell else None
-            price = parse_price(price_str)
-
-            current_page_cards.append({
-                "product_id": int(product_id),
-                "name": name,
-                "url": full_url,
-                "price": price
-            })
-
-        logger.info(f"Page {page}: Found {len(current_page_cards)} cards.")
-        all_cards.extend(current_page_cards)
-
-        # Check for cursor for next page
-        cursor_input = soup.find("input", {"name": "cursor"})
-        if cursor_input:
-            cursor = cursor_input.get("value")
-            page += 1
-        else:
-            break
-
-    return all_cards
+# Starting request rate shared by all worker threads (the old per-call
+# sleep(2) plus jitter across 3 workers came out at roughly this); http_client
+# adapts it to how PriceCharting is responding
+REQUEST_RATE = 1.0
 
 
 def scrape_card_details(card_url):
@@ -186,7 +52,8 @@ def scrape_card_details(card_url):
     if not html:
         return None
 
-    soup = BeautifulSoup(html, "lxml")
+    # Only #itemdetails, the price table and the cover image are read here
+    soup = parse_product_html(html, restricted=("details", "images"))
     data = {}
 
     # 1. Product ID
@@ -234,23 +101,10 @@ def scrape_card_details(card_url):
     return data
 
 
-def parse_card_name_number(full_name):
-    """Split name into name and number (after #)."""
-    if "#" in full_name:
-        parts = full_name.rsplit("#", 1)
-        name = parts[0].strip()
-        number = parts[1].strip()
-        return name, number
-    return full_name, None
-
-
 def process_card(group_id, card, i, total):
     """Process a single card - scrape details and prepare for database."""
     card_url = card["url"]
 
-    # Random sleep to avoid burst patterns
-    time.sleep(random.uniform(0.5, 1.5))
-
     logger.info(f"[{i}/{total}] Scraping: {card['name']}")
     details = scrape_card_details(card_url)
 
@@ -437,6 +291,7 @@ def main():
     args = parser.parse_args()
 
     logger.info("Starting New Set Card Backfill...")
+    http_client.configure(rate=REQUEST_RATE)
 
     if args.set_id:
         response = (
@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 """
 Backfill PSA population counts for all products that already have a pricecharting_url.
-Fetches pop data from PriceCharting and writes it directly to graded_prices.psa_pop.
+Fetches pop data from PriceCharting and writes it directly to graded_prices.psa_pop,
+then snapshots changed counts into graded_price_history (sql/011).
 """
 
 import os
-import time
 import argparse
 from supabase import create_client, Client
 from dotenv import load_dotenv
+import http_client
+from bulk_writes import bulk_update
 from main import parse_pop_report_table
 
 load_dotenv()
@@ -52,32 +54,40 @@ def fetch_already_done_ids():
     return done
 
 
-def upsert_pop_for_product(product_id, pop_report):
+def pop_rows_for_product(product_id, pop_report):
+    """graded_prices psa_pop updates for one product's PSA 7-10 pop counts."""
+    return [
+        {"product_id": product_id, "grade": grade, "psa_pop": psa_pop}
+        for grade, psa_pop in (pop_report or {}).items()
+        if grade in (7, 8, 9, 10)
+    ]
+
+
+def save_pop_rows(rows):
     """Update psa_pop on existing graded_prices rows only (don't insert new rows)."""
-    if not pop_report:
+    if not rows:
         return 0
+    return bulk_update(supabase, "graded_prices", rows, key_columns=("product_id", "grade"))
 
-    count = 0
-    for grade, psa_pop in pop_report.items():
-        if grade not in (7, 8, 9, 10):
-            continue
-        supabase.table("graded_prices") \
-            .update({"psa_pop": psa_pop}) \
-            .eq("product_id", product_id) \
-            .eq("grade", grade) \
-            .execute()
-        count += 1
 
-    return count
+def record_pop_history(rows):
+    """Append graded_price_history snapshots for the products whose pop counts moved."""
+    product_ids = list(dict.fromkeys(row["product_id"] for row in rows))
+    if not product_ids:
+        return 0
+    return supabase.rpc("record_graded_price_history", {"p_product_ids": product_ids}).execute().data or 0
 
 
 def main():
     parser = argparse.ArgumentParser(description="Backfill PSA pop counts from PriceCharting")
-    parser.add_argument("--delay", type=float, default=1.0, help="Delay between requests (seconds)")
+    parser.add_argument("--delay", type=float, default=1.0, help="Starting delay between requests (seconds); adapts to upstream health")
     parser.add_argument("--max", type=int, default=None, help="Max products to process")
     parser.add_argument("--offset", type=int, default=0, help="Starting offset into the products list (for parallel jobs)")
     args = parser.parse_args()
 
+    # parse_pop_report_table fetches through the shared client, so this paces every request
+    http_client.configure(rate=1 / args.delay)
+
     print("🚀 PSA Pop Backfill")
     print(f"   Delay: {args.delay}s | Offset: {args.offset} | Max: {args.max or 'unlimited'}")
     print("   Fetching already-completed products...")
@@ -89,6 +99,7 @@ def main():
     skipped = 0
     offset = args.offset
     batch_size = 200
+    pending_rows = []  # psa_pop updates, written once per page of products
 
     while True:
         if args.max and total >= args.max:
@@ -117,8 +128,9 @@ def main():
             try:
                 pop = parse_pop_report_table(url)
                 if pop:
-                    count = upsert_pop_for_product(product_id, pop)
-                    print(f"   ✅ Pop: {pop} → saved {count} grade records")
+                    rows = pop_rows_for_product(product_id, pop)
+                    pending_rows.extend(rows)
+                    print(f"   ✅ Pop: {pop} → queued {len(rows)} grade records")
                     updated += 1
                 else:
                     print(f"   ⚠️  No pop data found")
@@ -127,9 +139,20 @@ def main():
                 print(f"   ❌ Error: {e}")
                 skipped += 1
 
-            time.sleep(args.delay)
             print()
 
+        try:
+            saved = save_pop_rows(pending_rows)
+            print(f"💾 Saved {saved} grade records")
+            try:
+                recorded = record_pop_history(pending_rows)
+                print(f"📈 Recorded {recorded} history snapshots\n")
+            except Exception as e:
+                print(f"   ⚠️  Pop saved, but recording graded_price_history failed: {e}\n")
+        except Exception as e:
+            print(f"   ❌ Error saving {len(pending_rows)} grade records: {e}\n")
+        pending_rows = []
+
         offset += batch_size
 
     print("=" * 50)
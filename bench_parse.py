@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark product-page parsing against saved PriceCharting HTML.
+
+Compares three ways of getting sales + POP data out of a /game/ page:
+  1. full BeautifulSoup tree, parse_sales_for_grade once per grade tab (old path)
+  2. restricted BeautifulSoup tree (sales + pop regions only), same per-grade parsers
+  3. lxml tree, extract_product_page single XPath pass (what the scrapers use)
+
+All modes must produce identical output; the script exits non-zero if they don't.
+
+Usage:
+    curl -A "Mozilla/5.0" -o charizard.html https://www.pricecharting.com/game/pokemon-base-set/charizard-4
+    python bench_parse.py charizard.html
+    python bench_parse.py pages/*.html --iterations 50
+"""
+
+import sys
+import time
+import argparse
+from main import (GRADE_TABS, parse_sales_for_grade, parse_pop_report, parse_product_html,
+                  parse_product_tree, extract_product_page)
+
+
+def per_grade(html, restricted=False):
+    soup = parse_product_html(html, restricted=("sales", "pop") if restricted else False)
+    sales = {css_class: parse_sales_for_grade("", css_class, soup=soup) for css_class in GRADE_TABS}
+    return sales, parse_pop_report("", soup=soup)
+
+
+def single_pass(html):
+    page = extract_product_page(parse_product_tree(html))
+    sales = {css_class: page["sales"].get(css_class, []) for css_class in GRADE_TABS}
+    return sales, page["pop_report"]
+
+
+MODES = [
+    ("full soup, per-grade", per_grade),
+    ("restricted soup, per-grade", lambda html: per_grade(html, restricted=True)),
+    ("lxml, single pass", single_pass),
+]
+
+
+def time_mode(fn, pages, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for html in pages:
+            fn(html)
+    return (time.perf_counter() - start) / (iterations * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark product-page parsing modes")
+    parser.add_argument("html_files", nargs="+", help="Saved /game/ page HTML files")
+    parser.add_argument("--iterations", type=int, default=20, help="Passes over all pages per mode")
+    args = parser.parse_args()
+
+    pages = []
+    for path in args.html_files:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+
+    print(f"📄 {len(pages)} page(s), {sum(len(p) for p in pages) / len(pages) / 1024:.0f} KiB average")
+
+    # Correctness first: every mode must agree with the original per-grade parser
+    for path, html in zip(args.html_files, pages):
+        expected = MODES[0][1](html)
+        for label, fn in MODES[1:]:
+            if fn(html) != expected:
+                print(f"❌ {label} output differs from per-grade parsing for {path}")
+                sys.exit(1)
+    print("✅ All modes produce identical sales and POP output\n")
+
+    baseline = None
+    for label, fn in MODES:
+        per_page = time_mode(fn, pages, args.iterations)
+        baseline = baseline or per_page
+        print(f"   {label:<26} {per_page * 1000:8.2f} ms/page   {baseline / per_page:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark graded-price computation on synthetic sales.
+
+Compares two ways of pricing every (product_id, grade) in a batch of sales:
+  1. group in Python, calculate_market_price once per group (old path)
+  2. pricing_engine.market_prices, grouped NumPy reductions (what process_db uses)
+The grouped reductions alone (sales already in arrays) are timed separately, since
+most of market_prices' time goes into reading the row dicts.
+
+Both must agree to floating-point tolerance; the script exits non-zero if they don't.
+
+Usage:
+    python bench_pricing.py                      # 1M sales
+    python bench_pricing.py --sales 200000 --products 5000
+"""
+
+import sys
+import time
+import random
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+
+from pricing_engine import SalesArrays, calculate_market_price, grouped_market_prices, market_prices
+
+GRADES = [7, 8, 9, 10]
+RELATIVE_TOLERANCE = 1e-9
+
+
+def synthetic_sales(n_sales, n_products, seed=0):
+    """Sales spread over ~3 years, with a few zero prices and bad dates like real data has."""
+    rng = random.Random(seed)
+    start = date(2022, 1, 1)
+    product_ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(n_products)]
+    base_prices = [rng.lognormvariate(3, 1.5) for _ in range(n_products)]
+
+    sales = []
+    for _ in range(n_sales):
+        p = rng.randrange(n_products)
+        grade = rng.choice(GRADES)
+        price = round(base_prices[p] * grade / 10 * rng.lognormvariate(0, 0.2), 2)
+        if rng.random() < 0.001:
+            price = 0
+        sale_date = (start + timedelta(days=rng.randrange(1100))).isoformat()
+        if rng.random() < 0.0005:
+            sale_date = "not a date"
+        sales.append({"product_id": product_ids[p], "grade": grade, "sale_date": sale_date, "price": price})
+    return sales
+
+
+def reference(sales):
+    groups = defaultdict(list)
+    for sale in sales:
+        groups[(sale["product_id"], sale["grade"])].append(sale)
+    return {key: calculate_market_price(group) for key, group in groups.items()}
+
+
+def mismatches(expected, actual):
+    if expected.keys() != actual.keys():
+        return ["group keys differ"]
+    problems = []
+    for key, want in expected.items():
+        got = actual[key]
+        if got["sample_size"] != want["sample_size"]:
+            problems.append(f"{key}: sample_size {got['sample_size']} != {want['sample_size']}")
+        elif abs(got["price"] - want["price"]) > RELATIVE_TOLERANCE * max(1.0, abs(want["price"])):
+            problems.append(f"{key}: price {got['price']!r} != {want['price']!r}")
+    return problems
+
+
+def timed(fn, sales, iterations):
+    best = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn(sales)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark graded-price computation")
+    parser.add_argument("--sales", type=int, default=1_000_000, help="Number of synthetic sales")
+    parser.add_argument("--products", type=int, default=50_000, help="Number of distinct products")
+    parser.add_argument("--iterations", type=int, default=3, help="Runs per mode (best is reported)")
+    args = parser.parse_args()
+
+    sales = synthetic_sales(args.sales, args.products)
+    print(f"🧾 {len(sales):,} sales across {args.products:,} products")
+
+    expected, reference_seconds = timed(reference, sales, args.iterations)
+    actual, engine_seconds = timed(market_prices, sales, args.iterations)
+    arrays = SalesArrays.from_sales(sales)
+    _, reduce_seconds = timed(grouped_market_prices, arrays, args.iterations)
+
+    problems = mismatches(expected, actual)
+    if problems:
+        print(f"❌ market_prices differs from calculate_market_price for {len(problems)} groups:")
+        for problem in problems[:10]:
+            print(f"   {problem}")
+        sys.exit(1)
+    print(f"✅ {len(expected):,} groups match to {RELATIVE_TOLERANCE:g} relative tolerance\n")
+
+    print(f"   {'per-group calculate_market_price':<34} {reference_seconds:8.3f} s   1.0x")
+    print(f"   {'market_prices (NumPy)':<34} {engine_seconds:8.3f} s   {reference_seconds / engine_seconds:5.1f}x")
+    print(f"   {'  grouped reductions only':<34} {reduce_seconds:8.3f} s   {reference_seconds / reduce_seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
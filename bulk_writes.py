@@ -0,0 +1,48 @@
+"""
+Keyed bulk updates through the bulk_update RPC (sql/003_bulk_update.sql).
+
+PostgREST can only update rows matching one filter per request, so writing a
+batch used to cost one request per row. bulk_update() sends many keyed row
+updates per request instead:
+
+    from bulk_writes import bulk_update
+
+    bulk_update(supabase, "products", [{"id": pid, "image": url}, ...])
+    bulk_update(supabase, "graded_prices", rows, key_columns=("product_id", "grade"))
+
+Only the columns present in a row are written. Rows with different column sets
+are sent in separate calls, and a later row with the same key replaces an earlier
+one. Updates only - rows with no match are not inserted.
+"""
+
+from collections import OrderedDict
+
+DEFAULT_CHUNK_SIZE = 500   # rows per RPC call (keeps request bodies well under PostgREST limits)
+
+
+def bulk_update(client, table, rows, key_columns=("id",), chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Apply keyed updates to `table`. Returns the number of rows updated.
+    Raises on the first failed call (rows in earlier calls stay written).
+    """
+    key_columns = list(key_columns)
+
+    # Last update per key wins; group by column set so each call has uniform rows
+    by_key = OrderedDict()
+    for row in rows:
+        by_key[tuple(row[k] for k in key_columns)] = row
+
+    groups = OrderedDict()
+    for row in by_key.values():
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    updated = 0
+    for group_rows in groups.values():
+        for i in range(0, len(group_rows), chunk_size):
+            response = client.rpc("bulk_update", {
+                "p_table": table,
+                "p_key_columns": key_columns,
+                "p_rows": group_rows[i:i + chunk_size],
+            }).execute()
+            updated += response.data or 0
+    return updated
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Check graded_price_aggregates (Postgres, sql/008_graded_price_functions.sql)
+against pricing_engine (Python reference).
+
+For each product, the full graded_sales history is read and priced per grade in
+Python, and the same products are priced by the RPC; every (product_id, grade)
+must agree on sample_size and, to --tolerance (relative), on every price column
+refresh_graded_prices writes: market_price / market_price_7d / market_price_90d
+(calculate_market_price at each of HALF_LIVES) and price_trend (PriceState.trend).
+Exits non-zero on any mismatch.
+
+Run against a local stack before applying pricing changes to production:
+    supabase start && supabase db reset        # applies sql/ migrations
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=<service key> python check_price_parity.py
+
+Usage:
+    python check_price_parity.py                          # 50 products with prices
+    python check_price_parity.py --sample 500
+    python check_price_parity.py --product-ids <uuid> <uuid>
+
+The Python side measures sale age in local time, the RPC in UTC; run on a UTC host.
+"""
+
+import os
+import sys
+import math
+import argparse
+from collections import defaultdict
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+from pricing_engine import (
+    HALF_LIVES, SalesArrays, calculate_market_price, column_suffix, grouped_price_state,
+)
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+if not SUPABASE_URL or not SUPABASE_KEY:
+    raise ValueError("Please set SUPABASE_URL and SUPABASE_KEY environment variables")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# graded_prices columns compared, besides sample_size
+PRICE_COLUMNS = [f"market_price{column_suffix(h)}" for h in HALF_LIVES] + ["price_trend"]
+
+
+def sample_product_ids(count):
+    """The first `count` products (by id) that have graded prices."""
+    product_ids = []
+    cursor = None
+    while len(product_ids) < count:
+        query = supabase.table("graded_prices").select("product_id").order("product_id").limit(1000)
+        if cursor:
+            query = query.gt("product_id", cursor)
+        rows = query.execute().data or []
+        if not rows:
+            break
+        for row in rows:
+            if row["product_id"] not in product_ids:
+                product_ids.append(row["product_id"])
+        cursor = rows[-1]["product_id"]
+    return product_ids[:count]
+
+
+def python_prices(product_id):
+    """{(product_id, grade): {column: value}} from the product's full history."""
+    sales = []
+    page_size = 1000
+    offset = 0
+    while True:
+        rows = (
+            supabase.table("graded_sales")
+            .select("product_id, grade, sale_date, price, ebay_url")
+            .eq("product_id", product_id)
+            .order("sale_date").order("price").order("ebay_url")
+            .range(offset, offset + page_size - 1)
+            .execute()
+        ).data or []
+        sales.extend(rows)
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+    groups = defaultdict(list)
+    for sale in sales:
+        if sale.get("grade") and sale.get("price") is not None:  # grade 0 (Ungraded) isn't priced
+            groups[(sale["product_id"], sale["grade"])].append(sale)
+    if not groups:
+        return {}
+
+    prices = {}
+    for key, group in groups.items():
+        prices[key] = {"sample_size": calculate_market_price(group)["sample_size"]}
+        for half_life in HALF_LIVES:
+            prices[key][f"market_price{column_suffix(half_life)}"] = \
+                calculate_market_price(group, half_life=half_life)["price"]
+
+    arrays = SalesArrays.from_sales([sale for group in groups.values() for sale in group])
+    for key, trend in zip(arrays.keys, grouped_price_state(arrays).trend().tolist()):
+        prices[key]["price_trend"] = None if math.isnan(trend) else trend
+    return prices
+
+
+def database_prices(product_ids):
+    rows = supabase.rpc("graded_price_aggregates", {"p_product_ids": product_ids}).execute().data or []
+    return {
+        (row["product_id"], row["grade"]): {column: row[column] for column in ["sample_size", *PRICE_COLUMNS]}
+        for row in rows
+    }
+
+
+def compare(expected, actual, tolerance):
+    problems = []
+    for key in sorted(expected.keys() | actual.keys()):
+        want, got = expected.get(key), actual.get(key)
+        if want is None or got is None:
+            problems.append(f"{key}: only in {'database' if want is None else 'Python'}")
+        elif got["sample_size"] != want["sample_size"]:
+            problems.append(f"{key}: sample_size {got['sample_size']} != {want['sample_size']}")
+        else:
+            for column in PRICE_COLUMNS:
+                if got[column] is None or want[column] is None:
+                    mismatch = got[column] is not want[column]
+                else:
+                    mismatch = abs(got[column] - want[column]) > tolerance * max(1.0, abs(want[column]))
+                if mismatch:
+                    problems.append(f"{key}: {column} {got[column]!r} != {want[column]!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare database-side graded prices with calculate_market_price")
+    parser.add_argument("--product-ids", nargs="+", default=None, help="Products to check (default: a sample)")
+    parser.add_argument("--sample", type=int, default=50, help="Products to sample when --product-ids isn't given")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="Allowed relative price difference")
+    args = parser.parse_args()
+
+    product_ids = args.product_ids or sample_product_ids(args.sample)
+    print(f"🔍 Checking {len(product_ids)} products")
+
+    problems = []
+    groups = 0
+    for i in range(0, len(product_ids), 50):
+        chunk = product_ids[i:i + 50]
+        expected = {}
+        for product_id in chunk:
+            expected.update(python_prices(product_id))
+        groups += len(expected)
+        problems.extend(compare(expected, database_prices(chunk), args.tolerance))
+
+    if problems:
+        print(f"❌ {len(problems)} of {groups} groups differ:")
+        for problem in problems[:20]:
+            print(f"   {problem}")
+        sys.exit(1)
+    print(f"✅ {groups} groups match to {args.tolerance:g} relative tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
 Export Supabase data to BankTCG app format
 
 This script:
-1. Fetches data from Supabase (products, groups, graded_prices)
+1. Fetches data from Supabase (products, groups, graded_prices, graded_price_history)
 2. Reads image URLs from original BankTCG source data
 3. Converts to your app's JSON format with images
 4. Writes to BankTCG assets folder
@@ -15,6 +15,7 @@ import os
 import json
 import re
 import argparse
+from datetime import datetime, timedelta, timezone
 from supabase import create_client
 from dotenv import load_dotenv
 
@@ -67,8 +68,27 @@ def create_variant_key(series_name, card_number):
         return slug
 
 
-def export_to_app_format(game="pokemon"):
-    """Export data in BankTCG app format for the given game."""
+def fetch_price_history(product_ids, history_days, history_points):
+    """
+    {product_id: {grade: [[date, price, pop], ...]}} from graded_price_history,
+    at most history_points snapshots per grade from the last history_days days.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=history_days)).isoformat()
+    history = {}
+    batch_size = 200
+    for i in range(0, len(product_ids), batch_size):
+        rows = supabase.rpc("graded_price_history_series", {
+            "p_product_ids": product_ids[i:i + batch_size],
+            "p_since": since,
+            "p_max_points": history_points,
+        }).execute().data or []
+        for row in rows:
+            history.setdefault(row['product_id'], {})[row['grade']] = row['points']
+    return history
+
+
+def export_to_app_format(game="pokemon", history_days=365, history_points=52):
+    """Export data in BankTCG app format for the given game (history_points=0 skips price history)."""
     config = GAME_CONFIGS[game]
     category_id = config["category_id"]
     output_path = config["output"]
@@ -131,6 +151,11 @@ def export_to_app_format(game="pokemon"):
                 'psa_pop': price.get('psa_pop'),
             }
 
+        # Compact price history series (one JSON array per grade, built in the database)
+        history_lookup = {}
+        if history_points:
+            history_lookup = fetch_price_history(product_ids, history_days, history_points)
+
         # Fetch graded sales in smaller batches to avoid statement timeout
         sales_data = []
         sales_batch_size = 30
@@ -198,6 +223,11 @@ def export_to_app_format(game="pokemon"):
             if product_sales:
                 card["grade_sales"] = {str(k): v for k, v in product_sales.items()}
 
+            # Add price history snapshots (only when present): {"10": [[date, price, pop], ...]}
+            product_history = history_lookup.get(product_id)
+            if product_history:
+                card["grade_history"] = {str(k): v for k, v in product_history.items()}
+
             cards.append(card)
 
         # Add to output
@@ -247,5 +277,17 @@ if __name__ == "__main__":
         default="pokemon",
         help="Which game to export (default: pokemon)",
     )
+    parser.add_argument(
+        "--history-days",
+        type=int,
+        default=365,
+        help="Price history window in days (default: 365)",
+    )
+    parser.add_argument(
+        "--history-points",
+        type=int,
+        default=52,
+        help="Max price history snapshots per grade; 0 skips history (default: 52)",
+    )
     args = parser.parse_args()
-    export_to_app_format(game=args.game)
+    export_to_app_format(game=args.game, history_days=args.history_days, history_points=args.history_points)
@@ -0,0 +1,238 @@
+"""
+Persistent on-disk HTTP response cache shared by all scrapers.
+
+The same /game/ page is fetched by sync_all_sets, backfill_new_sets and
+backfill_images, often within the same day. With the cache enabled, http_client
+consults it before going to the network, so back-to-back jobs on the same machine
+(or sharing the directory through actions/cache) reuse pages instead of
+re-downloading them.
+
+The cache is off unless HTTP_CACHE=1 is set. Only the batch workflows that share
+.http_cache turn it on; on-demand scrapes (the API) and the grade scraper must see
+the live page, not one up to a TTL old.
+
+- Entries are content-addressed by SHA-256 of the URL (fragment stripped):
+      <cache_dir>/<2-char prefix>/<sha256>.body   response body, zlib-compressed by default
+      <cache_dir>/<2-char prefix>/<sha256>.json   url, status, validators, stored_at, ...
+- Freshness comes from TTL_RULES, matched against the URL. URLs with no matching
+  rule (searches, anything dynamic) are never cached.
+- Stale entries with an ETag/Last-Modified are revalidated with a conditional GET;
+  a 304 refreshes the entry without downloading the body again.
+- The directory is bounded to max_bytes; least recently used entries are evicted
+  (every hit bumps the body file's mtime).
+
+Configuration (environment):
+    HTTP_CACHE=1              enable the cache (off by default)
+    HTTP_CACHE_DIR=path       cache directory (default .http_cache)
+    HTTP_CACHE_MAX_MB=1024    size bound before LRU eviction
+    HTTP_CACHE_COMPRESS=0     store bodies uncompressed
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import logging
+import tempfile
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".http_cache"
+DEFAULT_MAX_MB = 1024
+
+HOUR = 3600
+
+# (URL pattern, seconds an entry stays fresh). First match wins; no match = don't cache.
+TTL_RULES = [
+    (re.compile(r"pricecharting\.com/game/"), 24 * HOUR),
+    (re.compile(r"pricecharting\.com/pop/item/"), 24 * HOUR),
+    (re.compile(r"pricecharting\.com/console/"), 6 * HOUR),
+    (re.compile(r"pricecharting\.com/category/"), 6 * HOUR),
+]
+
+# Response headers kept with each entry (validators + what .text needs)
+STORED_HEADERS = ("ETag", "Last-Modified", "Content-Type")
+
+
+class CacheEntry:
+    """A stored response: metadata dict plus the decoded body bytes."""
+
+    def __init__(self, meta, body):
+        self.meta = meta
+        self.body = body
+
+    @property
+    def age(self):
+        return time.time() - self.meta["stored_at"]
+
+    def validators(self):
+        """Conditional-request headers for revalidating this entry."""
+        headers = {}
+        stored = self.meta.get("headers", {})
+        if stored.get("ETag"):
+            headers["If-None-Match"] = stored["ETag"]
+        if stored.get("Last-Modified"):
+            headers["If-Modified-Since"] = stored["Last-Modified"]
+        return headers
+
+    def to_response(self):
+        """Rebuild a requests.Response so callers can't tell a hit from a fetch."""
+        response = requests.Response()
+        response.status_code = self.meta["status"]
+        response.url = self.meta["final_url"]
+        response.headers = CaseInsensitiveDict(self.meta.get("headers", {}))
+        response.encoding = self.meta.get("encoding")
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+class HttpCache:
+    """Content-addressed, TTL-per-pattern, size-bounded LRU cache of GET responses."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+                 compress=True, ttl_rules=TTL_RULES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.ttl_rules = ttl_rules
+        self._lock = threading.Lock()
+        self._total_bytes = None  # computed lazily on first store
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.split("#", 1)[0].encode("utf-8")).hexdigest()
+
+    def _paths(self, url):
+        key = self._key(url)
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".json", base + ".body"
+
+    def ttl_for(self, url):
+        """Seconds a response for this URL stays fresh; 0 means not cacheable."""
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(url):
+                return ttl
+        return 0
+
+    def get(self, url):
+        """Return the CacheEntry for url (fresh or stale), or None."""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+            if meta.get("compressed"):
+                body = zlib.decompress(body)
+            os.utime(body_path)  # LRU bookkeeping
+        except (OSError, ValueError, zlib.error):
+            return None
+        return CacheEntry(meta, body)
+
+    def put(self, url, response):
+        """Store a 200 response."""
+        body = response.content
+        stored_body = zlib.compress(body, 6) if self.compress else body
+        meta = {
+            "url": url,
+            "final_url": response.url,
+            "status": response.status_code,
+            "encoding": response.encoding,
+            "headers": {h: response.headers[h] for h in STORED_HEADERS if h in response.headers},
+            "compressed": self.compress,
+            "stored_at": time.time(),
+        }
+        meta_path, body_path = self._paths(url)
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            old_size = os.path.getsize(body_path) if os.path.exists(body_path) else 0
+            self._write_atomic(body_path, stored_body)
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"HTTP cache write failed for {url}: {e}")
+            return
+        self._account(len(stored_body) - old_size)
+
+    def refresh(self, url, entry):
+        """Mark an entry fresh again after a 304 Not Modified."""
+        entry.meta["stored_at"] = time.time()
+        meta_path, _ = self._paths(url)
+        try:
+            self._write_atomic(meta_path, json.dumps(entry.meta).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"HTTP cache refresh failed for {url}: {e}")
+
+    @staticmethod
+    def _write_atomic(path, data):
+        # Write-then-rename so concurrent readers never see a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _body_files(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".body"):
+                    yield os.path.join(root, name)
+
+    def _account(self, delta):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(os.path.getsize(p) for p in self._body_files())
+            else:
+                self._total_bytes += delta
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes."""
+        entries = []
+        for path in self._body_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            for p in (path, path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+
+        self._total_bytes = total
+        logger.info(f"HTTP cache: evicted {removed} entries, {total / 1024 / 1024:.0f} MB remain")
+
+
+def from_env():
+    """Build the cache configured by HTTP_CACHE_* environment variables, or None unless HTTP_CACHE is on."""
+    if os.getenv("HTTP_CACHE", "0").lower() in ("0", "false", "off", "no", ""):
+        return None
+    return HttpCache(
+        cache_dir=os.getenv("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR),
+        max_bytes=int(float(os.getenv("HTTP_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+        compress=os.getenv("HTTP_CACHE_COMPRESS", "1").lower() not in ("0", "false", "off", "no"),
+    )
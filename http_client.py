@@ -0,0 +1,302 @@
+"""
+Shared HTTP client for all PriceCharting scrapers.
+
+Every script used to call requests.get() on its own, paying a new TCP+TLS
+handshake per page and (in some places) waiting forever on a hung socket.
+This module keeps one keep-alive connection pool per host, spaces requests
+with a process-wide token-bucket rate limiter, applies default timeouts and
+retries transient failures a bounded number of times. GETs are served from
+the on-disk cache in http_cache when it is enabled (HTTP_CACHE=1) and a fresh
+copy exists (cache hits don't spend rate-limit tokens).
+
+The limiter's rate adapts to the upstream (AIMD): every fast 2xx/304 response
+nudges the rate up (to at most 4x the configured rate), while a 403 (Cloudflare
+blocks), 429, 5xx, timeout or connection error halves it (down to 1/8 of the configured
+rate) and a Retry-After header pauses all requests for that long. The
+configured rate is the starting point. Set HTTP_ADAPTIVE_RATE=0 to keep it fixed.
+
+Usage:
+    import http_client
+
+    http_client.configure(rate=0.5)        # start at 0.5 requests/second
+    response = http_client.get(url)
+    response = http_client.post(url, data={"cursor": cursor})
+"""
+
+import os
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+DEFAULT_RATE = 0.5            # requests per second across the whole process
+DEFAULT_BURST = 1             # requests allowed back-to-back before spacing kicks in
+DEFAULT_TIMEOUT = (10, 30)    # (connect, read) seconds
+DEFAULT_RETRIES = 3           # total attempts per request
+DEFAULT_POOL_SIZE = 10        # keep-alive connections per host
+
+# Statuses worth retrying; everything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Not retried, but the site pushing back (Cloudflare blocks): back off like a 429
+BACKOFF_STATUSES = RETRY_STATUSES | {403}
+
+# Adaptive rate (AIMD) defaults, relative to the configured rate
+MAX_RATE_FACTOR = 4.0         # never go above 4x the configured rate
+MIN_RATE_FACTOR = 0.125       # never go below 1/8 of it
+INCREASE_FACTOR = 0.02        # each healthy response adds 2% of the configured rate
+DECREASE_FACTOR = 0.5         # each backoff halves the current rate
+LATENCY_TARGET = 3.0          # seconds; slower responses don't earn an increase
+BACKOFF_COOLDOWN = 5.0        # failures within this many seconds of a backoff count once
+MAX_RETRY_AFTER = 300         # cap on honored Retry-After pauses (seconds)
+RATE_LOG_INTERVAL = 60        # seconds between "current rate" log lines
+
+
+class TokenBucket:
+    """Thread-safe token bucket. acquire() blocks until the caller may send."""
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()  # may be in the future while paused
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        # Reserve a token under the lock (the balance may go negative, which
+        # queues callers in arrival order) and sleep outside it.
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0, self._updated - now)
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def pause(self, seconds):
+        """Hold every caller for `seconds`; refilling resumes afterwards."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._updated = max(self._updated, now + seconds)
+
+
+def parse_retry_after(value):
+    """Retry-After header (delta-seconds or HTTP-date) -> seconds, or None."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), MAX_RETRY_AFTER)
+
+
+class AdaptiveRate:
+    """
+    AIMD controller for a TokenBucket: additive increase on fast successes,
+    multiplicative decrease on throttling/server errors/timeouts.
+    """
+
+    def __init__(self, bucket, min_rate, max_rate, increase, decrease=DECREASE_FACTOR,
+                 latency_target=LATENCY_TARGET, cooldown=BACKOFF_COOLDOWN):
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._last_backoff = float("-inf")
+        self._last_log = time.monotonic()
+
+    def on_success(self, latency):
+        if latency > self.latency_target:
+            return
+        with self._lock:
+            rate = min(self.max_rate, self.bucket.rate + self.increase)
+            self.bucket.set_rate(rate)
+            now = time.monotonic()
+            log = now - self._last_log >= RATE_LOG_INTERVAL
+            if log:
+                self._last_log = now
+        if log:
+            logger.info(f"Request rate: {rate:.2f}/s")
+
+    def on_failure(self, reason, retry_after=None):
+        with self._lock:
+            if retry_after:
+                self.bucket.pause(retry_after)
+            now = time.monotonic()
+            if now - self._last_backoff < self.cooldown:
+                return
+            self._last_backoff = now
+            old = self.bucket.rate
+            rate = max(self.min_rate, old * self.decrease)
+            self.bucket.set_rate(rate)
+            self._last_log = now
+        pause = f", pausing {retry_after:.0f}s (Retry-After)" if retry_after else ""
+        logger.warning(f"Backing off after {reason}: request rate {old:.2f} -> {rate:.2f}/s{pause}")
+
+
+class HttpClient:
+    """
+    Pooled, rate-limited HTTP client with default timeouts, bounded retries and
+    an optional on-disk response cache. cache=True uses http_cache.from_env(),
+    cache=False disables caching, or pass an http_cache.HttpCache instance.
+    adaptive=None follows HTTP_ADAPTIVE_RATE (on by default); min_rate/max_rate
+    bound the adaptive rate (default 1/8x and 4x the starting rate).
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, pool_size=DEFAULT_POOL_SIZE, cache=True,
+                 adaptive=None, min_rate=None, max_rate=None):
+        self.timeout = timeout
+        self.retries = max(1, int(retries))
+        self.limiter = TokenBucket(rate, burst)
+        if adaptive is None:
+            adaptive = os.getenv("HTTP_ADAPTIVE_RATE", "1").lower() not in ("0", "false", "off", "no")
+        self.controller = None
+        if adaptive:
+            self.controller = AdaptiveRate(
+                self.limiter,
+                min_rate=min_rate or rate * MIN_RATE_FACTOR,
+                max_rate=max_rate or rate * MAX_RATE_FACTOR,
+                increase=rate * INCREASE_FACTOR,
+            )
+        if cache is True:
+            cache = http_cache.from_env()
+        self.cache = cache or None
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the cache, shared pool and rate limiter.
+        Returns the final response (the caller decides what a 404 means) or
+        re-raises the last exception once all attempts are used up.
+        """
+        ttl = self.cache.ttl_for(url) if self.cache and method == "GET" else 0
+        if not ttl:
+            return self._send(method, url, **kwargs)
+
+        entry = self.cache.get(url)
+        if entry and entry.age < ttl:
+            return entry.to_response()
+
+        if entry:
+            # Stale: ask the server whether our copy is still current
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **entry.validators()}
+
+        response = self._send(method, url, **kwargs)
+        if response.status_code == 304 and entry:
+            self.cache.refresh(url, entry)
+            return entry.to_response()
+        if response.status_code == 200:
+            self.cache.put(url, response)
+        return response
+
+    @property
+    def rate(self):
+        """Current requests/second (changes over time when adaptive)."""
+        return self.limiter.rate
+
+    def _send(self, method, url, **kwargs):
+        """
+        Retries connection errors, timeouts and RETRY_STATUSES with linear backoff
+        (or the server's Retry-After), reporting each outcome to the rate controller.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(1, self.retries + 1):
+            self.limiter.acquire()
+            retry_after = None
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                if self.controller:
+                    self.controller.on_failure(type(e).__name__)
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Attempt {attempt} failed for {url}: {e}")
+            else:
+                if response.status_code in BACKOFF_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if self.controller:
+                        self.controller.on_failure(f"HTTP {response.status_code}", retry_after)
+                elif self.controller and (200 <= response.status_code < 300 or response.status_code == 304):
+                    # Only real successes earn an increase; a 404 says nothing about load
+                    self.controller.on_success(time.monotonic() - started)
+
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                logger.warning(f"Attempt {attempt} for {url} returned {response.status_code}")
+
+            # With a controller, Retry-After already paused the limiter
+            if retry_after is None or not self.controller:
+                time.sleep(retry_after if retry_after is not None else 2 * attempt)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Replace the process-wide client (e.g. configure(rate=1 / args.delay))."""
+    global _client
+    with _client_lock:
+        _client = HttpClient(**kwargs)
+    return _client
+
+
+def get_client():
+    """Return the process-wide client, creating it with defaults on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def get(url, **kwargs):
+    return get_client().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return get_client().post(url, **kwargs)
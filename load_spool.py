@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Bulk-load spool files written by `process_db.py --spool-dir` (see scrape_spool.py).
+
+Spool files are read in groups of up to --chunk-products products, merged, and
+written with the same steps process_batch uses (graded_sales upsert, graded_prices
+recompute, products bulk update, progress completion), but as a few large writes
+per group instead of one round of small writes per scraped batch. Loaded files are
+deleted (or moved to --archive-dir); a group that fails to load is left in place
+for the next run.
+
+Usage:
+    python process_db.py --spool-dir spool/ --time-budget 19500   # on any number of runners
+    python load_spool.py spool/                                    # once, wherever
+    python load_spool.py spool/ --chunk-products 20000 --archive-dir spool/loaded
+"""
+
+import os
+import time
+import shutil
+import argparse
+
+import scrape_spool
+from process_db import write_batch_records
+
+DEFAULT_CHUNK_PRODUCTS = 5000
+
+
+def group_spool_files(paths, chunk_products):
+    """Yield (paths, records) groups of roughly chunk_products products each."""
+    group_paths = []
+    group_batches = []
+    products = 0
+    for path in paths:
+        try:
+            records = scrape_spool.read_spool_file(path)
+        except (OSError, EOFError, ValueError) as e:
+            print(f"   ⚠️  Skipping unreadable spool file {path}: {e}")
+            continue
+        group_paths.append(path)
+        group_batches.append(records)
+        products += len(records["completed"])
+        if products >= chunk_products:
+            yield group_paths, scrape_spool.merge_records(group_batches)
+            group_paths, group_batches, products = [], [], 0
+    if group_paths:
+        yield group_paths, scrape_spool.merge_records(group_batches)
+
+
+def finish_files(paths, archive_dir=None):
+    for path in paths:
+        if archive_dir:
+            shutil.move(path, os.path.join(archive_dir, os.path.basename(path)))
+        else:
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load process_db spool files into the database")
+    parser.add_argument("spool_dir", help="Directory process_db.py --spool-dir wrote to")
+    parser.add_argument("--chunk-products", type=int, default=DEFAULT_CHUNK_PRODUCTS, help="Products merged into each load")
+    parser.add_argument("--sales-chunk", type=int, default=5000, help="graded_sales rows per upsert request")
+    parser.add_argument("--archive-dir", default=None, help="Move loaded files here instead of deleting them")
+    parser.add_argument("--max-files", type=int, default=None, help="Load at most this many files (oldest first)")
+    args = parser.parse_args()
+
+    paths = scrape_spool.list_spool_files(args.spool_dir)
+    if args.max_files:
+        paths = paths[:args.max_files]
+    if args.archive_dir:
+        os.makedirs(args.archive_dir, exist_ok=True)
+
+    print("🚚 Loading spool files")
+    print(f"   Directory: {args.spool_dir} ({len(paths)} files)")
+    print(f"   Chunk: {args.chunk_products} products per load, {args.sales_chunk} sales per upsert\n")
+
+    started = time.monotonic()
+    total_success = 0
+    total_failed = 0
+    total_sales = 0
+    files_loaded = 0
+    for group_paths, records in group_spool_files(paths, args.chunk_products):
+        print(f"📥 Loading {len(group_paths)} files: {len(records['completed'])} products, "
+              f"{len(records['sales'])} sales")
+        success, failed = write_batch_records(records, sales_chunk=args.sales_chunk)
+        total_success += success
+        total_failed += failed
+        if failed:
+            print(f"   ❌ Load failed; leaving {len(group_paths)} files for the next run")
+            continue
+        total_sales += len(records["sales"])
+        files_loaded += len(group_paths)
+        finish_files(group_paths, args.archive_dir)
+
+    elapsed = time.monotonic() - started
+    print("\n" + "="*60)
+    print("📊 LOAD COMPLETE")
+    print("="*60)
+    print(f"   Files loaded: {files_loaded}/{len(paths)}")
+    print(f"   ✅ Products: {total_success}")
+    print(f"   ❌ Failed: {total_failed}")
+    print(f"   Sales rows: {total_sales}")
+    print(f"   Elapsed: {elapsed:.0f}s")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
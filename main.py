@@ -1,18 +1,127 @@
 import requests
+import http_client
+import resolution_cache
+from name_matcher import best_match
 from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 from urllib.parse import quote
 import argparse
 import json
 import re
+import hashlib
+from datetime import datetime
 
 BASE_URL = "https://www.pricecharting.com"
 
+# Map CSS class of each completed-auctions tab to grade string representation
+GRADE_TABS = {
+    "completed-auctions-used": "Ungraded",  # Raw/ungraded sales
+    "completed-auctions-grade-twenty": "BGS 10 Black Label",
+    "completed-auctions-grade-nineteen": "CGC 10 Pristine",
+    "completed-auctions-manual-only": "PSA 10",
+    "completed-auctions-loose-and-box": "BGS 10",
+    "completed-auctions-grade-seventeen": "CGC 10",
+    "completed-auctions-grade-eighteen": "SGC 10",
+    "completed-auctions-grade-twenty-one": "TAG 10",
+    "completed-auctions-grade-twenty-two": "ACE 10",
+    "completed-auctions-box-only": "PSA 9.5",
+    "completed-auctions-graded": "PSA 9",
+    "completed-auctions-new": "PSA 8",
+    "completed-auctions-cib": "PSA 7",
+    "completed-auctions-grade-six": "PSA 6",
+    "completed-auctions-grade-five": "PSA 5",
+    "completed-auctions-grade-four": "PSA 4",
+    "completed-auctions-grade-three": "PSA 3",
+    "completed-auctions-box-and-manual": "PSA 2",
+    "completed-auctions-loose-and-manual": "PSA 1"
+}
+
+SALES_CLASS_PREFIX = "completed-auctions-"
+
+
+def _has_class(name):
+    """XPath predicate equivalent to the CSS selector .name"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Regions of /game/ and /pop/item/ pages that the scrapers read. Restricted parsing
+# keeps only the requested regions; navigation, scripts and ads are never turned
+# into BeautifulSoup objects.
+PAGE_SECTIONS = {
+    "sales": f"//div[contains(concat(' ', normalize-space(@class)), ' {SALES_CLASS_PREFIX}')]",
+    "pop": f"//table[{_has_class('population')}] | //table[@id='population-table']",
+    "details": "//*[@id='itemdetails'] | //td[@id='used_price']/ancestor::table[1]",
+    "images": f"//div[{_has_class('cover')}] | //img[@itemprop='image'] | //*[@id='product']//img",
+}
+
+_SALES_SECTIONS = etree.XPath(PAGE_SECTIONS["sales"])
+_SALE_ROWS = etree.XPath("(.//tbody)[1]//tr[starts-with(@id, 'ebay-')]")
+_SALE_DATE = etree.XPath(f".//td[{_has_class('date')}]")
+_SALE_TITLE_LINK = etree.XPath(f".//td[{_has_class('title')}]//a")
+_SALE_PRICE = etree.XPath(f".//td[{_has_class('numeric')}]//*[{_has_class('js-price')}]")
+_POP_ROW = etree.XPath(f"//table[{_has_class('population')}]//tbody//tr")
+_POP_CELLS = etree.XPath(f".//td[{_has_class('numeric')}]")
+
+
+def parse_product_tree(html):
+    """Parse HTML with lxml only (no BeautifulSoup). Returns None for an empty document."""
+    try:
+        return lxml_html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def restrict_html(html, sections=tuple(PAGE_SECTIONS)):
+    """
+    Return a small HTML document holding only the PAGE_SECTIONS regions named in
+    `sections`, in page order. Regions nested in an already-kept region are not duplicated.
+    """
+    tree = parse_product_tree(html)
+    if tree is None:
+        return ""
+
+    kept = []
+    kept_ids = set()
+    for el in tree.xpath(" | ".join(PAGE_SECTIONS[name] for name in sections)):
+        if any(id(ancestor) in kept_ids for ancestor in el.iterancestors()):
+            continue
+        kept.append(el)
+        kept_ids.add(id(el))
 
-def fetch(url):
-    """Fetch HTML and return BS4 soup"""
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-    html = requests.get(url, headers=headers)
-    return BeautifulSoup(html.text, "lxml")
+    body = "".join(lxml_html.tostring(el, encoding="unicode", with_tail=False) for el in kept)
+    return f"<html><body>{body}</body></html>"
+
+
+def parse_product_html(html, restricted=False):
+    """
+    Build a BS4 soup for a product page.
+    restricted=True keeps every PAGE_SECTIONS region; a tuple of section names keeps only those.
+    """
+    if restricted:
+        html = restrict_html(html) if restricted is True else restrict_html(html, restricted)
+    return BeautifulSoup(html, "lxml")
+
+
+def fetch_html(url):
+    """
+    Fetch a page's HTML through the shared client. Raises requests.HTTPError for a
+    non-2xx response (Cloudflare 403s, 404s, ...) instead of handing back an error
+    page to be parsed as if it were the product.
+    """
+    response = http_client.get(url)
+    if not 200 <= response.status_code < 300:
+        raise requests.HTTPError(f"HTTP {response.status_code} for {url}", response=response)
+    return response.text
+
+
+def fetch(url, restricted=False):
+    """Fetch HTML through the shared pooled/rate-limited client and return BS4 soup"""
+    return parse_product_html(fetch_html(url), restricted=restricted)
+
+
+def fetch_tree(url):
+    """Fetch HTML through the shared client and return an lxml tree for extract_product_page."""
+    return parse_product_tree(fetch_html(url))
 
 
 def strip_query_params(url):
@@ -20,14 +129,53 @@ def strip_query_params(url):
     return url.split('?')[0] if url else url
 
 
+class NoMatchingProduct(ValueError):
+    """Search returned no product rows (cached as a negative resolution)."""
+
+
 def search_product(query, set_name=None):
-    """Returns URL of product page (either direct redirect or best match from search results)."""
+    """
+    Returns URL of product page (either direct redirect or best match from search results).
+    Resolutions, including "no matching product", are memoized in resolution_cache so
+    repeat runs resolve known cards without any HTTP request.
+    """
+    cache = resolution_cache.get_cache()
+    if cache:
+        hit = cache.get(query, set_name)
+        if hit:
+            if not hit["url"]:
+                raise NoMatchingProduct("No matching product found.")
+            return hit["url"]
+
+    try:
+        url, score = _search_product(query, set_name)
+    except NoMatchingProduct:
+        if cache:
+            cache.put(query, set_name, None)
+        raise
+
+    if cache:
+        cache.put(query, set_name, url, score)
+    return url
+
+
+def _absolute_url(href):
+    if href.startswith("http"):
+        return strip_query_params(href)
+    return strip_query_params(BASE_URL + href)
+
+
+def _search_product(query, set_name=None):
+    """Run the search request. Returns (url, match score or None)."""
     search_url = f"{BASE_URL}/search-products?type=prices&q={quote(query)}"
-    response = requests.get(search_url, headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}, allow_redirects=True, timeout=30)
+    response = http_client.get(search_url, allow_redirects=True)
 
     # Check if we were redirected to a product page (URL contains /game/)
     if '/game/' in response.url:
-        return strip_query_params(response.url)
+        return strip_query_params(response.url), 1.0
+
+    # Never mistake an error page for "no results" (it would be cached as a miss)
+    response.raise_for_status()
 
     soup = BeautifulSoup(response.text, "lxml")
 
@@ -44,38 +192,30 @@ def search_product(query, set_name=None):
             rows = []
 
     if not rows:
-        raise ValueError("No matching product found.")
+        raise NoMatchingProduct("No matching product found.")
 
     # If set_name is provided, try to find best match
+    score = None
     if set_name:
-        best_match = find_best_set_match(rows, set_name)
+        best_match, score = _best_set_match(rows, set_name)
         if best_match:
             # href is already a full URL
-            href = best_match["href"]
-            if href.startswith("http"):
-                return strip_query_params(href)
-            else:
-                return strip_query_params(BASE_URL + href)
+            return _absolute_url(best_match["href"]), score
 
     # Otherwise grab first result
     link = rows[0].select_one("td.title a")
-    href = link["href"]
-    if href.startswith("http"):
-        return strip_query_params(href)
-    else:
-        return strip_query_params(BASE_URL + href)
+    return _absolute_url(link["href"]), score
 
 
 def find_best_set_match(rows, set_name):
     """Find the best matching product based on set name similarity."""
-    import difflib
+    return _best_set_match(rows, set_name)[0]
 
-    best_score = 0
-    best_link = None
-
-    # Normalize the set name for comparison
-    set_name_normalized = set_name.lower().strip()
 
+def _best_set_match(rows, set_name):
+    """Returns (best link or None, best similarity score)."""
+    # Console/set name of each result -> its link (first row wins for repeated names)
+    links = {}
     for row in rows:
         link = row.select_one("td.title a")
         console_cell = row.select_one("td.console")
@@ -83,27 +223,17 @@ def find_best_set_match(rows, set_name):
         if not link or not console_cell:
             continue
 
-        # Get the console/set name from the result
-        result_set = console_cell.text.strip().lower()
-
-        # Calculate similarity score
-        score = difflib.SequenceMatcher(None, set_name_normalized, result_set).ratio()
-
-        if score > best_score:
-            best_score = score
-            best_link = link
+        links.setdefault(console_cell.text, link)
 
     # Return best match if score is reasonable (>0.3 threshold)
-    if best_score > 0.3:
-        return best_link
-
-    return None
+    best_set, best_score = best_match(set_name, links)
+    return (links[best_set] if best_set is not None else None), best_score
 
 
 def parse_sales_for_grade(product_url, grade_class, soup=None):
     """Parse completed listings for a specific PSA grade (correct tab isolation)."""
     if soup is None:
-        soup = fetch(product_url)
+        soup = fetch(product_url, restricted=("sales",))
 
     # Find all divs with this class, then filter out the tab button
     # The content section has ONLY the grade_class, not the 'tab' class
@@ -118,6 +248,11 @@ def parse_sales_for_grade(product_url, grade_class, soup=None):
     if not section:
         return []
 
+    return _parse_sales_rows(section)
+
+
+def _parse_sales_rows(section):
+    """Parse the eBay sale rows inside one completed-auctions content section."""
     tbody = section.find("tbody")
     if not tbody:
         return []
@@ -150,7 +285,7 @@ def parse_pop_report(product_url, soup=None):
     """Return PSA POP count in dictionary format: {grade: count}"""
     if soup is None:
         url = product_url + "#population-report"
-        soup = fetch(url)
+        soup = fetch(url, restricted=("pop",))
 
     pop_table = soup.select_one("table.population tbody tr")
 
@@ -158,6 +293,11 @@ def parse_pop_report(product_url, soup=None):
     if not pop_table:
         return {}
 
+    return _parse_pop_row(pop_table)
+
+
+def _parse_pop_row(pop_table):
+    """Turn the first population-table row into {grade: count}."""
     cells = pop_table.select("td.numeric")
 
     if not cells:
@@ -166,20 +306,164 @@ def parse_pop_report(product_url, soup=None):
     return {idx: int(cell.text.strip().replace(",", "")) for idx, cell in enumerate(cells, start=1)}
 
 
+def _text(el):
+    """lxml equivalent of BS4 tag.text.strip()"""
+    return el.text_content().strip()
+
+
+def _parse_sale_row(row):
+    date = _text(_SALE_DATE(row)[0])
+    title_link = _SALE_TITLE_LINK(row)[0]
+    price = _text(_SALE_PRICE(row)[0])
+    href = title_link.get("href")
+
+    return {
+        "date": date,
+        "price_raw": price,
+        "price": float(re.sub(r"[^\d.]", "", price)),
+        "url": href,
+        "title": _text(title_link)
+    }
+
+
+def parse_sale_date(date_str):
+    """'2024-11-03' or 'Nov 3, 2024' -> '2024-11-03'; None if the date can't be parsed."""
+    for fmt in ("%Y-%m-%d", "%b %d, %Y"):
+        try:
+            return datetime.strptime(date_str, fmt).date().isoformat()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _sale_row_id(row):
+    """eBay item ID from a sale row's id attribute ('ebay-123' -> '123')."""
+    return row.get("id", "")[len("ebay-"):]
+
+
+def _parse_new_sale_rows(rows, watermark=None):
+    """
+    Parse sale rows (newest first) that aren't already covered by watermark.
+    A watermark is {"date": newest stored sale date, "ids": eBay IDs stored at that date}:
+    parsing stops at the first older row and skips known rows on the watermark date.
+    Returns (sales, watermark covering everything seen so far).
+    """
+    mark_date = watermark.get("date") if watermark else None
+    known_ids = set(watermark.get("ids", [])) if watermark else set()
+
+    sales = []
+    newest_date = None
+    newest_ids = []
+    for row in rows:
+        row_id = _sale_row_id(row)
+        date = parse_sale_date(_text(_SALE_DATE(row)[0]))
+        if mark_date and date:
+            if date < mark_date:
+                break
+            if date == mark_date and row_id in known_ids:
+                continue
+
+        sales.append(_parse_sale_row(row))
+        if date and (newest_date is None or date > newest_date):
+            newest_date, newest_ids = date, [row_id]
+        elif date and date == newest_date:
+            newest_ids.append(row_id)
+
+    if newest_date is None:
+        return sales, watermark
+    if newest_date == mark_date:
+        newest_ids = known_ids.union(newest_ids)
+    return sales, {"date": newest_date, "ids": sorted(newest_ids)}
+
+
+def _sales_sections(tree):
+    """{css_class: completed-auctions content section} of an lxml product-page tree."""
+    # First content section per class wins (tab buttons carry an extra 'tab' class)
+    sections = {}
+    for section in _SALES_SECTIONS(tree):
+        classes = section.get("class", "").split()
+        if "tab" in classes:
+            continue
+        for css_class in classes:
+            if css_class.startswith(SALES_CLASS_PREFIX):
+                sections.setdefault(css_class, section)
+    return sections
+
+
+def page_fingerprint(tree, css_classes=None):
+    """
+    Hash of the sale row IDs in each completed-auctions section (restricted to
+    css_classes if given) plus the POP table cells. Two fetches of a product page
+    with the same fingerprint have the same sales and population data.
+    Returns None for an empty page, or one with none of those sections and no POP
+    table (an error or block page), so such a page is never stored or compared.
+    """
+    if tree is None:
+        return None
+
+    parts = []
+    for css_class, section in sorted(_sales_sections(tree).items()):
+        if css_classes is None or css_class in css_classes:
+            parts.append(css_class + ":" + ",".join(_sale_row_id(row) for row in _SALE_ROWS(section)))
+
+    pop_rows = _POP_ROW(tree)
+    if pop_rows:
+        parts.append("pop:" + ",".join(_text(cell) for cell in _POP_CELLS(pop_rows[0])))
+
+    if not parts:
+        return None
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def extract_product_page(tree, watermarks=None):
+    """
+    Pull every completed-auctions tab and the POP table out of an lxml product-page tree
+    (see fetch_tree / parse_product_tree) without building a BeautifulSoup tree.
+    Returns {"sales": {css_class: [sale, ...]}, "pop_report": {grade: count},
+             "watermarks": {css_class: watermark}}.
+    Each sales list is identical to parse_sales_for_grade(url, css_class, soup=soup),
+    and pop_report to parse_pop_report(url, soup=soup).
+
+    watermarks ({css_class: watermark}, see _parse_new_sale_rows) makes the sales lists
+    incremental: only sales newer than what's already stored are parsed and returned.
+    """
+    if tree is None:
+        return {"sales": {}, "pop_report": {}, "watermarks": dict(watermarks or {})}
+
+    watermarks = watermarks or {}
+
+    sales = {}
+    new_watermarks = dict(watermarks)
+    for css_class, section in _sales_sections(tree).items():
+        sales[css_class], watermark = _parse_new_sale_rows(_SALE_ROWS(section), watermarks.get(css_class))
+        if watermark:
+            new_watermarks[css_class] = watermark
+
+    pop_report = {}
+    pop_rows = _POP_ROW(tree)
+    if pop_rows:
+        cells = _POP_CELLS(pop_rows[0])
+        pop_report = {idx: int(_text(cell).replace(",", "")) for idx, cell in enumerate(cells, start=1)}
+
+    return {"sales": sales, "pop_report": pop_report, "watermarks": new_watermarks}
+
+
 def parse_pop_report_table(product_url):
     """
     Fetch PSA population counts for grades 7, 8, 9, 10 from the /pop/item/ page.
-    Returns {7: count, 8: count, 9: count, 10: count} or {} if unavailable.
+    Returns {7: count, 8: count, 9: count, 10: count} ({} if the table lists none of
+    them), or None if the page couldn't be fetched or has no population table
+    (errors, blocked or missing pages) - callers keep what they have stored.
     """
     try:
         pop_url = product_url.replace('pricecharting.com/game/', 'pricecharting.com/pop/item/', 1)
         if pop_url == product_url:
-            return {}
+            return None
 
-        soup = fetch(pop_url)
+        soup = fetch(pop_url, restricted=("pop",))
         table = soup.select_one('#population-table tbody')
         if not table:
-            return {}
+            return None
 
         pop = {}
         for row in table.find_all('tr'):
@@ -201,7 +485,7 @@ def parse_pop_report_table(product_url):
 
         return pop
     except Exception:
-        return {}
+        return None
 
 
 def scrape_pricecharting(query, test_mode=False, set_name=None, verbose=True):
@@ -215,35 +499,15 @@ def scrape_pricecharting(query, test_mode=False, set_name=None, verbose=True):
         print(f"✅ Product page found: {product_url}")
 
     # Fetch the page once and reuse for all parsing
-    soup = fetch(product_url)
+    tree = fetch_tree(product_url)
 
     result = {"product_url": product_url, "grades": {}, "pop_report": {}}
 
-    # Map CSS class to grade string representation
-    grade_tabs = {
-        "completed-auctions-used": "Ungraded",  # Raw/ungraded sales
-        "completed-auctions-grade-twenty": "BGS 10 Black Label",
-        "completed-auctions-grade-nineteen": "CGC 10 Pristine",
-        "completed-auctions-manual-only": "PSA 10",
-        "completed-auctions-loose-and-box": "BGS 10",
-        "completed-auctions-grade-seventeen": "CGC 10",
-        "completed-auctions-grade-eighteen": "SGC 10",
-        "completed-auctions-grade-twenty-one": "TAG 10",
-        "completed-auctions-grade-twenty-two": "ACE 10",
-        "completed-auctions-box-only": "PSA 9.5",
-        "completed-auctions-graded": "PSA 9",
-        "completed-auctions-new": "PSA 8",
-        "completed-auctions-cib": "PSA 7",
-        "completed-auctions-grade-six": "PSA 6",
-        "completed-auctions-grade-five": "PSA 5",
-        "completed-auctions-grade-four": "PSA 4",
-        "completed-auctions-grade-three": "PSA 3",
-        "completed-auctions-box-and-manual": "PSA 2",
-        "completed-auctions-loose-and-manual": "PSA 1"
-    }
+    # One pass over the lxml tree for all grade tabs and the POP table
+    page = extract_product_page(tree)
 
-    for css_class, grade_label in grade_tabs.items():
-        sales = parse_sales_for_grade(product_url, css_class, soup=soup)
+    for css_class, grade_label in GRADE_TABS.items():
+        sales = page["sales"].get(css_class, [])
         result["grades"][grade_label] = sales
 
         if test_mode:
@@ -254,7 +518,7 @@ def scrape_pricecharting(query, test_mode=False, set_name=None, verbose=True):
                 sample = sales[0]
                 print(f"Sample sale: {sample['date']} | {sample['price_raw']} | {sample['url']}")
 
-    result["pop_report"] = parse_pop_report(product_url, soup=soup)
+    result["pop_report"] = page["pop_report"]
 
     if test_mode:
         print("\nPOP Report (grade -> count):")
@@ -0,0 +1,141 @@
+"""
+Indexed fuzzy matching for set names.
+
+find_best_set_match used to run difflib.SequenceMatcher against every search row
+on every lookup, re-normalizing the same strings each time, and the logo scripts
+compared every set against every logo name. This module keeps that scoring (a
+difflib ratio of the normalized strings, so existing thresholds like 0.3 keep
+their meaning) but avoids most of the work:
+
+- normalization and pairwise ratios are memoized per process, so the same
+  set name vs. the same console names costs a dict lookup the second time
+- exact normalized matches short-circuit with score 1.0
+- candidates that can't beat the current best (by the length bound of the
+  ratio) are skipped without running SequenceMatcher
+- NameMatcher indexes a fixed list of names (groups.name, logo names, ...)
+  by token and trigram, and only scores the top candidates from the index
+
+Usage:
+    from name_matcher import NameMatcher, best_match
+
+    name, score = best_match("Base Set", ["Pokemon Base Set", "Pokemon Jungle"])
+
+    matcher = NameMatcher(all_group_names)
+    name, score = matcher.best("pokemon scarlet & violet 151")
+"""
+
+import heapq
+import difflib
+from collections import defaultdict
+from functools import lru_cache
+
+DEFAULT_THRESHOLD = 0.3     # same cut-off find_best_set_match has always used
+DEFAULT_CANDIDATES = 25     # indexed candidates scored exactly per query
+
+
+@lru_cache(maxsize=65536)
+def normalize(name):
+    """Case-fold and trim (the normalization find_best_set_match has always used)."""
+    return (name or "").lower().strip()
+
+
+@lru_cache(maxsize=65536)
+def trigrams(text):
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+@lru_cache(maxsize=262144)
+def similarity(a, b):
+    """difflib ratio of two already-normalized strings (argument order matters, as in difflib)."""
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _ratio_upper_bound(a, b):
+    # ratio = 2*matches / (len(a) + len(b)) and matches <= min(len(a), len(b))
+    total = len(a) + len(b)
+    return 2 * min(len(a), len(b)) / total if total else 1.0
+
+
+def _best_of(query, candidates, threshold):
+    """
+    Score (original, normalized) candidates against a normalized query. Returns
+    (best original or None, best score); the first candidate wins ties.
+    """
+    best_score = 0
+    best_name = None
+    for original, normalized in candidates:
+        if normalized == query:
+            return original, 1.0
+        if _ratio_upper_bound(query, normalized) <= best_score:
+            continue
+        score = similarity(query, normalized)
+        if score > best_score:
+            best_score = score
+            best_name = original
+
+    if best_score > threshold:
+        return best_name, best_score
+    return None, best_score
+
+
+def best_match(query, names, threshold=DEFAULT_THRESHOLD, normalizer=normalize):
+    """
+    Best of a small, changing list of names (e.g. the console column of one search
+    results page). Returns (name or None, score) with the same scoring as NameMatcher.
+    """
+    return _best_of(normalizer(query), ((name, normalizer(name)) for name in names), threshold)
+
+
+class NameMatcher:
+    """
+    Token + trigram index over a fixed list of names. best() scores at most
+    `candidates` names per query, picked by shared tokens and trigrams.
+    """
+
+    def __init__(self, names, normalizer=normalize, candidates=DEFAULT_CANDIDATES):
+        self.normalizer = normalizer
+        self.candidates = candidates
+        self._entries = []                  # [(original, normalized)]
+        self._exact = {}                    # normalized -> first original
+        self._tokens = defaultdict(list)    # token -> entry ids
+        self._grams = defaultdict(list)     # trigram -> entry ids
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, name):
+        normalized = self.normalizer(name)
+        entry_id = len(self._entries)
+        self._entries.append((name, normalized))
+        self._exact.setdefault(normalized, name)
+        for token in set(normalized.split()):
+            self._tokens[token].append(entry_id)
+        for gram in trigrams(normalized):
+            self._grams[gram].append(entry_id)
+
+    def _candidate_ids(self, query):
+        if len(self._entries) <= self.candidates:
+            return range(len(self._entries))
+
+        # Shared trigrams, with whole shared tokens weighted higher
+        overlap = defaultdict(int)
+        for gram in trigrams(query):
+            for entry_id in self._grams.get(gram, ()):
+                overlap[entry_id] += 1
+        for token in set(query.split()):
+            for entry_id in self._tokens.get(token, ()):
+                overlap[entry_id] += 3
+
+        top = heapq.nlargest(self.candidates, overlap.items(), key=lambda item: item[1])
+        return sorted(entry_id for entry_id, _ in top)  # keep insertion order for ties
+
+    def best(self, query, threshold=DEFAULT_THRESHOLD):
+        """Returns (best name or None, score); score is a difflib ratio in [0, 1]."""
+        normalized = self.normalizer(query)
+        if normalized in self._exact:
+            return self._exact[normalized], 1.0
+        candidates = (self._entries[i] for i in self._candidate_ids(normalized))
+        return _best_of(normalized, candidates, threshold)
@@ -0,0 +1,308 @@
+"""
+Array-backed market-price engine for graded_prices.
+
+The market price of a (product_id, grade) is a time-decayed weighted geometric
+mean of its sale prices, times a liquidity factor:
+
+    weight_i = 2 ** (-days_before_latest_sale_i / half_life)
+    price    = exp(sum(weight_i * log(price_i)) / sum(weight_i)) * min(1, sqrt(sum(weight_i)))
+
+calculate_market_price() is the per-group reference implementation (what
+process_db has always used). market_prices() computes the same thing for every
+group of a batch at once: sale dates are parsed once per distinct date string,
+prices and timestamps go into NumPy arrays, and the per-group maximum, weight sums
+and weighted log sums are grouped reductions (np.maximum.at / np.bincount) over
+a dense group index. Results match calculate_market_price to floating-point
+tolerance; bench_pricing.py checks that and measures the speedup.
+
+The reductions produce a PriceState (latest sale, decayed weight sums, sample
+size) per group, for several half-lives (HALF_LIVES) in the same pass, from
+which the per-horizon prices and a short-vs-long price trend follow. Persisted in graded_price_state, it lets later sales be priced
+in O(new sales): grouped_price_state(new_sales, prior=state) rescales the stored
+sums to the new latest sale and adds the new sales' weights.
+
+Usage:
+    from pricing_engine import market_prices
+
+    prices = market_prices(sales)   # sales: dicts with product_id, grade, sale_date, price
+    prices[(product_id, grade)]     # -> {"price": ..., "sample_size": ...}
+"""
+
+import math
+from datetime import datetime
+from operator import itemgetter
+
+import numpy as np
+
+DEFAULT_HALF_LIFE = 21
+SECONDS_PER_DAY = 86400
+
+# Horizons priced together in one pass: graded_prices.market_price is the default
+# half-life, the others go to market_price_<n>d. price_trend compares the
+# shortest horizon's price level with the longest one's.
+HALF_LIVES = (DEFAULT_HALF_LIFE, 7, 90)
+
+# Sales whose weight (relative to the latest sale's 1) is below this are left out
+# of history reads (horizon_days). Dropping a sale of weight w moves the group's
+# log-price mean by at most w * |log(price / fair price)| (the weights sum to >= 1),
+# so the price moves by about 1e-9 relative per dropped sale per unit of log-price
+# gap: far below cent rounding and process_db's --verify-pricing tolerance (1e-6).
+HORIZON_WEIGHT_TOLERANCE = 1e-9
+
+
+def horizon_days(half_life=max(HALF_LIVES), tolerance=HORIZON_WEIGHT_TOLERANCE):
+    """
+    How far back from a group's latest sale sales are read to price it: the age
+    at which a sale's weight 2^(-days / half_life) falls below `tolerance`
+    (30 half-lives for 1e-9, i.e. 2700 days for the 90-day horizon).
+    """
+    return int(math.ceil(half_life * math.ceil(math.log2(1 / tolerance))))
+
+
+def calculate_market_price(sales, half_life=DEFAULT_HALF_LIFE):
+    """
+    Calculate market price using a time-decay weighted geometric mean.
+    Returns -1 when no sales exist (not 0, to distinguish from a zero price).
+    """
+    if not sales:
+        return {"price": -1, "sample_size": 0}
+
+    parsed = []
+    max_ts = 0
+    for sale in sales:
+        try:
+            price = sale["price"]
+            if not price or price <= 0:
+                continue
+            ts = datetime.fromisoformat(sale["sale_date"]).timestamp()
+            max_ts = max(max_ts, ts)
+            parsed.append({"price": price, "ts": ts})
+        except Exception:
+            continue
+
+    if not parsed:
+        return {"price": -1, "sample_size": 0}
+
+    weighted_log_sum = 0.0
+    sum_weights = 0.0
+    for item in parsed:
+        days_ago = max(0, (max_ts - item["ts"]) / SECONDS_PER_DAY)
+        weight = math.pow(2, -days_ago / half_life)
+        weighted_log_sum += weight * math.log(item["price"])
+        sum_weights += weight
+
+    if sum_weights == 0:
+        return {"price": -1, "sample_size": len(parsed)}
+
+    fair_price = math.exp(weighted_log_sum / sum_weights)
+    liquidity_factor = min(1, math.sqrt(sum_weights))
+    return {"price": fair_price * liquidity_factor, "sample_size": len(parsed)}
+
+
+def _parse_timestamp(date_str):
+    try:
+        return datetime.fromisoformat(date_str).timestamp()
+    except Exception:
+        return math.nan
+
+
+def _as_price(price):
+    # calculate_market_price skips anything that isn't a positive number
+    if isinstance(price, (int, float)):
+        return price
+    return math.nan
+
+
+def _price_array(prices):
+    array = np.array(prices)
+    if array.dtype.kind in "biuf":
+        return array.astype(np.float64)
+    # Mixed column (None, strings, ...): convert value by value
+    return np.fromiter(map(_as_price, prices), dtype=np.float64, count=len(prices))
+
+
+def _factorize(values):
+    """(distinct values in first-seen order, int64 index of each value into them)"""
+    codes = dict.fromkeys(values)
+    for code, value in enumerate(codes):
+        codes[value] = code
+    index = np.fromiter(map(codes.__getitem__, values), dtype=np.int64, count=len(values))
+    return list(codes), index
+
+
+class SalesArrays:
+    """
+    A batch of sales as arrays: group (dense index into keys), ts (epoch seconds),
+    price, and valid (positive price and parseable date). keys[i] is the
+    (product_id, grade) of group i.
+    """
+
+    def __init__(self, keys, group, ts, price):
+        self.keys = keys
+        self.group = group
+        self.ts = ts
+        self.price = price
+        self.valid = (price > 0) & ~np.isnan(ts)
+
+    @classmethod
+    def from_sales(cls, sales):
+        sales = sales if isinstance(sales, list) else list(sales)
+
+        # Columns are pulled out and factorized with C-level map/dict calls; each
+        # distinct date string is parsed once
+        product_ids, product_index = _factorize(list(map(itemgetter("product_id"), sales)))
+        grades, grade_index = _factorize(list(map(itemgetter("grade"), sales)))
+        combined, group = np.unique(product_index * len(grades) + grade_index, return_inverse=True)
+        keys = [(product_ids[c // len(grades)], grades[c % len(grades)]) for c in combined.tolist()]
+        dates, date_index = _factorize(list(map(itemgetter("sale_date"), sales)))
+
+        date_ts = np.array([_parse_timestamp(d) for d in dates], dtype=np.float64)
+        ts = date_ts[date_index] if len(sales) else np.empty(0, dtype=np.float64)
+        return cls(keys, group, ts, _price_array(list(map(itemgetter("price"), sales))))
+
+    def __len__(self):
+        return len(self.group)
+
+
+def column_suffix(half_life):
+    """'' for the default half-life, '_<n>d' for the others (graded_prices / graded_price_state columns)."""
+    return "" if half_life == DEFAULT_HALF_LIFE else f"_{half_life:g}d"
+
+
+class PriceState:
+    """
+    Decayed sums per group, aligned with a key list: ref_ts (the group's latest
+    sale, epoch seconds), sum_w and sum_wlog (sale weights, and weights times log
+    price, relative to ref_ts; one row per half-life in `half_lives`) and
+    sample_size. Prices follow from the sums alone, and new sales can be folded in
+    by rescaling them to a newer ref_ts.
+    """
+
+    def __init__(self, ref_ts, sum_w, sum_wlog, sample_size, half_lives=HALF_LIVES):
+        self.ref_ts = ref_ts
+        self.sum_w = sum_w
+        self.sum_wlog = sum_wlog
+        self.sample_size = sample_size
+        self.half_lives = tuple(half_lives)
+
+    @classmethod
+    def empty(cls, n_groups, half_lives=HALF_LIVES):
+        return cls(np.zeros(n_groups), np.zeros((len(half_lives), n_groups)),
+                   np.zeros((len(half_lives), n_groups)), np.zeros(n_groups, dtype=np.int64), half_lives)
+
+    @staticmethod
+    def columns(half_lives=HALF_LIVES):
+        """graded_price_state columns holding a state's values."""
+        sums = [f"{name}{column_suffix(h)}" for h in half_lives for name in ("sum_w", "sum_wlog")]
+        return ["ref_ts", *sums, "sample_size"]
+
+    @classmethod
+    def is_complete(cls, row, half_lives=HALF_LIVES):
+        """Whether a graded_price_state row has every column (rows from before a horizon was added don't)."""
+        return all(row.get(column) is not None for column in cls.columns(half_lives))
+
+    @classmethod
+    def from_rows(cls, keys, rows, half_lives=HALF_LIVES):
+        """State for `keys` from {key: graded_price_state row}; missing keys start empty."""
+        state = cls.empty(len(keys), half_lives)
+        for i, key in enumerate(keys):
+            row = rows.get(key)
+            if row:
+                state.ref_ts[i] = row["ref_ts"]
+                state.sample_size[i] = row["sample_size"]
+                for k, half_life in enumerate(half_lives):
+                    suffix = column_suffix(half_life)
+                    state.sum_w[k, i] = row[f"sum_w{suffix}"]
+                    state.sum_wlog[k, i] = row[f"sum_wlog{suffix}"]
+        return state
+
+    def rows(self, keys):
+        """{key: graded_price_state columns} for the aligned keys."""
+        rows = {}
+        for i, key in enumerate(keys):
+            row = {"ref_ts": float(self.ref_ts[i]), "sample_size": int(self.sample_size[i])}
+            for k, half_life in enumerate(self.half_lives):
+                suffix = column_suffix(half_life)
+                row[f"sum_w{suffix}"] = float(self.sum_w[k, i])
+                row[f"sum_wlog{suffix}"] = float(self.sum_wlog[k, i])
+            rows[key] = row
+        return rows
+
+    def fair_prices(self, half_life=DEFAULT_HALF_LIFE):
+        """Weighted geometric mean per group, without the liquidity factor (NaN without a usable sale)."""
+        k = self.half_lives.index(half_life)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.sum_w[k] > 0, np.exp(self.sum_wlog[k] / self.sum_w[k]), np.nan)
+
+    def prices(self, half_life=DEFAULT_HALF_LIFE):
+        """Market price per group (-1 for groups without a usable sale)."""
+        k = self.half_lives.index(half_life)
+        price = np.full(len(self.ref_ts), -1.0)
+        priced = self.sum_w[k] > 0
+        price[priced] = (np.exp(self.sum_wlog[k][priced] / self.sum_w[k][priced])
+                         * np.minimum(1.0, np.sqrt(self.sum_w[k][priced])))
+        return price
+
+    def trend(self):
+        """
+        Price-level change: shortest-horizon over longest-horizon geometric mean,
+        minus 1 (0.1 = recent sales 10% above the long-run level). Compared without
+        the liquidity factor, which would penalize the short horizon for having
+        fewer effective sales. NaN without a usable sale.
+        """
+        return self.fair_prices(min(self.half_lives)) / self.fair_prices(max(self.half_lives)) - 1
+
+
+def grouped_price_state(arrays, half_lives=HALF_LIVES, prior=None):
+    """
+    Decayed sums for every group of a SalesArrays, for all `half_lives` in one
+    pass (ages and log prices are computed once and shared). With `prior` (a
+    PriceState aligned with arrays.keys, e.g. from graded_price_state), the sales
+    are folded into it: sums are rescaled to the new latest sale, so the result is
+    what a full recompute over the prior sales plus these would give.
+    """
+    n_groups = len(arrays.keys)
+    prior = prior or PriceState.empty(n_groups, half_lives)
+    valid = arrays.valid
+    group = arrays.group[valid]
+    ts = arrays.ts[valid]
+    log_price = np.log(arrays.price[valid])
+
+    # calculate_market_price measures age from the group's latest sale (floored at epoch 0)
+    ref_ts = prior.ref_ts.copy()
+    np.maximum.at(ref_ts, group, ts)
+    shift_days = (ref_ts - prior.ref_ts) / SECONDS_PER_DAY
+    days_ago = np.maximum(0.0, (ref_ts[group] - ts) / SECONDS_PER_DAY)
+
+    state = PriceState.empty(n_groups, half_lives)
+    state.ref_ts = ref_ts
+    state.sample_size = prior.sample_size + np.bincount(group, minlength=n_groups)
+    for k, half_life in enumerate(half_lives):
+        scale = np.exp2(-shift_days / half_life)
+        weights = np.exp2(-days_ago / half_life)
+        state.sum_w[k] = prior.sum_w[k] * scale + np.bincount(group, weights=weights, minlength=n_groups)
+        state.sum_wlog[k] = (prior.sum_wlog[k] * scale
+                             + np.bincount(group, weights=weights * log_price, minlength=n_groups))
+    return state
+
+
+def grouped_market_prices(arrays, half_life=DEFAULT_HALF_LIFE):
+    """
+    Market price and sample size for every group of a SalesArrays, as two arrays
+    aligned with arrays.keys (price -1 for groups without a usable sale).
+    """
+    state = grouped_price_state(arrays, half_lives=(half_life,))
+    return state.prices(half_life), state.sample_size
+
+
+def market_prices(sales, half_life=DEFAULT_HALF_LIFE):
+    """
+    calculate_market_price for every (product_id, grade) in `sales` at once.
+    Returns {(product_id, grade): {"price": float, "sample_size": int}}.
+    """
+    arrays = sales if isinstance(sales, SalesArrays) else SalesArrays.from_sales(sales)
+    price, sample_size = grouped_market_prices(arrays, half_life)
+    return {
+        key: {"price": float(price[i]), "sample_size": int(sample_size[i])}
+        for i, key in enumerate(arrays.keys)
+    }
@@ -1,10 +1,22 @@
 import os
 import re
-import math
-from collections import defaultdict
-from datetime import datetime
+import time
+import uuid
+import queue
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from supabase import create_client, Client
-from main import scrape_pricecharting
+import http_client
+import scrape_journal
+import scrape_spool
+from bulk_writes import bulk_update
+import numpy as np
+from pricing_engine import PriceState, SalesArrays, column_suffix, grouped_price_state, horizon_days
+from main import scrape_pricecharting, parse_sale_date
+from scrape_helpers import ListingResolver, parse_timestamp
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -19,6 +31,22 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# How long a claim on product_grade_progress rows lasts without renewal
+DEFAULT_LEASE_SECONDS = 900
+
+# How write_batch_records updates graded_prices (see write_batch_records)
+PRICING_MODES = ("incremental", "full", "database")
+
+# Spool mode: how long spooled products stay claimed while they wait for load_spool.py
+DEFAULT_SPOOL_LEASE_SECONDS = 24 * 3600
+
+# The page fingerprint only covers the /game/ page, so an unchanged page would
+# otherwise keep its /pop/item/ counts forever; refetch them at least this often
+POP_REFRESH_DAYS = 30
+
+# Speculative /pop/item/ fetches run here, alongside the /game/ fetch they belong to
+_pop_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pop")
+
 
 def parse_card_name(name):
     """
@@ -53,31 +81,51 @@ def parse_card_number(number):
     return clean
 
 
-def fetch_incomplete_products(limit=1000, offset=0):
+def claim_incomplete_products(owner, limit=100, lease_seconds=DEFAULT_LEASE_SECONDS):
     """
-    Fetch products that need grade data processing (completed=false).
-    Manually joins product_grade_progress with products table and groups.
-    Uses pagination with offset for batching through large datasets.
+    Claim up to `limit` products that need grade data processing (completed=false)
+    for this runner and return their details (see fetch_products_by_ids).
+    Claims are leases on product_grade_progress rows (sql/004_grade_work_leases.sql):
+    no other runner gets these products until the lease expires or they're completed.
     """
-    # First, get incomplete product IDs with pagination
-    progress_response = (
-        supabase.table("product_grade_progress")
-        .select("product_id")
-        .eq("completed", False)
-        .range(offset, offset + limit - 1)
-        .execute()
-    )
+    claim_response = supabase.rpc("claim_grade_work", {
+        "p_owner": owner,
+        "p_limit": limit,
+        "p_lease_seconds": lease_seconds,
+    }).execute()
 
-    if not progress_response.data:
+    product_ids = [row["product_id"] for row in claim_response.data or []]
+    if not product_ids:
         return []
 
-    # Get the product IDs
-    product_ids = [item["product_id"] for item in progress_response.data]
+    return fetch_products_by_ids(product_ids)
+
 
+def count_incomplete_products():
+    """Number of products still queued (completed=false), or None if the count fails."""
+    try:
+        response = (
+            supabase.table("product_grade_progress")
+            .select("product_id", count="exact")
+            .eq("completed", False)
+            .limit(1)
+            .execute()
+        )
+        return response.count
+    except Exception as e:
+        print(f"   ⚠️  Error counting remaining products: {e}")
+        return None
+
+
+def fetch_products_by_ids(product_ids):
+    """
+    Manually joins products with groups for the given product IDs.
+    Returns product dicts enriched with group_name and group_set_url.
+    """
     # Fetch the actual product details with group info and pricecharting_url
     products_response = (
         supabase.table("products")
-        .select("id, name, number, group_id, pricecharting_url")
+        .select("id, name, number, group_id, pricecharting_url, sales_watermarks, page_fingerprint, pop_refreshed_at")
         .in_("id", product_ids)
         .execute()
     )
@@ -93,22 +141,32 @@ def fetch_incomplete_products(limit=1000, offset=0):
     if group_ids:
         groups_response = (
             supabase.table("groups")
-            .select("id, name")
+            .select("id, name, set_url")
             .in_("id", group_ids)
             .execute()
         )
-        group_map = {g["id"]: g["name"] for g in groups_response.data}
+        group_map = {g["id"]: g for g in groups_response.data}
 
-    # Enrich products with group names
+    # Enrich products with group names and set listing URLs
     enriched_products = []
     for product in products_response.data:
-        group_id = product.get("group_id")
-        product["group_name"] = group_map.get(group_id) if group_id else None
+        group = group_map.get(product.get("group_id")) or {}
+        product["group_name"] = group.get("name")
+        product["group_set_url"] = group.get("set_url")
         enriched_products.append(product)
 
     return enriched_products
 
 
+def pop_refresh_due(product_data, now=None):
+    """True if the product's /pop/item/ counts were fetched over POP_REFRESH_DAYS ago (or never)."""
+    refreshed_at = product_data.get("pop_refreshed_at")
+    if not refreshed_at:
+        return True
+    now = now or datetime.now(timezone.utc)
+    return (now - parse_timestamp(refreshed_at)).total_seconds() > POP_REFRESH_DAYS * 86400
+
+
 def save_graded_sales(product_id, scraped_data):
     """
     Save graded sales data to normalized graded_sales table.
@@ -205,7 +263,9 @@ def mark_product_completed(product_id):
     try:
         supabase.table("product_grade_progress").update({
             "completed": True,
-            "updated_at": "now()"
+            "updated_at": "now()",
+            "lease_owner": None,
+            "lease_expires_at": None
         }).eq("product_id", product_id).execute()
         return True
     except Exception as e:
@@ -213,22 +273,25 @@ def mark_product_completed(product_id):
         return False
 
 
-def process_product(product_data, verbose=True):
+def process_product(product_data, verbose=True, label=""):
     """
     Process a single product: scrape PriceCharting data.
     Returns scraped data dict or None if error.
     Does NOT write to database - that's done in batch by process_batch().
+    Safe to call from several threads; all fetches share http_client's rate limit.
     """
     product_id = product_data.get("id")
     raw_name = product_data.get("name")
     raw_number = product_data.get("number")
     group_name = product_data.get("group_name")
     pricecharting_url = product_data.get("pricecharting_url")
+    # {grade: {"date": newest stored sale date, "ids": [eBay IDs on that date]}}
+    sales_watermarks = product_data.get("sales_watermarks") or {}
 
     if verbose:
         # Handle null number display
         number_display = f"#{raw_number}" if raw_number else "(no number)"
-        print(f"📦 Processing: {raw_name} {number_display}")
+        print(f"{label}📦 Processing: {raw_name} {number_display}")
 
     try:
         # If we already have a pricecharting_url, use it directly
@@ -237,16 +300,19 @@ def process_product(product_data, verbose=True):
                 print(f"   Using existing URL: {pricecharting_url}")
 
             # Import scraping functions directly from main
-            from main import parse_sales_for_grade, parse_pop_report, fetch
+            from main import extract_product_page, fetch_tree, page_fingerprint, parse_pop_report_table
 
-            # Fetch once and reuse for all parsing (saves 4 HTTP requests per product)
-            soup = fetch(pricecharting_url)
+            # Pop counts due for a refresh bypass the unchanged-page skip below
+            pop_due = pop_refresh_due(product_data)
 
-            result = {
-                "product_url": pricecharting_url,
-                "grades": {},
-                "pop_report": {}
-            }
+            # Without a stored fingerprint (or with pop due) the pop page is always
+            # needed, so fetch it concurrently with the product page instead of after it
+            pop_future = None
+            if pop_due or not product_data.get("page_fingerprint"):
+                pop_future = _pop_pool.submit(parse_pop_report_table, pricecharting_url)
+
+            # Fetch once and reuse for all parsing (saves 4 HTTP requests per product)
+            tree = fetch_tree(pricecharting_url)
 
             # Scrape grade data
             grade_tabs = {
@@ -256,15 +322,48 @@ def process_product(product_data, verbose=True):
                 "completed-auctions-manual-only": "PSA 10"
             }
 
-            for css_class, grade in grade_tabs.items():
-                sales = parse_sales_for_grade(pricecharting_url, css_class, soup=soup)
-                result["grades"][grade] = sales
+            # Same sale rows and POP table as last time: nothing to parse or write
+            fingerprint = page_fingerprint(tree, css_classes=grade_tabs)
+            if fingerprint and fingerprint == product_data.get("page_fingerprint") and not pop_due:
+                if verbose:
+                    print("   ⏭️  Page unchanged since last scrape")
+                return {
+                    "product_id": product_id,
+                    "unchanged": True,
+                    "result": {}
+                }
 
-            # Always fetch PSA pop counts (pop exists independently of recent sales)
-            import time as _time
-            from main import parse_pop_report_table
-            _time.sleep(0.5)
-            result["pop_report"] = parse_pop_report_table(pricecharting_url)
+            result = {
+                "product_url": pricecharting_url,
+                "grades": {},
+                "pop_report": {},
+                "sales_watermarks": dict(sales_watermarks),
+                "page_fingerprint": fingerprint
+            }
+
+            # Only parse sales newer than what's already stored for each grade
+            watermarks = {
+                css_class: sales_watermarks[grade.split()[-1]]
+                for css_class, grade in grade_tabs.items()
+                if grade.split()[-1] in sales_watermarks
+            }
+            page = extract_product_page(tree, watermarks=watermarks)
+            for css_class, grade in grade_tabs.items():
+                result["grades"][grade] = page["sales"].get(css_class, [])
+                if css_class in page["watermarks"]:
+                    result["sales_watermarks"][grade.split()[-1]] = page["watermarks"][css_class]
+
+            # Always fetch PSA pop counts (pop exists independently of recent sales).
+            # None = the fetch failed: keep the stored pop_count and leave
+            # pop_refreshed_at alone, so the next run tries again
+            if pop_future is not None:
+                pop_report = pop_future.result()
+            else:
+                pop_report = parse_pop_report_table(pricecharting_url)
+            result["pop_report"] = pop_report
+            result["pop_refreshed"] = pop_report is not None
+            if pop_report is None and verbose:
+                print("   ⚠️  Pop page unavailable; keeping stored pop counts")
 
         else:
             # Need to search for the product first
@@ -290,7 +389,7 @@ def process_product(product_data, verbose=True):
                 grades_summary.append(f"PSA {grade_num}: {len(sales)}")
 
             total_sales = sum(len(sales) for sales in result.get("grades", {}).values())
-            print(f"   ✅ Scraped: {total_sales} total sales [{', '.join(grades_summary)}], POP: {len(result.get('pop_report', {}))} grades")
+            print(f"   ✅ Scraped: {total_sales} new sales [{', '.join(grades_summary)}], POP: {len(result.get('pop_report', {}))} grades")
 
         return {
             "product_id": product_id,
@@ -302,28 +401,36 @@ def process_product(product_data, verbose=True):
         return None
 
 
-def process_batch(batch_data, verbose=True):
+def build_batch_records(batch_data):
     """
-    Process a batch of products: scrape all, then write all to database at once.
-    batch_data: list of dicts with "product_id" and "result" keys
-    Returns (success_count, failed_count)
+    Normalize scraped batch results into the rows a batch write consists of:
+        {"sales": [graded_sales rows],
+         "products": [products updates for changed pages],
+         "checked": [products updates for unchanged pages],
+         "pop": {product_id: {grade: psa_count}},
+         "completed": [product_ids to mark completed]}
+    batch_data: list of process_product() results (None entries are skipped)
     """
-    if not batch_data:
-        return 0, 0
-
-    from datetime import datetime
-
-    # Prepare all database writes
-    all_sales_records = []
-    product_updates = []
-    progress_updates = []
+    records = scrape_spool.empty_records()
+    scraped_at = datetime.now(timezone.utc).isoformat()
 
     for item in batch_data:
         if item is None:
             continue
 
+        # Unchanged page: only record that it was checked (feeds the scrape priority)
+        if item.get("unchanged"):
+            records["checked"].append({
+                "id": item["product_id"],
+                "last_scraped_at": scraped_at,
+                "last_scrape_new_sales": 0
+            })
+            records["completed"].append(item["product_id"])
+            continue
+
         product_id = item["product_id"]
         result = item["result"]
+        records_before = len(records["sales"])
 
         # Collect sales records
         grades = result.get("grades", {})
@@ -348,16 +455,11 @@ def process_batch(batch_data, verbose=True):
                 if not date_str or price is None or not url:
                     continue
 
-                # Parse date
-                try:
-                    parsed_date = datetime.strptime(date_str, "%Y-%m-%d").date().isoformat()
-                except ValueError:
-                    try:
-                        parsed_date = datetime.strptime(date_str, "%b %d, %Y").date().isoformat()
-                    except ValueError:
-                        continue
+                parsed_date = parse_sale_date(date_str)
+                if not parsed_date:
+                    continue
 
-                all_sales_records.append({
+                records["sales"].append({
                     'product_id': product_id,
                     'grade': grade,
                     'sale_date': parsed_date,
@@ -370,173 +472,419 @@ def process_batch(batch_data, verbose=True):
         pop_count = result.get("pop_report", {})
         product_url = result.get("product_url")
 
-        product_updates.append({
+        update = {
             "id": product_id,
-            "pop_count": pop_count,
-            "pricecharting_url": product_url
-        })
+            "pricecharting_url": product_url,
+            "last_scraped_at": scraped_at,
+            "last_scrape_new_sales": len(records["sales"]) - records_before
+        }
+        # pop_report None: the pop fetch failed, so the stored counts stay
+        if pop_count is not None:
+            update["pop_count"] = pop_count
+        # Advance the sales high-water marks (only reached once the sales upsert succeeds)
+        if result.get("sales_watermarks"):
+            update["sales_watermarks"] = result["sales_watermarks"]
+        if result.get("page_fingerprint"):
+            update["page_fingerprint"] = result["page_fingerprint"]
+        if result.get("pop_refreshed"):
+            update["pop_refreshed_at"] = scraped_at
+        records["products"].append(update)
+
+        if pop_count:
+            records["pop"][product_id] = pop_count
 
         # Collect progress updates
-        progress_updates.append(product_id)
+        records["completed"].append(product_id)
+
+    return records
 
-    # Build pop_data map: {product_id: {grade: psa_count}}
-    pop_data = {}
-    for item in batch_data:
-        if item and item["result"].get("pop_report"):
-            pop_data[item["product_id"]] = item["result"]["pop_report"]
 
-    # Now write everything in batches
+def write_batch_records(records, verbose=True, sales_chunk=5000, id_chunk=200, pricing="incremental"):
+    """
+    Write build_batch_records() output: sales first, then graded prices, product
+    updates and progress. Sales go out in POST bodies of up to `sales_chunk` rows;
+    steps filtered by product id (in the query string) take `id_chunk` ids at a time.
+    Graded prices (see PRICING_MODES) are updated from the sales the insert actually
+    added ("incremental"), recomputed from each product's sales history ("full"), or
+    recomputed inside Postgres by refresh_graded_prices ("database").
+    Returns (success_count, failed_count).
+    """
+    completed = records["completed"]
+    if not completed:
+        return 0, 0
+
     success_count = 0
     failed_count = 0
 
-    # 1. Batch upsert all sales records
+    # 1. Batch insert all sales records; already-stored sales are skipped, and the
+    #    response lists only the rows actually inserted
+    all_sales_records = records["sales"]
+    inserted_sales = []
     if all_sales_records:
         try:
             if verbose:
                 print(f"\n💾 Writing {len(all_sales_records)} sales records to database...")
-            supabase.table('graded_sales').upsert(
-                all_sales_records,
-                on_conflict='product_id,sale_date,price,ebay_url'
-            ).execute()
+            for i in range(0, len(all_sales_records), sales_chunk):
+                resp = supabase.table('graded_sales').upsert(
+                    all_sales_records[i:i + sales_chunk],
+                    on_conflict='product_id,sale_date,price,ebay_url',
+                    ignore_duplicates=True
+                ).execute()
+                inserted_sales.extend(resp.data or [])
         except Exception as e:
             print(f"   ❌ Error batch saving sales: {e}")
-            failed_count = len(batch_data)
+            failed_count = len(completed)
             return 0, failed_count
 
-    # 2. Compute and upsert market prices into graded_prices
-    processed_ids = [u["id"] for u in product_updates]
-    compute_graded_prices_batch(processed_ids, pop_data=pop_data, verbose=verbose)
-
-    # 4. Batch update products (pop_count and pricecharting_url)
+    # 2. Update market prices in graded_prices (changed products only)
+    processed_ids = [u["id"] for u in records["products"]]
+    if pricing == "incremental":
+        update_graded_prices(inserted_sales, processed_ids, pop_data=records["pop"],
+                             verbose=verbose, id_chunk=id_chunk)
+    elif pricing == "database":
+        refresh_graded_prices_in_db(inserted_sales, processed_ids, pop_data=records["pop"],
+                                    verbose=verbose, id_chunk=id_chunk)
+    else:
+        for i in range(0, len(processed_ids), id_chunk):
+            compute_graded_prices_batch(processed_ids[i:i + id_chunk], pop_data=records["pop"], verbose=verbose)
+
+    # 3. Batch update products (pop_count, pricecharting_url, scrape bookkeeping)
+    product_updates = records["products"] + records["checked"]
     if product_updates:
         try:
             if verbose:
                 print(f"💾 Updating {len(product_updates)} product records...")
-            for update in product_updates:
-                supabase.table("products").update({
-                    "pop_count": update["pop_count"],
-                    "pricecharting_url": update["pricecharting_url"]
-                }).eq("id", update["id"]).execute()
+            bulk_update(supabase, "products", product_updates)
         except Exception as e:
             print(f"   ❌ Error batch updating products: {e}")
 
-    # 5. Batch mark as completed
-    if progress_updates:
-        try:
-            if verbose:
-                print(f"💾 Marking {len(progress_updates)} products as completed...")
-            for product_id in progress_updates:
-                supabase.table("product_grade_progress").update({
-                    "completed": True,
-                    "updated_at": "now()"
-                }).eq("product_id", product_id).execute()
-            success_count = len(progress_updates)
-        except Exception as e:
-            print(f"   ❌ Error batch updating progress: {e}")
-            failed_count = len(batch_data)
-            return 0, failed_count
+    # 4. Batch mark as completed
+    try:
+        if verbose:
+            print(f"💾 Marking {len(completed)} products as completed...")
+        # Same values for every row, so a single filtered update covers each chunk
+        for i in range(0, len(completed), id_chunk):
+            supabase.table("product_grade_progress").update({
+                "completed": True,
+                "updated_at": "now()",
+                "lease_owner": None,
+                "lease_expires_at": None
+            }).in_("product_id", completed[i:i + id_chunk]).execute()
+        success_count = len(completed)
+    except Exception as e:
+        print(f"   ❌ Error batch updating progress: {e}")
+        failed_count = len(completed)
+        return 0, failed_count
 
     if verbose:
-        print(f"✅ Batch write complete: {success_count} products saved\n")
+        print(f"✅ Batch write complete: {success_count} products saved "
+              f"({len(records['checked'])} unchanged, writes skipped)\n")
 
     return success_count, failed_count
 
 
-def calculate_market_price(sales, half_life=21):
+def process_batch(batch_data, verbose=True, pricing="incremental"):
     """
-    Calculate market price using a time-decay weighted geometric mean.
-    Returns -1 when no sales exist (not 0, to distinguish from a zero price).
+    Write a scraped batch to the database.
+    batch_data: list of process_product() results
+    Returns (success_count, failed_count)
     """
-    if not sales:
-        return {"price": -1, "sample_size": 0}
+    if not batch_data:
+        return 0, 0
+    return write_batch_records(build_batch_records(batch_data), verbose=verbose,
+                               pricing=pricing)
 
-    parsed = []
-    max_ts = 0
-    for sale in sales:
-        try:
-            price = sale["price"]
-            if not price or price <= 0:
-                continue
-            ts = datetime.fromisoformat(sale["sale_date"]).timestamp()
-            max_ts = max(max_ts, ts)
-            parsed.append({"price": price, "ts": ts})
-        except Exception:
-            continue
 
-    if not parsed:
-        return {"price": -1, "sample_size": 0}
+def spool_batch(batch_data, spool, owner, lease_seconds, verbose=True):
+    """
+    Spool mode: write a scraped batch's records to a spool file (scrape_spool.py)
+    for load_spool.py instead of the database. The products stay claimed for
+    `lease_seconds` so no other runner scrapes them again before they're loaded.
+    Returns (success_count, failed_count)
+    """
+    if not batch_data:
+        return 0, 0
+    records = build_batch_records(batch_data)
+    path = spool.write(records)
+    if not path:
+        return 0, 0
+    if verbose:
+        print(f"\n📦 Spooled {len(records['completed'])} products "
+              f"({len(records['sales'])} sales) to {path}\n")
+
+    try:
+        supabase.rpc("renew_grade_leases", {
+            "p_owner": owner,
+            "p_product_ids": records["completed"],
+            "p_lease_seconds": lease_seconds,
+        }).execute()
+    except Exception as e:
+        # Already durable in the spool; at worst another runner scrapes them again
+        print(f"   ⚠️  Error extending leases for {len(records['completed'])} spooled products: {e}")
 
-    weighted_log_sum = 0.0
-    sum_weights = 0.0
-    for item in parsed:
-        days_ago = max(0, (max_ts - item["ts"]) / 86400)
-        weight = math.pow(2, -days_ago / half_life)
-        weighted_log_sum += weight * math.log(item["price"])
-        sum_weights += weight
+    return len(records["completed"]), 0
 
-    if sum_weights == 0:
-        return {"price": -1, "sample_size": len(parsed)}
 
-    fair_price = math.exp(weighted_log_sum / sum_weights)
-    liquidity_factor = min(1, math.sqrt(sum_weights))
-    return {"price": fair_price * liquidity_factor, "sample_size": len(parsed)}
+class BatchWriter(threading.Thread):
+    """
+    Writer stage of the scrape pipeline: runs `write` (process_batch(), or a spool
+    writer) for scraped batches on its own thread so write latency overlaps with
+    scraping the next batch.
+    The queue is bounded, so scraping pauses when the writer falls `max_pending`
+    batches behind. on_done(product_ids) is called after each batch's write attempt,
+    on_written(product_ids) only for products a successful write covered.
+    """
 
+    def __init__(self, max_pending=2, verbose=True, on_done=None, on_written=None, write=process_batch):
+        super().__init__(name="batch-writer", daemon=True)
+        self.write = write
+        self.verbose = verbose
+        self.on_done = on_done
+        self.on_written = on_written
+        self.success = 0
+        self.failed = 0
+        self.batches_written = 0
+        self.write_seconds = 0.0
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def submit(self, batch_results, product_ids):
+        """Queue a scraped batch for writing; blocks while the queue is full."""
+        self._queue.put((batch_results, product_ids))
+
+    def pending_batches(self):
+        return self._queue.qsize()
+
+    def average_write_seconds(self):
+        return self.write_seconds / self.batches_written if self.batches_written else 0.0
+
+    def close(self):
+        """Write whatever is queued, then stop the thread."""
+        self._queue.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch_results, product_ids = item
+            started = time.monotonic()
+            try:
+                success, failed = self.write(batch_results, verbose=self.verbose)
+            except Exception as e:
+                print(f"   ❌ Error writing batch: {e}")
+                success, failed = 0, len(batch_results)
+
+            self.write_seconds += time.monotonic() - started
+            self.batches_written += 1
+            self.success += success
+            self.failed += failed
+            if success and self.on_written:
+                self.on_written([item["product_id"] for item in batch_results if item is not None])
+            if self.on_done:
+                self.on_done(product_ids)
+
+
+class TimeBudget:
+    """
+    Wall-clock budget for a run, with measured scrape throughput, so the run can
+    stop claiming work while there's still time to finish and write what it has.
+    """
 
-def compute_graded_prices_batch(product_ids, pop_data=None, verbose=True):
+    # Slack kept free for the final flush on top of the measured write time
+    SAFETY_SECONDS = 60
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.scraped = 0
+        self.scrape_seconds = 0.0
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return self.seconds - self.elapsed()
+
+    def record_batch(self, products, seconds):
+        self.scraped += products
+        self.scrape_seconds += seconds
+
+    def seconds_per_product(self):
+        return self.scrape_seconds / self.scraped if self.scraped else None
+
+    def products_that_fit(self, writer):
+        """
+        How many more products can be scraped and still be written inside the budget
+        (None before anything has been measured).
+        """
+        per_product = self.seconds_per_product()
+        if per_product is None:
+            return None
+        # Everything queued plus the batch about to be scraped still has to be written
+        reserve = writer.average_write_seconds() * (writer.pending_batches() + 2) + self.SAFETY_SECONDS
+        return max(0, int((self.remaining() - reserve) / per_product))
+
+
+class LeaseKeeper(threading.Thread):
     """
-    Fetch all graded_sales for the given product_ids, compute a market price
-    per (product_id, grade), and upsert the results into graded_prices.
+    Renews this runner's claims on product_grade_progress rows every lease_seconds / 3
+    until they're released. Products that were written are completed (and no longer
+    renewable); products that failed are released and their lease simply runs out,
+    so another runner can retry them later.
     """
-    if not product_ids:
-        return
 
-    if verbose:
-        print(f"\n🧮 Computing graded prices for {len(product_ids)} products...")
+    def __init__(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        super().__init__(name="lease-keeper", daemon=True)
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def hold(self, product_ids):
+        with self._lock:
+            self._held.update(product_ids)
+
+    def release(self, product_ids):
+        with self._lock:
+            self._held.difference_update(product_ids)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._lock:
+                held = list(self._held)
+            if not held:
+                continue
+            try:
+                supabase.rpc("renew_grade_leases", {
+                    "p_owner": self.owner,
+                    "p_product_ids": held,
+                    "p_lease_seconds": self.lease_seconds,
+                }).execute()
+            except Exception as e:
+                print(f"   ⚠️  Error renewing {len(held)} leases: {e}")
+
+
+def replay_journal(journal, batch_size=50, verbose=True, write=process_batch):
+    """
+    Write results a previous run scraped but never wrote (see scrape_journal.py)
+    and acknowledge them. Returns (success_count, failed_count).
+    """
+    pending = journal.pending()
+    if not pending:
+        return 0, 0
+
+    print(f"♻️  Replaying {len(pending)} scraped results from {journal.path}...")
+    total_success = 0
+    total_failed = 0
+    for i in range(0, len(pending), batch_size):
+        chunk = pending[i:i + batch_size]
+        success, failed = write(chunk, verbose=verbose)
+        if success:
+            journal.ack(item["product_id"] for item in chunk)
+        total_success += success
+        total_failed += failed
+    return total_success, total_failed
 
-    # Fetch all sales for these products in paginated batches
-    all_sales = []
-    page_size = 1000
-    offset = 0
+
+def fetch_pricing_sales(product_ids, page_size=1000):
+    """
+    The sales needed to price the products (RPC pricing_sales_window): only sales
+    within horizon_days() of their group's latest sale, read with keyset pagination,
+    plus each group's full priced-sale count.
+    Returns (sales, {(product_id, grade): sample_size}); (None, None) on error.
+    """
+    sales = []
+    sample_sizes = {}
+    cursor = {}
     while True:
         try:
-            resp = (
-                supabase.table("graded_sales")
-                .select("product_id, grade, sale_date, price")
-                .in_("product_id", product_ids)
-                .range(offset, offset + page_size - 1)
-                .execute()
-            )
+            resp = supabase.rpc("pricing_sales_window", {
+                "p_product_ids": product_ids,
+                "p_horizon_days": horizon_days(),
+                "p_limit": page_size,
+                **cursor,
+            }).execute()
         except Exception as e:
             print(f"   ❌ Error fetching graded_sales: {e}")
-            return
-        if not resp.data:
-            break
-        all_sales.extend(resp.data)
-        if len(resp.data) < page_size:
+            return None, None
+        rows = resp.data or []
+        for row in rows:
+            sample_sizes[(row["product_id"], row["grade"])] = row["group_sales"]
+        sales.extend(rows)
+        if len(rows) < page_size:
             break
-        offset += page_size
+        last = rows[-1]
+        cursor = {
+            "p_after_product_id": last["product_id"],
+            "p_after_grade": last["grade"],
+            "p_after_sale_date": last["sale_date"],
+            "p_after_price": last["price"],
+            "p_after_ebay_url": last["ebay_url"],
+        }
+    return sales, sample_sizes
 
-    if not all_sales:
-        if verbose:
-            print("   ⚠️  No sales found for these products.")
-        return
 
-    # Group by (product_id, grade)
-    groups: dict = defaultdict(list)
-    for sale in all_sales:
-        if sale.get("grade") is not None and sale.get("price") is not None:
-            groups[(sale["product_id"], sale["grade"])].append(sale)
+def price_state_from_history(sales, sample_sizes):
+    """(keys, PriceState) for fetch_pricing_sales() output."""
+    arrays = SalesArrays.from_sales(priceable_sales(sales))
+    state = grouped_price_state(arrays)
+    # Sales outside the window don't move the price but still count
+    state.sample_size = np.array([sample_sizes[key] for key in arrays.keys], dtype=np.int64)
+    return arrays.keys, state
 
-    # Compute and collect upsert records
-    price_records = []
+
+def priceable_sales(sales):
+    """The sales pricing looks at (a PSA grade - not 0/Ungraded - and a price)."""
+    return [sale for sale in sales if sale.get("grade") and sale.get("price") is not None]
+
+
+def fetch_price_state(product_ids):
+    """{(product_id, grade): graded_price_state row} for the products."""
+    resp = (
+        supabase.table("graded_price_state")
+        .select(", ".join(["product_id", "grade", *PriceState.columns()]))
+        .in_("product_id", product_ids)
+        .execute()
+    )
+    return {(row["product_id"], row["grade"]): row for row in resp.data or []}
+
+
+def invalidate_price_state(product_ids):
+    """Drop the products' state so their next price update recomputes from full history."""
+    try:
+        supabase.table("graded_price_state").delete().in_("product_id", product_ids).execute()
+    except Exception as e:
+        print(f"   ⚠️  Error invalidating price state for {len(product_ids)} products "
+              f"(--verify-pricing will repair it): {e}")
+
+
+def save_graded_prices(keys, state, pop_data=None, batch_size=500):
+    """
+    Upsert graded_price_state and graded_prices for the groups `keys` (aligned
+    with the PriceState `state`), `batch_size` rows per request. graded_prices goes
+    through the upsert_graded_prices RPC, which also appends changed prices to
+    graded_price_history. Returns True if both writes succeeded.
+    """
+    # market_price, market_price_7d, ... for every horizon, plus the trend between them
+    prices = {f"market_price{column_suffix(h)}": state.prices(h) for h in state.half_lives}
+    trend = state.trend()
+    state_rows = state.rows(keys)
     now = datetime.now().isoformat()
-    for (product_id, grade), sales in groups.items():
-        result = calculate_market_price(sales)
+    price_records = []
+    state_records = []
+    for i, (product_id, grade) in enumerate(keys):
         record = {
             "product_id": product_id,
             "grade": grade,
-            "market_price": result["price"],
-            "sample_size": result["sample_size"],
+            **{column: float(price[i]) for column, price in prices.items()},
+            "price_trend": None if np.isnan(trend[i]) else float(trend[i]),
+            "sample_size": int(state.sample_size[i]),
             "last_updated": now,
         }
         if pop_data:
@@ -544,95 +892,382 @@ def compute_graded_prices_batch(product_ids, pop_data=None, verbose=True):
             if psa_pop is not None:
                 record["psa_pop"] = psa_pop
         price_records.append(record)
+        state_records.append({
+            "product_id": product_id,
+            "grade": grade,
+            **state_rows[(product_id, grade)],
+            "updated_at": now,
+        })
+
+    ok = True
+    for table, records in (("graded_price_state", state_records), ("graded_prices", price_records)):
+        # psa_pop is only present for some groups; PostgREST bulk upserts need one key set
+        for columns in {tuple(sorted(r)) for r in records}:
+            same = [r for r in records if tuple(sorted(r)) == columns]
+            for i in range(0, len(same), batch_size):
+                try:
+                    if table == "graded_prices":
+                        supabase.rpc("upsert_graded_prices", {"p_rows": same[i: i + batch_size]}).execute()
+                    else:
+                        supabase.table(table).upsert(
+                            same[i: i + batch_size], on_conflict="product_id,grade"
+                        ).execute()
+                except Exception as e:
+                    print(f"   ❌ Error upserting {table} batch {i // batch_size + 1}: {e}")
+                    ok = False
+    return ok
+
+
+def compute_graded_prices_batch(product_ids, pop_data=None, verbose=True):
+    """
+    Fetch the graded_sales that price the given product_ids, compute a market price
+    per (product_id, grade), and upsert the results (and the decayed sums they
+    came from) into graded_prices and graded_price_state.
+    """
+    if not product_ids:
+        return
 
-    if not price_records:
+    if verbose:
+        print(f"\n🧮 Computing graded prices for {len(product_ids)} products...")
+
+    all_sales, sample_sizes = fetch_pricing_sales(product_ids)
+    if not all_sales:
+        if verbose and all_sales is not None:
+            print("   ⚠️  No sales found for these products.")
         return
 
-    # Upsert in batches of 500
-    batch_size = 500
-    for i in range(0, len(price_records), batch_size):
-        batch = price_records[i: i + batch_size]
-        try:
-            supabase.table("graded_prices").upsert(
-                batch, on_conflict="product_id,grade"
-            ).execute()
-        except Exception as e:
-            print(f"   ❌ Error upserting graded_prices batch {i // batch_size + 1}: {e}")
+    # Compute every (product_id, grade) at once (pricing_engine.py)
+    keys, state = price_state_from_history(all_sales, sample_sizes)
+    if not save_graded_prices(keys, state, pop_data):
+        invalidate_price_state(product_ids)
+        return
 
     if verbose:
-        print(f"   ✅ Upserted {len(price_records)} graded price records "
+        print(f"   ✅ Upserted {len(keys)} graded price records "
               f"across {len(product_ids)} products")
 
 
+def update_graded_prices(inserted_sales, product_ids, pop_data=None, verbose=True, id_chunk=200):
+    """
+    Bring graded_prices up to date for scraped products after their sales were written,
+    in O(new sales): inserted_sales (the graded_sales rows the write actually inserted)
+    are folded into each group's graded_price_state. Products without state are priced
+    from full history once, which creates it. Groups with no new sales only get their
+    psa_pop refreshed.
+    """
+    pop_data = pop_data or {}
+    new_sales = priceable_sales(inserted_sales)
+    with_new = list(dict.fromkeys(sale["product_id"] for sale in new_sales))
+
+    state_rows = {}
+    try:
+        for i in range(0, len(with_new), id_chunk):
+            state_rows.update(fetch_price_state(with_new[i:i + id_chunk]))
+    except Exception as e:
+        print(f"   ⚠️  Error fetching price state, recomputing from full history: {e}")
+        state_rows = {}
+    # State written before a horizon was added lacks its sums; such products start over
+    incomplete = {product_id for (product_id, _), row in state_rows.items() if not PriceState.is_complete(row)}
+    has_state = {product_id for product_id, _ in state_rows} - incomplete
+    state_rows = {key: row for key, row in state_rows.items() if key[0] in has_state}
+
+    bootstrap = [product_id for product_id in with_new if product_id not in has_state]
+    for i in range(0, len(bootstrap), id_chunk):
+        compute_graded_prices_batch(bootstrap[i:i + id_chunk], pop_data=pop_data, verbose=verbose)
+
+    priced = set()
+    incremental = [sale for sale in new_sales if sale["product_id"] in has_state]
+    if incremental:
+        arrays = SalesArrays.from_sales(incremental)
+        state = grouped_price_state(arrays, prior=PriceState.from_rows(arrays.keys, state_rows))
+        if save_graded_prices(arrays.keys, state, pop_data):
+            priced.update(arrays.keys)
+            if verbose:
+                print(f"\n🧮 Folded {len(incremental)} new sales into {len(arrays.keys)} graded prices "
+                      f"({len(bootstrap)} products priced from full history)")
+        else:
+            invalidate_price_state(list(dict.fromkeys(product_id for product_id, _ in arrays.keys)))
+
+    # Pop counts change without new sales; update them on the existing graded_prices rows
+    bootstrapped = set(bootstrap)
+    update_pop_counts([product_id for product_id in product_ids if product_id not in bootstrapped],
+                      pop_data, skip=priced)
+
+
+def update_pop_counts(product_ids, pop_data, skip=()):
+    """Set psa_pop on the products' existing graded_prices rows, except the (product_id, grade) keys in skip."""
+    pop_rows = [
+        {"product_id": product_id, "grade": grade, "psa_pop": psa_pop}
+        for product_id in product_ids
+        for grade, psa_pop in (pop_data or {}).get(product_id, {}).items()
+        if (product_id, grade) not in skip
+    ]
+    if not pop_rows:
+        return
+    try:
+        bulk_update(supabase, "graded_prices", pop_rows, key_columns=("product_id", "grade"))
+    except Exception as e:
+        print(f"   ❌ Error updating graded_prices psa_pop: {e}")
+        return
+
+    # Snapshot pop counts that moved into graded_price_history
+    changed_ids = list(dict.fromkeys(row["product_id"] for row in pop_rows))
+    try:
+        supabase.rpc("record_graded_price_history", {"p_product_ids": changed_ids}).execute()
+    except Exception as e:
+        print(f"   ⚠️  psa_pop written, but recording graded_price_history failed: {e}")
+
+
+def refresh_graded_prices_in_db(inserted_sales, product_ids, pop_data=None, verbose=True, id_chunk=200):
+    """
+    Recompute graded_prices (and graded_price_state) inside Postgres with the
+    refresh_graded_prices RPC for the products that got new sales; no sales are
+    transferred. psa_pop is then set for all scraped products.
+    """
+    with_new = list(dict.fromkeys(sale["product_id"] for sale in inserted_sales))
+    written = 0
+    for i in range(0, len(with_new), id_chunk):
+        chunk = with_new[i:i + id_chunk]
+        try:
+            written += supabase.rpc("refresh_graded_prices", {"p_product_ids": chunk}).execute().data or 0
+        except Exception as e:
+            print(f"   ❌ Error refreshing graded prices for {len(chunk)} products: {e}")
+            invalidate_price_state(chunk)
+    if verbose and with_new:
+        print(f"\n🧮 Refreshed {written} graded prices in the database for {len(with_new)} products")
+
+    update_pop_counts(product_ids, pop_data)
+
+
+def verify_graded_prices(batch_size=200, max_products=None, tolerance=1e-6, verbose=True):
+    """
+    Recompute every product from its sales history, compare with the stored
+    graded_price_state, and rewrite the products that drifted (sales written
+    outside process_db, a lost or invalidated state write, sales but no state at
+    all, ...). Walks products rather than graded_price_state so products without
+    state rows are covered too. Returns (checked, repaired).
+    """
+    checked = 0
+    repaired = 0
+    cursor = None
+    while max_products is None or checked < max_products:
+        query = supabase.table("products").select("id").order("id").limit(batch_size * 10)
+        if cursor:
+            query = query.gt("id", cursor)
+        rows = query.execute().data or []
+        if not rows:
+            break
+        product_ids = [row["id"] for row in rows]
+        cursor = product_ids[-1]
+        if max_products is not None:
+            product_ids = product_ids[:max_products - checked]
+
+        for i in range(0, len(product_ids), batch_size):
+            chunk = product_ids[i:i + batch_size]
+            stored = fetch_price_state(chunk)
+            all_sales, sample_sizes = fetch_pricing_sales(chunk)
+            if all_sales is None:
+                continue
+            keys, expected = price_state_from_history(all_sales, sample_sizes)
+            drifted = {product_id for (product_id, _), row in stored.items() if not PriceState.is_complete(row)}
+            stored = {key: row for key, row in stored.items() if key[0] not in drifted}
+            stored_state = PriceState.from_rows(keys, stored)
+
+            for half_life in expected.half_lives:
+                expected_price = expected.prices(half_life)
+                stored_price = stored_state.prices(half_life)
+                for j, key in enumerate(keys):
+                    if (key not in stored or stored[key]["sample_size"] != expected.sample_size[j]
+                            or abs(stored_price[j] - expected_price[j]) > tolerance * max(1.0, abs(expected_price[j]))):
+                        drifted.add(key[0])
+            expected_keys = set(keys)
+            drifted.update(product_id for product_id, grade in stored if (product_id, grade) not in expected_keys)
+
+            if drifted:
+                if verbose:
+                    print(f"   🔧 {len(drifted)} of {len(chunk)} products drifted; recomputing")
+                drifted = sorted(drifted)
+                invalidate_price_state(drifted)
+                compute_graded_prices_batch(drifted, verbose=False)
+            checked += len(chunk)
+            repaired += len(drifted)
+
+        if verbose:
+            print(f"   Verified {checked} products, {repaired} repaired")
+        if len(rows) < batch_size * 10:
+            break
+
+    return checked, repaired
+
+
 def main():
     """
     Main function to process all incomplete products in batches.
     """
-    import time
     import argparse
 
     parser = argparse.ArgumentParser(description="Process PriceCharting grade data for products")
     parser.add_argument("--batch-size", type=int, default=50, help="Number of products to fetch/write per batch")
     parser.add_argument("--max-products", type=int, default=None, help="Maximum number of products to process (for testing)")
-    parser.add_argument("--delay", type=float, default=2.0, help="Delay in seconds between scrape requests")
+    parser.add_argument("--delay", type=float, default=2.0, help="Starting spacing in seconds between HTTP requests (the shared rate adapts to upstream health from there)")
+    parser.add_argument("--workers", type=int, default=4, help="Products fetched concurrently (all share the --delay rate limit)")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS, help="How long claimed products stay reserved for this runner without renewal")
+    parser.add_argument("--journal", default=scrape_journal.DEFAULT_PATH, help="Local journal of scraped-but-unwritten results (replayed on start)")
+    parser.add_argument("--no-journal", action="store_true", help="Don't journal scraped results")
+    parser.add_argument("--replay-only", action="store_true", help="Write any journaled results, then exit without scraping")
+    parser.add_argument("--time-budget", type=float, default=None, help="Wall-clock seconds for the run: stop claiming work in time to finish and write it")
+    parser.add_argument("--spool-dir", default=None, help="Scrape only: write records to compressed spool files here for load_spool.py instead of the database")
+    parser.add_argument("--spool-lease-seconds", type=int, default=DEFAULT_SPOOL_LEASE_SECONDS, help="How long spooled products stay claimed while waiting to be loaded")
+    parser.add_argument("--pricing", choices=PRICING_MODES, default="incremental", help="How graded prices are updated after a write: fold new sales into graded_price_state (incremental), recompute from sales history here (full), or recompute in Postgres with refresh_graded_prices (database)")
+    parser.add_argument("--verify-pricing", action="store_true", help="Recompute every product from full sales history, repair graded prices that drifted from it, then exit")
+    parser.add_argument("--full-rescan", action="store_true", help="Ignore page fingerprints and sales watermarks and re-send every visible sale")
     args = parser.parse_args()
 
+    if args.verify_pricing:
+        print("🔍 Verifying graded prices against full sales history...")
+        checked, repaired = verify_graded_prices(batch_size=args.batch_size, max_products=args.max_products)
+        print(f"✅ Verified {checked} products, repaired {repaired}")
+        return
+
+    # Every fetch goes through the shared client, so one rate limit covers the whole job
+    http_client.configure(rate=1 / args.delay, pool_size=max(args.workers * 2, http_client.DEFAULT_POOL_SIZE))
+
     print("🚀 Starting PriceCharting Grade Data Processor")
-    print(f"   Batch size: {args.batch_size} (scrape {args.batch_size}, then write all at once)")
-    print(f"   Delay between requests: {args.delay}s")
+    print(f"   Batch size: {args.batch_size} (scrape {args.batch_size}, then write all at once while the next batch scrapes)")
+    print(f"   Request rate: {1 / args.delay:.2f}/s (one request every {args.delay}s), {args.workers} workers")
     if args.max_products:
         print(f"   Max products to process: {args.max_products}")
+    if args.time_budget:
+        print(f"   Time budget: {args.time_budget:.0f}s")
+    if args.spool_dir:
+        print(f"   Spool mode: writing records to {args.spool_dir} (load with load_spool.py)")
     print()
 
-    total_processed = 0
-    total_success = 0
-    total_failed = 0
-    offset = 0
+    budget = TimeBudget(args.time_budget) if args.time_budget else None
 
-    while True:
-        # Check if we've hit the max limit
-        if args.max_products and total_processed >= args.max_products:
-            print(f"\n✅ Reached max products limit ({args.max_products})")
-            break
+    # SIGTERM (job cancelled / outer timeout): stop scraping, flush what we have
+    stop_requested = threading.Event()
 
-        # Fetch next batch
-        print(f"📥 Fetching batch (offset: {offset})...")
-        products = fetch_incomplete_products(limit=args.batch_size, offset=offset)
+    def handle_sigterm(signum, frame):
+        print("\n🛑 SIGTERM received - finishing up and flushing pending writes...")
+        stop_requested.set()
 
-        if not products:
-            print("✅ No more incomplete products found!")
-            break
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
-        print(f"📊 Scraping {len(products)} products in this batch\n")
+    total_processed = 0
 
-        # Scrape all products in batch (collect data, don't write yet)
-        batch_results = []
-        for i, product_data in enumerate(products, 1):
-            # Check max limit
-            if args.max_products and total_processed >= args.max_products:
-                break
+    # Claims identify this runner; parallel runners never get the same products
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    # Batches go to the database, or in spool mode to spool files for load_spool.py
+    def write(batch_data, verbose=True):
+        return process_batch(batch_data, verbose=verbose, pricing=args.pricing)
+
+    if args.spool_dir:
+        spool = scrape_spool.SpoolWriter(args.spool_dir, prefix=owner)
+
+        def write(batch_data, verbose=True):
+            return spool_batch(batch_data, spool, owner, args.spool_lease_seconds, verbose=verbose)
+
+    # Write whatever an interrupted run scraped before scraping anything new
+    journal = None
+    if not args.no_journal:
+        journal = scrape_journal.ScrapeJournal(args.journal)
+        replayed, replay_failed = replay_journal(journal, batch_size=args.batch_size, write=write)
+        if replayed or replay_failed:
+            print(f"♻️  Replayed {replayed} journaled results ({replay_failed} failed)\n")
+    if args.replay_only:
+        if journal:
+            journal.close()
+        return
 
-            print(f"[{total_processed + 1}] ", end="")
+    leases = LeaseKeeper(owner, lease_seconds=args.lease_seconds)
+    leases.start()
+    print(f"   Lease owner: {owner}\n")
 
-            scraped_data = process_product(product_data, verbose=True)
-            batch_results.append(scraped_data)
+    # Scraping happens on this thread; writes happen on the writer thread
+    writer = BatchWriter(max_pending=2, verbose=True, on_done=leases.release,
+                         on_written=journal.ack if journal else None, write=write)
+    writer.start()
 
-            total_processed += 1
+    # Set listings fetched this run, so a group spanning several batches is matched once
+    resolver = ListingResolver(supabase)
 
-            # Add delay between scrape requests to be respectful
-            if i < len(products) and (not args.max_products or total_processed < args.max_products):
-                time.sleep(args.delay)
+    try:
+        while True:
+            if stop_requested.is_set():
+                break
 
-            print()
+            # Check if we've hit the max limit
+            if args.max_products and total_processed >= args.max_products:
+                print(f"\n✅ Reached max products limit ({args.max_products})")
+                break
 
-        # Write all scraped data to database at once
-        success, failed = process_batch(batch_results, verbose=True)
-        total_success += success
-        total_failed += failed
+            # Claim next batch (at most what's left of --max-products)
+            limit = args.batch_size
+            if args.max_products:
+                limit = min(limit, args.max_products - total_processed)
+
+            # ...and no more than can still be scraped and written inside the time budget
+            if budget:
+                fit = budget.products_that_fit(writer)
+                if fit is not None and fit < limit:
+                    if fit == 0:
+                        print(f"\n⏱️  Time budget nearly spent ({budget.remaining():.0f}s left) - not claiming more work")
+                        break
+                    print(f"⏱️  {budget.remaining():.0f}s left in the time budget: claiming {fit} products")
+                    limit = fit
+            print("📥 Claiming batch...")
+            products = claim_incomplete_products(owner, limit=limit, lease_seconds=args.lease_seconds)
+
+            if not products:
+                print("✅ No more incomplete products found!")
+                break
 
-        # Move to next batch (offset stays 0 because completed items are filtered out)
-        if args.max_products and total_processed >= args.max_products:
-            break
+            leases.hold(p["id"] for p in products)
+
+            # Resolve missing URLs from set listings (one fetch per set) before falling back to search
+            resolved = resolver.resolve(products)
+            if resolved:
+                print(f"🔗 Resolved {resolved} product URLs from set listings")
+
+            print(f"📊 Scraping {len(products)} products in this batch\n")
+
+            if args.full_rescan:
+                for product_data in products:
+                    product_data["sales_watermarks"] = None
+                    product_data["page_fingerprint"] = None
+
+            def scrape(numbered):
+                if stop_requested.is_set():
+                    return None  # lease runs out; another run picks it up
+                scraped = process_product(numbered[1], verbose=True, label=f"[{numbered[0]}] ")
+                if journal:
+                    journal.append(scraped)  # durable before it waits for the writer
+                return scraped
+
+            # Scrape all products in batch (collect data, don't write yet). Every product is
+            # queued at once; the shared rate limiter decides when each request goes out, so
+            # one product's parsing overlaps the next product's fetches.
+            scrape_started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                batch_results = list(pool.map(scrape, enumerate(products, total_processed + 1)))
+            total_processed += len(products)
+            if budget:
+                budget.record_batch(len(products), time.monotonic() - scrape_started)
+
+            # Hand the batch to the writer and start scraping the next one
+            writer.submit(batch_results, [p["id"] for p in products])
+    finally:
+        # Flush batches already scraped even if scraping stopped early
+        print("⏳ Waiting for pending writes...")
+        writer.close()
+        leases.stop()
+        if journal:
+            journal.close()
+
+    total_success = writer.success
+    total_failed = writer.failed
 
     # Final summary
     print("\n" + "="*60)
@@ -642,6 +1277,17 @@ def main():
     print(f"   ✅ Successful: {total_success}")
     print(f"   ❌ Failed: {total_failed}")
     print(f"   Success rate: {(total_success/total_processed*100) if total_processed > 0 else 0:.1f}%")
+    print(f"   Final request rate: {http_client.get_client().rate:.2f}/s")
+    if budget:
+        per_product = budget.seconds_per_product()
+        remaining = count_incomplete_products()
+        print(f"   Elapsed: {budget.elapsed():.0f}s of {budget.seconds:.0f}s budget")
+        if per_product:
+            print(f"   Throughput: {3600 / per_product:.0f} products/hour ({per_product:.1f}s per product)")
+        if remaining is not None:
+            print(f"   Still queued: {remaining:,} products")
+            if per_product:
+                print(f"   Estimated time to finish the queue: {remaining * per_product / 3600:.1f}h at this rate")
     print("="*60)
 
 
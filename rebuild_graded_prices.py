@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Rebuild graded_prices (and graded_price_state) for the whole catalog from graded_sales.
+
+Sales are streamed in (product_id, grade, sale_date) order with keyset pagination
+(RPC stream_graded_sales, sql/009), cut into chunks of whole products, priced with
+pricing_engine and upserted in large batches. Memory stays at one chunk (plus the
+largest single product), however big graded_sales gets. psa_pop is left as it is.
+
+After each chunk is written the last product id is printed; a rebuild that stops
+(timeout, error) resumes from there with --start-after.
+
+Usage:
+    python rebuild_graded_prices.py
+    python rebuild_graded_prices.py --start-after 3f2c...-uuid
+    python rebuild_graded_prices.py --rows-per-chunk 50000 --upsert-chunk 2000
+    python rebuild_graded_prices.py --dry-run --max-products 1000
+"""
+
+import time
+import argparse
+
+from pricing_engine import SalesArrays, grouped_price_state
+from process_db import supabase, priceable_sales, save_graded_prices
+
+
+def stream_sales(start_after=None, page_size=1000):
+    """Yield every priced graded_sales row in (product_id, grade, sale_date) order."""
+    cursor = {"p_after_product_id": start_after} if start_after else {}
+    while True:
+        rows = supabase.rpc("stream_graded_sales", {"p_limit": page_size, **cursor}).execute().data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+        cursor = {
+            "p_after_product_id": last["product_id"],
+            "p_after_grade": last["grade"],
+            "p_after_sale_date": last["sale_date"],
+            "p_after_price": last["price"],
+            "p_after_ebay_url": last["ebay_url"],
+        }
+
+
+def product_chunks(rows, rows_per_chunk):
+    """Group a product-ordered row stream into lists of whole products, ~rows_per_chunk rows each."""
+    chunk = []
+    for row in rows:
+        if len(chunk) >= rows_per_chunk and row["product_id"] != chunk[-1]["product_id"]:
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild graded_prices for the whole catalog from graded_sales")
+    parser.add_argument("--start-after", default=None, help="Resume after this product id (printed after every chunk)")
+    parser.add_argument("--rows-per-chunk", type=int, default=20000, help="Sales priced per chunk (whole products)")
+    parser.add_argument("--page-size", type=int, default=1000, help="Sales per keyset page")
+    parser.add_argument("--upsert-chunk", type=int, default=1000, help="graded_prices rows per upsert request")
+    parser.add_argument("--max-products", type=int, default=None, help="Stop after roughly this many products")
+    parser.add_argument("--dry-run", action="store_true", help="Compute prices but don't write them")
+    args = parser.parse_args()
+
+    print("🏗️  Rebuilding graded prices from graded_sales")
+    if args.start_after:
+        print(f"   Resuming after product {args.start_after}")
+    print(f"   {args.rows_per_chunk} sales per chunk, {args.upsert_chunk} rows per upsert"
+          f"{' (DRY RUN - nothing written)' if args.dry_run else ''}\n")
+
+    started = time.monotonic()
+    total_sales = 0
+    total_groups = 0
+    total_products = 0
+    cursor = args.start_after
+    for chunk in product_chunks(stream_sales(args.start_after, args.page_size), args.rows_per_chunk):
+        arrays = SalesArrays.from_sales(priceable_sales(chunk))
+        state = grouped_price_state(arrays)
+        if not args.dry_run and not save_graded_prices(arrays.keys, state, batch_size=args.upsert_chunk):
+            print(f"\n❌ Write failed; resume with --start-after {cursor}" if cursor
+                  else "\n❌ Write failed; rerun from the start")
+            break
+
+        cursor = chunk[-1]["product_id"]
+        total_sales += len(chunk)
+        total_groups += len(arrays.keys)
+        total_products += len({key[0] for key in arrays.keys})
+        elapsed = time.monotonic() - started
+        print(f"✅ {total_products:,} products, {total_groups:,} prices, {total_sales:,} sales "
+              f"({total_sales / elapsed:,.0f} sales/s) - last product {cursor}")
+
+        if args.max_products and total_products >= args.max_products:
+            print(f"\n✅ Reached max products limit ({args.max_products}); resume with --start-after {cursor}")
+            break
+
+    print("\n" + "="*60)
+    print("📊 REBUILD COMPLETE")
+    print("="*60)
+    print(f"   Products: {total_products:,}")
+    print(f"   Graded prices: {total_groups:,}")
+    print(f"   Sales read: {total_sales:,}")
+    print(f"   Elapsed: {time.monotonic() - started:.0f}s")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
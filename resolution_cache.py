@@ -0,0 +1,116 @@
+"""
+Persistent cache of search_product() resolutions.
+
+Products without a pricecharting_url are resolved by a search request, a full
+results-page parse and a set-name match. This cache remembers the outcome per
+normalized (query, set_name): the resolved /game/ URL, its match score and when
+it was resolved. "No matching product found" is cached too (for a shorter time)
+so cards PriceCharting doesn't list stop costing a search on every run.
+
+Stored in a small SQLite file so concurrent threads and processes can share it.
+
+Configuration (environment):
+    RESOLUTION_CACHE=0                 disable the cache
+    RESOLUTION_CACHE_PATH=path         SQLite file (default .url_resolution.sqlite)
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = ".url_resolution.sqlite"
+
+DAY = 86400
+POSITIVE_TTL = 90 * DAY   # product URLs practically never move
+NEGATIVE_TTL = 7 * DAY    # new cards get listed; look again after a week
+
+
+def normalize(text):
+    """Case-fold and collapse whitespace so trivially different queries share an entry."""
+    return re.sub(r"\s+", " ", (text or "").lower()).strip()
+
+
+class ResolutionCache:
+    """SQLite-backed {(query, set_name): (url, score, resolved_at)} with expiry."""
+
+    def __init__(self, path=DEFAULT_PATH, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS resolutions (
+                    query TEXT NOT NULL,
+                    set_name TEXT NOT NULL,
+                    url TEXT,              -- NULL = no matching product
+                    score REAL,
+                    resolved_at REAL NOT NULL,
+                    PRIMARY KEY (query, set_name)
+                )
+                """
+            )
+
+    def get(self, query, set_name=None):
+        """
+        Return {"url", "score", "resolved_at"} for a live entry, or None on miss/expiry.
+        url is None for a cached "no matching product".
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, score, resolved_at FROM resolutions WHERE query = ? AND set_name = ?",
+                (normalize(query), normalize(set_name)),
+            ).fetchone()
+        if not row:
+            return None
+
+        url, score, resolved_at = row
+        ttl = self.positive_ttl if url else self.negative_ttl
+        if time.time() - resolved_at > ttl:
+            return None
+        return {"url": url, "score": score, "resolved_at": resolved_at}
+
+    def put(self, query, set_name, url, score=None):
+        """Record a resolution; url=None records a negative result."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolutions (query, set_name, url, score, resolved_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (normalize(query), normalize(set_name), url, score, time.time()),
+            )
+
+    def purge_expired(self):
+        """Delete expired rows; returns how many were removed."""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM resolutions WHERE (url IS NOT NULL AND resolved_at < ?) "
+                "OR (url IS NULL AND resolved_at < ?)",
+                (now - self.positive_ttl, now - self.negative_ttl),
+            )
+        return cursor.rowcount
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache configured from the environment, or None if disabled."""
+    global _cache
+    if os.getenv("RESOLUTION_CACHE", "1").lower() in ("0", "false", "off", "no"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResolutionCache(os.getenv("RESOLUTION_CACHE_PATH", DEFAULT_PATH))
+            except sqlite3.Error as e:
+                logger.warning(f"URL resolution cache unavailable: {e}")
+                return None
+        return _cache
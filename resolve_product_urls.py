@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Resolve pricecharting_url for products in bulk from their set listing pages.
+
+Without a pricecharting_url, every product costs a search request (plus a
+results-page parse and set-name match) when it is scraped. A set's listing page
+(groups.set_url) already names every card in the set with its /game/ URL, so one
+paginated listing fetch can resolve every unresolved product in that group.
+
+Products are matched on normalized name + card number. If the exact name doesn't
+match, a card number that appears exactly once in the listing is accepted when one
+name starts with the other. Anything still ambiguous is left for search_product.
+
+Usage:
+    python resolve_product_urls.py                    # all groups with unresolved products
+    python resolve_product_urls.py --game pokemon
+    python resolve_product_urls.py --dry-run --max-groups 5
+
+The matching and ListingResolver live in scrape_helpers (importable without this
+script's Supabase client); process_db.py resolves each claimed batch through one
+ListingResolver per run before falling back to search. The resolver's listing cache lives only as long as
+the resolver, so long-lived processes (the API) don't accumulate listings or stop
+re-matching groups that gained cards; the API doesn't resolve from listings at all
+(a whole paginated listing fetch doesn't belong inside one request).
+"""
+
+import argparse
+import logging
+
+from backfill_new_sets import supabase, GAME_CATEGORY_IDS
+from scrape_helpers import resolve_group
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_groups_with_unresolved_products(category_id="any"):
+    """Groups (id, name, set_url) that have a set_url and at least one product without a URL."""
+    group_ids = set()
+    offset = 0
+    limit = 1000
+    while True:
+        response = (
+            supabase.table("products")
+            .select("group_id")
+            .is_("pricecharting_url", "null")
+            .not_.is_("group_id", "null")
+            .order("id")
+            .range(offset, offset + limit - 1)
+            .execute()
+        )
+        if not response.data:
+            break
+        group_ids.update(r["group_id"] for r in response.data)
+        if len(response.data) < limit:
+            break
+        offset += limit
+
+    groups = []
+    group_ids = list(group_ids)
+    for i in range(0, len(group_ids), 200):
+        query = (
+            supabase.table("groups")
+            .select("id, name, set_url")
+            .in_("id", group_ids[i:i + 200])
+            .not_.is_("set_url", "null")
+        )
+        if category_id is None:
+            query = query.is_("category_id", "null")
+        elif category_id != "any":
+            query = query.eq("category_id", category_id)
+        groups.extend(query.execute().data or [])
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve pricecharting_url in bulk from set listings")
+    parser.add_argument("--game", choices=list(GAME_CATEGORY_IDS.keys()), default=None,
+                        help="Only resolve products for this game (default: all games)")
+    parser.add_argument("--max-groups", type=int, default=None, help="Maximum number of groups to process")
+    parser.add_argument("--dry-run", action="store_true", help="Match but don't write URLs")
+    args = parser.parse_args()
+
+    category_id = GAME_CATEGORY_IDS[args.game] if args.game else "any"
+    groups = fetch_groups_with_unresolved_products(category_id)
+    if args.max_groups:
+        groups = groups[:args.max_groups]
+
+    logger.info(f"Found {len(groups)} groups with unresolved products")
+
+    total = 0
+    for i, group in enumerate(groups, 1):
+        logger.info(f"[{i}/{len(groups)}] {group['name']}")
+        try:
+            total += len(resolve_group(supabase, group["id"], group["set_url"], dry_run=args.dry_run))
+        except Exception as e:
+            logger.error(f"Error resolving {group['name']}: {e}")
+
+    logger.info(f"Resolved {total} products across {len(groups)} groups"
+                f"{' (DRY RUN - nothing written)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Side-effect-free helpers shared by the scrapers and process_db.
+
+Importing this module creates no Supabase client and configures no logging, so
+process_db (and the scripts importing process_db: load_spool, rebuild_graded_prices)
+can use these without pulling in a CLI script's module-level setup. Database
+helpers take the client as an argument.
+
+- parse_timestamp: Postgres timestamptz strings -> datetime
+- set listings: fetch_page, parse_price, scrape_set_cards_list, parse_card_name_number
+- ListingResolver: fill in pricecharting_url from set listings (resolve_product_urls.py)
+"""
+
+import re
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+
+import http_client
+from bulk_writes import bulk_update
+
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value):
+    """
+    Parse a Postgres timestamptz string. Python 3.9's fromisoformat needs exactly
+    0, 3 or 6 fractional digits; Postgres trims trailing zeros.
+    """
+    value = value.replace("Z", "+00:00")
+    match = re.match(r"^(.*?\.)(\d+)(.*)$", value)
+    if match:
+        value = match.group(1) + match.group(2)[:6].ljust(6, "0") + match.group(3)
+    return datetime.fromisoformat(value)
+
+
+# ---- Set listings (groups.set_url pages) ----
+
+def fetch_page(url):
+    """Fetch HTML content through the shared client (pooled, rate-limited, retried)."""
+    try:
+        response = http_client.get(url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        logger.error(f"Failed to fetch {url}: {e}")
+        return None
+
+
+def parse_price(price_str):
+    """Clean and convert price string to float. Returns None if invalid."""
+    if not price_str:
+        return None
+    clean_str = re.sub(r'[^\d.]', '', price_str)
+    if not clean_str:
+        return None
+    try:
+        return float(clean_str)
+    except ValueError:
+        return None
+
+
+def scrape_set_cards_list(set_url):
+    """Scrape the list of cards from a set page, handling pagination."""
+    all_cards = []
+    cursor = None
+    page = 1
+
+    while True:
+        if page == 1:
+            logger.info(f"Fetching page {page} for {set_url}")
+            html = fetch_page(set_url)
+        else:
+            if not cursor:
+                break
+            logger.info(f"Fetching page {page} (cursor: {cursor})")
+            try:
+                response = http_client.post(set_url, data={"cursor": cursor})
+                if response.status_code != 200:
+                    logger.warning(f"Failed to fetch page {page}: Status {response.status_code}")
+                    break
+                html = response.text
+            except Exception as e:
+                logger.error(f"Error fetching page {page}: {e}")
+                break
+
+        if not html:
+            break
+
+        soup = BeautifulSoup(html, "lxml")
+
+        # Try different table selectors
+        table = soup.find("table", id="games_table")
+        if not table:
+            table = soup.find("table", class_="hover_table")
+
+        if not table:
+            if page == 1:
+                logger.warning(f"Could not find card table for {set_url}")
+            break
+
+        # Parse rows
+        rows = table.find_all("tr")
+        current_page_cards = []
+
+        for row in rows:
+            # Extract Product ID
+            product_id = row.get("data-product")
+            if not product_id:
+                row_id = row.get("id", "")
+                if row_id.startswith("product-"):
+                    product_id = row_id.replace("product-", "")
+
+            if not product_id:
+                continue
+
+            # Extract Title and URL
+            title_cell = row.find("td", class_="title")
+            if not title_cell:
+                continue
+
+            link = title_cell.find("a")
+            if not link:
+                continue
+
+            name = link.text.strip()
+            href = link.get("href")
+            if not href:
+                continue
+
+            full_url = "https://www.pricecharting.com" + href
+
+            # Extract Price (Ungraded)
+            price_cell = row.select_one("td.used_price .js-price")
+            price_str = price_cell.text.strip() if price_cell else None
+            price = parse_price(price_str)
+
+            current_page_cards.append({
+                "product_id": int(product_id),
+                "name": name,
+                "url": full_url,
+                "price": price
+            })
+
+        logger.info(f"Page {page}: Found {len(current_page_cards)} cards.")
+        all_cards.extend(current_page_cards)
+
+        # Check for cursor for next page
+        cursor_input = soup.find("input", {"name": "cursor"})
+        if cursor_input:
+            cursor = cursor_input.get("value")
+            page += 1
+        else:
+            break
+
+    return all_cards
+
+
+def parse_card_name_number(full_name):
+    """Split name into name and number (after #)."""
+    if "#" in full_name:
+        parts = full_name.rsplit("#", 1)
+        name = parts[0].strip()
+        number = parts[1].strip()
+        return name, number
+    return full_name, None
+
+
+# ---- Resolving pricecharting_url from set listings ----
+
+def name_key(name):
+    """'Pikachu ex - 025/165 (Holo)' -> 'pikachuex' (same cut as process_db.parse_card_name)"""
+    if not name:
+        return ""
+    clean = re.split(r'\s+-|\s+\(', name)[0]
+    return re.sub(r'[^a-z0-9]', '', clean.lower())
+
+
+def number_key(number):
+    """'025/165' -> '25', 'SV01' -> 'sv01' (same cut as process_db.parse_card_number)"""
+    if not number:
+        return ""
+    clean = number.split('/')[0].strip().lower()
+    return clean.lstrip('0') or '0'
+
+
+def build_listing_index(cards):
+    """Index listing cards by (name_key, number_key) and by number_key alone."""
+    by_name_number = {}
+    by_number = defaultdict(list)
+    for card in cards:
+        name, number = parse_card_name_number(card["name"])
+        key = (name_key(name), number_key(number))
+        by_name_number.setdefault(key, card["url"])
+        by_number[key[1]].append((key[0], card["url"]))
+    return by_name_number, by_number
+
+
+def match_product(product, index):
+    """Return the listing URL for a product, or None if it can't be matched unambiguously."""
+    by_name_number, by_number = index
+    p_name = name_key(product.get("name"))
+    p_number = number_key(product.get("number"))
+
+    url = by_name_number.get((p_name, p_number))
+    if url:
+        return url
+
+    # Same number, slightly different name ("Charizard" vs "Charizard [Holo]")
+    candidates = by_number.get(p_number, []) if p_number else []
+    if len(candidates) == 1:
+        l_name, url = candidates[0]
+        if p_name and (l_name.startswith(p_name) or p_name.startswith(l_name)):
+            return url
+
+    return None
+
+
+def fetch_unresolved_products(client, group_id):
+    """All products in a group that still have no pricecharting_url."""
+    products = []
+    offset = 0
+    limit = 1000
+    while True:
+        response = (
+            client.table("products")
+            .select("id, name, number")
+            .eq("group_id", group_id)
+            .is_("pricecharting_url", "null")
+            .order("id")
+            .range(offset, offset + limit - 1)
+            .execute()
+        )
+        if not response.data:
+            break
+        products.extend(response.data)
+        if len(response.data) < limit:
+            break
+        offset += limit
+    return products
+
+
+def save_resolved_urls(client, resolved):
+    """Write {product_id: url} to products.pricecharting_url. Returns rows written."""
+    rows = [{"id": product_id, "pricecharting_url": url} for product_id, url in resolved.items()]
+    try:
+        return bulk_update(client, "products", rows)
+    except Exception as e:
+        logger.error(f"Error saving {len(rows)} resolved URLs: {e}")
+        return 0
+
+
+def resolve_group(client, group_id, set_url, dry_run=False, get_listing=scrape_set_cards_list):
+    """
+    Match every unresolved product in a group against the group's listing page.
+    Returns {product_id: url} for the products that matched.
+    """
+    products = fetch_unresolved_products(client, group_id)
+    if not products:
+        return {}
+
+    cards = get_listing(set_url)
+    if not cards:
+        logger.warning(f"No listing cards for {set_url}; {len(products)} products left for search")
+        return {}
+
+    index = build_listing_index(cards)
+    resolved = {}
+    for product in products:
+        url = match_product(product, index)
+        if url:
+            resolved[product["id"]] = url
+
+    logger.info(f"Resolved {len(resolved)}/{len(products)} products from {set_url} "
+                f"({len(cards)} listing cards)")
+
+    if resolved and not dry_run:
+        save_resolved_urls(client, resolved)
+    return resolved
+
+
+class ListingResolver:
+    """
+    Fills in pricecharting_url from group listings, fetching each set_url and
+    matching each group at most once for the resolver's lifetime. Create one per
+    run (or per call) rather than keeping one for the life of a server process.
+    client is the Supabase client the products are read from and written to.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._listings = {}
+        self._resolved_groups = set()
+        self._lock = threading.Lock()
+
+    def listing(self, set_url):
+        with self._lock:
+            if set_url in self._listings:
+                return self._listings[set_url]
+        cards = scrape_set_cards_list(set_url)
+        with self._lock:
+            self._listings[set_url] = cards
+        return cards
+
+    def resolve(self, products):
+        """
+        Fill in pricecharting_url for products that lack one, in place, using each product's
+        group listing. Expects "group_id" and "group_set_url" keys. Every unresolved product
+        in those groups is written to the database, not only the ones passed in.
+        Returns the number of passed-in products that were resolved.
+        """
+        pending = [p for p in products if not p.get("pricecharting_url") and p.get("group_set_url")]
+        if not pending:
+            return 0
+
+        resolved = {}
+        for group_id, set_url in {(p["group_id"], p["group_set_url"]) for p in pending}:
+            with self._lock:
+                if group_id in self._resolved_groups:
+                    continue
+                self._resolved_groups.add(group_id)
+            try:
+                resolved.update(resolve_group(self.client, group_id, set_url, get_listing=self.listing))
+            except Exception as e:
+                logger.error(f"Error resolving URLs for group {group_id}: {e}")
+
+        count = 0
+        for product in pending:
+            url = resolved.get(product["id"])
+            if url:
+                product["pricecharting_url"] = url
+                count += 1
+        return count
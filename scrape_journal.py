@@ -0,0 +1,118 @@
+"""
+Crash-safe journal of scraped-but-unwritten process_db results.
+
+process_db scrapes a batch in memory and only then writes it to Supabase. If the
+job's timeout fires or the runner dies in between, that work is lost and gets
+scraped again next cycle. Every scraped result is appended here as soon as it
+is parsed, and acknowledged once process_batch has written it; on the next
+start the unacknowledged results are written before anything new is scraped.
+
+Format: newline-delimited JSON, append-only.
+    {"type": "result", "product_id": "...", "item": {...process_product() output...}}
+    {"type": "ack", "product_ids": ["...", ...]}
+
+A torn last line (crash mid-write) is ignored. The file is rewritten with only
+the pending entries once it grows past compact_bytes, and emptied once nothing
+is pending.
+"""
+
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = ".scrape_journal.ndjson"
+DEFAULT_COMPACT_BYTES = 64 * 1024 * 1024
+
+
+def _restore_item(item):
+    # JSON object keys are strings; pop_report is keyed by int grade
+    result = item.get("result") or {}
+    if isinstance(result.get("pop_report"), dict):
+        result["pop_report"] = {int(k): v for k, v in result["pop_report"].items()}
+    return item
+
+
+class ScrapeJournal:
+    """Append-only NDJSON journal; pending() lists results not yet acknowledged."""
+
+    def __init__(self, path=DEFAULT_PATH, compact_bytes=DEFAULT_COMPACT_BYTES):
+        self.path = path
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        self._pending = {}  # product_id -> item, in append order
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline():
+            self._write("")  # terminate a torn last line so the next entry starts clean
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable journal line {line_number} in {self.path}")
+                    continue
+                if entry.get("type") == "result":
+                    self._pending.pop(entry["product_id"], None)
+                    self._pending[entry["product_id"]] = _restore_item(entry["item"])
+                elif entry.get("type") == "ack":
+                    for product_id in entry["product_ids"]:
+                        self._pending.pop(product_id, None)
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def pending(self):
+        """Results appended but never acknowledged, oldest first."""
+        with self._lock:
+            return list(self._pending.values())
+
+    def append(self, item):
+        """Record a scraped result (process_product() output); None is ignored."""
+        if item is None:
+            return
+        line = json.dumps({"type": "result", "product_id": item["product_id"], "item": item})
+        with self._lock:
+            self._pending[item["product_id"]] = item
+            self._write(line)
+
+    def ack(self, product_ids):
+        """Mark results as written to the database."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with self._lock:
+            for product_id in product_ids:
+                self._pending.pop(product_id, None)
+            self._write(json.dumps({"type": "ack", "product_ids": product_ids}))
+            if not self._pending or self._file.tell() > self.compact_bytes:
+                self._compact()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _write(self, line):
+        self._file.write(line + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _compact(self):
+        # Rewrite with only the pending results, then swap the file in atomically
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for product_id, item in self._pending.items():
+                f.write(json.dumps({"type": "result", "product_id": product_id, "item": item}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
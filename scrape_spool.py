@@ -0,0 +1,151 @@
+"""
+Spool files for two-phase scraping: scrape now, bulk-load later.
+
+With `process_db.py --spool-dir DIR` a runner only scrapes. Each batch's
+normalized records (the rows process_batch would have written) go to one
+gzip-compressed NDJSON file in DIR instead of the database, and load_spool.py
+ingests many such files at once in a few large writes. Scrapers then need no
+database round trips beyond claiming work, and the database sees a handful of
+big upserts instead of one small write per batch.
+
+Format: one JSON record per line.
+    {"type": "sale", "row": {...graded_sales row...}}
+    {"type": "product", "row": {...products update for a changed page...}}
+    {"type": "checked", "row": {...products update for an unchanged page...}}
+    {"type": "pop", "product_id": "...", "grade": 10, "psa_pop": 123}
+    {"type": "completed", "product_id": "..."}
+
+Files are written under a temporary name and renamed when complete, so a reader
+never sees a partial file. Names start with the UTC write time, so files sort
+oldest first by name alone (mtimes don't survive artifact uploads and copies).
+"""
+
+import os
+import glob
+import gzip
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".ndjson.gz"
+
+# Fixed width, so names sort lexically in write order
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+# Conflict key of graded_sales (process_batch upserts on these columns)
+SALE_KEY = ("product_id", "sale_date", "price", "ebay_url")
+
+
+def empty_records():
+    """The record structure process_db.build_batch_records returns."""
+    return {"sales": [], "products": [], "checked": [], "pop": {}, "completed": []}
+
+
+def _lines(records):
+    for row in records["sales"]:
+        yield {"type": "sale", "row": row}
+    for row in records["products"]:
+        yield {"type": "product", "row": row}
+    for row in records["checked"]:
+        yield {"type": "checked", "row": row}
+    for product_id, grades in records["pop"].items():
+        for grade, psa_pop in grades.items():
+            yield {"type": "pop", "product_id": product_id, "grade": grade, "psa_pop": psa_pop}
+    for product_id in records["completed"]:
+        yield {"type": "completed", "product_id": product_id}
+
+
+class SpoolWriter:
+    """Writes one spool file per batch: <dir>/<utc timestamp>-<prefix>-<seq>.ndjson.gz."""
+
+    def __init__(self, directory, prefix):
+        self.directory = directory
+        self.prefix = prefix
+        self._seq = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, records):
+        """Write a batch's records; returns the file path (None if there was nothing to write)."""
+        if not records["completed"]:
+            return None
+        with self._lock:
+            self._seq += 1
+            stamp = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+            path = os.path.join(self.directory, f"{stamp}-{self.prefix}-{self._seq:06d}{SUFFIX}")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                for line in _lines(records):
+                    f.write((json.dumps(line) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+
+def list_spool_files(directory):
+    """Complete spool files in a directory, oldest first (by the timestamp in the name)."""
+    paths = glob.glob(os.path.join(directory, f"*{SUFFIX}"))
+    return sorted(paths, key=os.path.basename)
+
+
+def read_spool_file(path):
+    """Read one spool file back into the build_batch_records() structure."""
+    records = empty_records()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            kind = entry["type"]
+            if kind == "sale":
+                records["sales"].append(entry["row"])
+            elif kind == "product":
+                records["products"].append(entry["row"])
+            elif kind == "checked":
+                records["checked"].append(entry["row"])
+            elif kind == "pop":
+                records["pop"].setdefault(entry["product_id"], {})[int(entry["grade"])] = entry["psa_pop"]
+            elif kind == "completed":
+                records["completed"].append(entry["product_id"])
+            else:
+                logger.warning(f"Skipping unknown spool record type {kind!r} in {path}")
+    return records
+
+
+def merge_records(batches):
+    """
+    Combine several batches' records into one, later batches winning. A product
+    scraped twice (its lease ran out before loading) keeps only its latest pop
+    counts and product update; sales are de-duplicated on the graded_sales
+    conflict key so one upsert never touches the same row twice.
+    """
+    sales = {}
+    products = {}
+    checked = {}
+    pop = {}
+    completed = {}
+    for records in batches:
+        for row in records["sales"]:
+            sales[tuple(row[column] for column in SALE_KEY)] = row
+        for row in records["products"]:
+            products[row["id"]] = row
+            checked.pop(row["id"], None)
+        for row in records["checked"]:
+            # An unchanged re-check only refreshes the bookkeeping of an earlier full update
+            if row["id"] in products:
+                products[row["id"]].update(row)
+            else:
+                checked[row["id"]] = row
+        pop.update(records["pop"])
+        completed.update(dict.fromkeys(records["completed"]))
+
+    return {
+        "sales": list(sales.values()),
+        "products": list(products.values()),
+        "checked": list(checked.values()),
+        "pop": pop,
+        "completed": list(completed),
+    }
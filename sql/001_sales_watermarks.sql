@@ -0,0 +1,13 @@
+-- Per-grade sales high-water marks for incremental scraping (process_db.py).
+--
+-- {"7": {"date": "2024-11-03", "ids": ["1234567890", ...]}, "8": {...}, ...}
+-- date is the newest sale_date stored for that grade, ids are the eBay item IDs
+-- stored on that date. The scraper stops parsing a grade's sales at the first
+-- older row and skips known IDs on the watermark date, so only new sales are
+-- upserted into graded_sales. NULL (or a missing grade) means scrape everything.
+--
+-- Kept on products rather than product_grade_progress because
+-- sync_eligible_products.py rebuilds the progress table.
+
+alter table products
+    add column if not exists sales_watermarks jsonb;
@@ -0,0 +1,9 @@
+-- Fingerprint of the parts of a product page process_db.py cares about.
+--
+-- SHA-1 of the sale row IDs in the PSA 7-10 completed-auctions sections plus the
+-- population table cells (main.page_fingerprint). When a fresh fetch has the same
+-- fingerprint, process_db skips the sales upsert, the products update and the
+-- graded_prices recompute and only marks the product as checked.
+
+alter table products
+    add column if not exists page_fingerprint text;
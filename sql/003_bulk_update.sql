@@ -0,0 +1,58 @@
+-- Generic keyed bulk update: apply many row updates to one table in a single call.
+--
+--   select bulk_update('products', array['id'],
+--                      '[{"id": "...", "pop_count": {...}}, {"id": "...", "pop_count": {...}}]');
+--
+-- Rows are typed through jsonb_populate_recordset(null::<table>, ...), so values are
+-- cast exactly as an insert of the same JSON would be. The columns that get set are
+-- the keys of the first row minus p_key_columns; every row must carry the same keys
+-- (bulk_writes.bulk_update groups rows by key set before calling). Rows with no
+-- matching key update nothing - this never inserts. Returns the number of rows updated.
+--
+-- Only tables in the whitelist below can be targeted.
+
+create or replace function public.bulk_update(p_table text, p_key_columns text[], p_rows jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+    v_columns text[];
+    v_set text;
+    v_where text;
+    v_count integer;
+begin
+    if p_table not in ('products', 'product_grade_progress', 'graded_prices') then
+        raise exception 'bulk_update: table "%" is not allowed', p_table;
+    end if;
+
+    if coalesce(array_length(p_key_columns, 1), 0) = 0 then
+        raise exception 'bulk_update: at least one key column is required';
+    end if;
+
+    if p_rows is null or jsonb_typeof(p_rows) <> 'array' or jsonb_array_length(p_rows) = 0 then
+        return 0;
+    end if;
+
+    select array_agg(k) into v_columns
+    from jsonb_object_keys(p_rows -> 0) as k
+    where k <> all (p_key_columns);
+
+    if v_columns is null then
+        return 0;
+    end if;
+
+    select string_agg(format('%I = r.%I', c, c), ', ') into v_set from unnest(v_columns) as c;
+    select string_agg(format('t.%I = r.%I', c, c), ' and ') into v_where from unnest(p_key_columns) as c;
+
+    execute format(
+        'update public.%I as t set %s from jsonb_populate_recordset(null::public.%I, $1) as r where %s',
+        p_table, v_set, p_table, v_where
+    ) using p_rows;
+
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+revoke all on function public.bulk_update(text, text[], jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_update(text, text[], jsonb) to service_role;
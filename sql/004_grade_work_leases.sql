@@ -0,0 +1,66 @@
+-- Lease-based work queue on product_grade_progress for parallel process_db.py runners.
+--
+-- A runner claims up to N incomplete rows by stamping them with its owner id and
+-- a lease expiry, renews the lease while it works, and clears it when it marks the
+-- rows completed. Rows locked by a concurrent claim are skipped (FOR UPDATE SKIP
+-- LOCKED), so two runners never get the same row. If a runner dies, its rows
+-- become claimable again once the lease expires.
+
+alter table product_grade_progress
+    add column if not exists lease_owner text,
+    add column if not exists lease_expires_at timestamptz;
+
+create index if not exists product_grade_progress_claimable_idx
+    on product_grade_progress (lease_expires_at)
+    where completed = false;
+
+
+create or replace function public.claim_grade_work(
+    p_owner text,
+    p_limit integer default 100,
+    p_lease_seconds integer default 900
+)
+returns table (product_id uuid)
+language sql
+as $$
+    update product_grade_progress as p
+    set lease_owner = p_owner,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+    where p.product_id in (
+        select product_id
+        from product_grade_progress
+        where completed = false
+          and (lease_expires_at is null or lease_expires_at < now())
+        order by product_id
+        limit p_limit
+        for update skip locked
+    )
+    returning p.product_id;
+$$;
+
+
+-- Extend the leases this owner still holds; returns how many were renewed.
+create or replace function public.renew_grade_leases(
+    p_owner text,
+    p_product_ids uuid[],
+    p_lease_seconds integer default 900
+)
+returns integer
+language sql
+as $$
+    with renewed as (
+        update product_grade_progress
+        set lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+        where product_id = any (p_product_ids)
+          and lease_owner = p_owner
+          and completed = false
+        returning 1
+    )
+    select count(*)::integer from renewed;
+$$;
+
+
+revoke all on function public.claim_grade_work(text, integer, integer) from public, anon, authenticated;
+revoke all on function public.renew_grade_leases(text, uuid[], integer) from public, anon, authenticated;
+grant execute on function public.claim_grade_work(text, integer, integer) to service_role;
+grant execute on function public.renew_grade_leases(text, uuid[], integer) to service_role;
@@ -0,0 +1,61 @@
+-- Value- and staleness-weighted scrape scheduling.
+--
+-- sync_eligible_products.py scores every queued product (price, recent sales
+-- velocity, time since last scrape, whether the last scrape found new sales) into
+-- product_grade_progress.priority, and claim_grade_work hands out the highest
+-- priorities first, so a run that stops early has spent its requests where the
+-- value is. process_db.py records last_scraped_at / last_scrape_new_sales.
+
+alter table products
+    add column if not exists last_scraped_at timestamptz,
+    add column if not exists last_scrape_new_sales integer;
+
+alter table product_grade_progress
+    add column if not exists priority double precision not null default 0;
+
+create index if not exists product_grade_progress_priority_idx
+    on product_grade_progress (priority desc, product_id)
+    where completed = false;
+
+
+-- Sales per product over the last p_days days (products with none are omitted).
+create or replace function public.recent_sales_counts(p_product_ids uuid[], p_days integer default 30)
+returns table (product_id uuid, sales integer)
+language sql
+stable
+as $$
+    select s.product_id, count(*)::integer
+    from graded_sales as s
+    where s.product_id = any (p_product_ids)
+      and s.sale_date >= current_date - p_days
+    group by s.product_id;
+$$;
+
+
+-- Same as sql/004_grade_work_leases.sql, but highest priority first.
+create or replace function public.claim_grade_work(
+    p_owner text,
+    p_limit integer default 100,
+    p_lease_seconds integer default 900
+)
+returns table (product_id uuid)
+language sql
+as $$
+    update product_grade_progress as p
+    set lease_owner = p_owner,
+        lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+    where p.product_id in (
+        select product_id
+        from product_grade_progress
+        where completed = false
+          and (lease_expires_at is null or lease_expires_at < now())
+        order by priority desc, product_id
+        limit p_limit
+        for update skip locked
+    )
+    returning p.product_id;
+$$;
+
+
+revoke all on function public.recent_sales_counts(uuid[], integer) from public, anon, authenticated;
+grant execute on function public.recent_sales_counts(uuid[], integer) to service_role;
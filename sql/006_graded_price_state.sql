@@ -0,0 +1,23 @@
+-- Running decayed sums behind each graded_prices row, for incremental pricing.
+--
+-- The market price is exp(sum_wlog / sum_w) * min(1, sqrt(sum_w)), with each sale
+-- weighted 2^(-days before the group's latest sale / 21). Keeping sum_w and
+-- sum_wlog relative to ref_ts (the latest sale, epoch seconds) means new sales can
+-- be folded in by rescaling the sums to the new reference, without re-reading the
+-- group's history (pricing_engine.grouped_price_state). process_db.py applies the
+-- sales its graded_sales insert actually added; products without state rows are
+-- priced from full history once, which writes their state.
+--
+-- A product either has state rows for all of its graded_sales groups or none.
+-- process_db.py --verify-pricing recomputes from full history and repairs drift.
+
+create table if not exists graded_price_state (
+    product_id uuid not null references products (id) on delete cascade,
+    grade integer not null,
+    ref_ts double precision not null,
+    sum_w double precision not null,
+    sum_wlog double precision not null,
+    sample_size integer not null,
+    updated_at timestamptz not null default now(),
+    primary key (product_id, grade)
+);
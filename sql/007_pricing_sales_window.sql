@@ -0,0 +1,50 @@
+-- Sales needed to price products, without reading their whole history.
+--
+-- A sale's pricing weight is 2^(-days before its group's latest sale / half-life),
+-- so sales more than p_horizon_days before the latest one (pricing_engine
+-- horizon_days: 48 half-lives) weigh less than double precision can add to the
+-- latest sale's weight of 1. Only sales inside that window are returned, each
+-- with its group's full count of priced sales (sample_size counts every sale).
+--
+-- Rows come ordered by (product_id, grade, sale_date, price, ebay_url); pass the
+-- last row back as p_after_* to read the next page (keyset pagination - stable
+-- while sales are inserted, unlike offsets over an unordered select).
+
+create index if not exists graded_sales_product_grade_date_idx
+    on graded_sales (product_id, grade, sale_date);
+
+create or replace function public.pricing_sales_window(
+    p_product_ids uuid[],
+    p_horizon_days integer,
+    p_after_product_id uuid default null,
+    p_after_grade integer default null,
+    p_after_sale_date timestamptz default null,
+    p_after_price numeric default null,
+    p_after_ebay_url text default null,
+    p_limit integer default 1000
+)
+returns table (product_id uuid, grade integer, sale_date date, price numeric, ebay_url text, group_sales integer)
+language sql
+stable
+as $$
+    with groups as (
+        select s.product_id, s.grade,
+               max(s.sale_date) filter (where s.price > 0) as latest,
+               (count(*) filter (where s.price > 0))::integer as group_sales
+        from graded_sales s
+        where s.product_id = any(p_product_ids)
+          and s.grade is not null
+          and s.price is not null
+        group by s.product_id, s.grade
+    )
+    select s.product_id, s.grade, s.sale_date::date, s.price, coalesce(s.ebay_url, ''), g.group_sales
+    from graded_sales s
+    join groups g on g.product_id = s.product_id and g.grade = s.grade
+    where s.price is not null
+      and (g.latest is null or s.sale_date >= g.latest - make_interval(days => p_horizon_days))
+      and (p_after_product_id is null
+           or (s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, ''))
+              > (p_after_product_id, p_after_grade, p_after_sale_date, p_after_price, p_after_ebay_url))
+    order by s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, '')
+    limit p_limit;
+$$;
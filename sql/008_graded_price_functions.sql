@@ -0,0 +1,111 @@
+-- Graded price computation inside Postgres.
+--
+-- graded_price_aggregates computes, per (product_id, grade), the same time-decayed
+-- weighted geometric mean as pricing_engine.calculate_market_price:
+--
+--     weight = 2^(-days before the group's latest sale / p_half_life)
+--     market_price = exp(sum(weight * ln(price)) / sum(weight)) * least(1, sqrt(sum(weight)))
+--
+-- Only sales with price > 0 count; a group without one prices at -1 with
+-- sample_size 0. ref_ts / sum_w / sum_wlog are the graded_price_state columns
+-- (ref_ts is the latest sale date as epoch seconds at UTC midnight, which is
+-- what pricing_engine gets on a UTC host such as the GitHub runners).
+--
+-- refresh_graded_prices upserts graded_prices and graded_price_state from it,
+-- for a list of products or (null) the whole catalog, without touching psa_pop.
+-- Returns the number of graded_prices rows written.
+--
+--   select refresh_graded_prices(array['<uuid>', ...]::uuid[]);
+--   select refresh_graded_prices();
+--
+-- check_price_parity.py compares the aggregates with calculate_market_price.
+
+create or replace function public.graded_price_aggregates(
+    p_product_ids uuid[] default null,
+    p_half_life double precision default 21
+)
+returns table (
+    product_id uuid,
+    grade integer,
+    ref_ts double precision,
+    sum_w double precision,
+    sum_wlog double precision,
+    sample_size integer,
+    market_price double precision
+)
+language sql
+stable
+as $$
+    with priced as (
+        select s.product_id, s.grade, s.price::double precision as price,
+               extract(epoch from s.sale_date::timestamp)::double precision as ts
+        from graded_sales s
+        where (p_product_ids is null or s.product_id = any(p_product_ids))
+          and s.grade is not null
+          and s.price is not null
+    ),
+    referenced as (
+        select p.*,
+               greatest(0, max(p.ts) filter (where p.price > 0) over (partition by p.product_id, p.grade)) as max_ts
+        from priced p
+    ),
+    weighted as (
+        -- Exponent capped so power() can't underflow (2^-1000 is already negligible)
+        select r.product_id, r.grade, r.price, r.max_ts,
+               power(2::double precision, -least(greatest(0, (r.max_ts - r.ts) / 86400) / p_half_life, 1000)) as w
+        from referenced r
+        where r.price > 0
+    ),
+    sums as (
+        select p.product_id, p.grade,
+               coalesce(max(w.max_ts), 0) as ref_ts,
+               coalesce(sum(w.w), 0) as sum_w,
+               coalesce(sum(w.w * ln(w.price)), 0) as sum_wlog,
+               count(w.w)::integer as sample_size
+        from (select distinct priced.product_id, priced.grade from priced) p
+        left join weighted w on w.product_id = p.product_id and w.grade = p.grade
+        group by p.product_id, p.grade
+    )
+    select s.product_id, s.grade, s.ref_ts, s.sum_w, s.sum_wlog, s.sample_size,
+           case when s.sum_w > 0 then exp(s.sum_wlog / s.sum_w) * least(1, sqrt(s.sum_w)) else -1 end
+    from sums s;
+$$;
+
+
+create or replace function public.refresh_graded_prices(p_product_ids uuid[] default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    with aggregates as (
+        select * from public.graded_price_aggregates(p_product_ids)
+    ),
+    state as (
+        insert into graded_price_state (product_id, grade, ref_ts, sum_w, sum_wlog, sample_size, updated_at)
+        select a.product_id, a.grade, a.ref_ts, a.sum_w, a.sum_wlog, a.sample_size, now()
+        from aggregates a
+        on conflict (product_id, grade) do update
+            set ref_ts = excluded.ref_ts,
+                sum_w = excluded.sum_w,
+                sum_wlog = excluded.sum_wlog,
+                sample_size = excluded.sample_size,
+                updated_at = excluded.updated_at
+    )
+    -- psa_pop is left out of the column list, so existing pop counts survive
+    insert into graded_prices (product_id, grade, market_price, sample_size, last_updated)
+    select a.product_id, a.grade, a.market_price, a.sample_size, now()
+    from aggregates a
+    on conflict (product_id, grade) do update
+        set market_price = excluded.market_price,
+            sample_size = excluded.sample_size,
+            last_updated = excluded.last_updated;
+
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+revoke all on function public.refresh_graded_prices(uuid[]) from public, anon, authenticated;
+grant execute on function public.refresh_graded_prices(uuid[]) to service_role;
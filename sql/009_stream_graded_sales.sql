@@ -0,0 +1,35 @@
+-- Keyset-paginated read of all graded_sales, for rebuild_graded_prices.py.
+--
+-- Rows come ordered by (product_id, grade, sale_date, price, ebay_url), the last
+-- two only breaking ties. Pass the last row back as p_after_* for the next page,
+-- or only p_after_product_id to start after a whole product (resuming a rebuild).
+-- Rows without a grade or price are left out, as pricing ignores them.
+-- Served by graded_sales_product_grade_date_idx (sql/007).
+
+create or replace function public.stream_graded_sales(
+    p_after_product_id uuid default null,
+    p_after_grade integer default null,
+    p_after_sale_date timestamptz default null,
+    p_after_price numeric default null,
+    p_after_ebay_url text default null,
+    p_limit integer default 1000
+)
+returns table (product_id uuid, grade integer, sale_date date, price numeric, ebay_url text)
+language sql
+stable
+as $$
+    select s.product_id, s.grade, s.sale_date::date, s.price, coalesce(s.ebay_url, '')
+    from graded_sales s
+    where s.grade is not null
+      and s.price is not null
+      and (p_after_product_id is null
+           or (p_after_grade is null and s.product_id > p_after_product_id)
+           or (p_after_grade is not null
+               and (s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, ''))
+                   > (p_after_product_id, p_after_grade, p_after_sale_date, p_after_price, p_after_ebay_url)))
+    order by s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, '')
+    limit p_limit;
+$$;
+
+revoke all on function public.stream_graded_sales(uuid, integer, timestamptz, numeric, text, integer) from public, anon, authenticated;
+grant execute on function public.stream_graded_sales(uuid, integer, timestamptz, numeric, text, integer) to service_role;
@@ -0,0 +1,150 @@
+-- Short-, medium- and long-horizon graded prices plus a trend, in one pass.
+--
+-- market_price stays the 21-day half-life price. market_price_7d / _90d are the
+-- same formula with 7- and 90-day half-lives, and price_trend is the 7-day over
+-- the 90-day weighted geometric mean, minus 1, without the liquidity factor
+-- (0.1 = recent sales 10% above the long-run level; null without sales).
+-- pricing_engine.HALF_LIVES / PriceState.trend are the Python side.
+--
+-- graded_price_state keeps the decayed sums for every horizon so incremental
+-- updates cover all of them. Rows written before this migration have null
+-- 7d / 90d sums; process_db reprices those products from history on their next
+-- new sale (or run process_db.py --verify-pricing / rebuild_graded_prices.py).
+
+alter table graded_prices
+    add column if not exists market_price_7d double precision,
+    add column if not exists market_price_90d double precision,
+    add column if not exists price_trend double precision;
+
+alter table graded_price_state
+    add column if not exists sum_w_7d double precision,
+    add column if not exists sum_wlog_7d double precision,
+    add column if not exists sum_w_90d double precision,
+    add column if not exists sum_wlog_90d double precision;
+
+
+-- Return type changes, so the old definition has to go first
+drop function if exists public.graded_price_aggregates(uuid[], double precision);
+
+create or replace function public.graded_price_aggregates(p_product_ids uuid[] default null)
+returns table (
+    product_id uuid,
+    grade integer,
+    ref_ts double precision,
+    sum_w double precision,
+    sum_wlog double precision,
+    sum_w_7d double precision,
+    sum_wlog_7d double precision,
+    sum_w_90d double precision,
+    sum_wlog_90d double precision,
+    sample_size integer,
+    market_price double precision,
+    market_price_7d double precision,
+    market_price_90d double precision,
+    price_trend double precision
+)
+language sql
+stable
+as $$
+    with priced as (
+        select s.product_id, s.grade, s.price::double precision as price,
+               extract(epoch from s.sale_date::timestamp)::double precision as ts
+        from graded_sales s
+        where (p_product_ids is null or s.product_id = any(p_product_ids))
+          and s.grade is not null
+          and s.price is not null
+    ),
+    referenced as (
+        select p.*,
+               greatest(0, max(p.ts) filter (where p.price > 0) over (partition by p.product_id, p.grade)) as max_ts
+        from priced p
+    ),
+    aged as (
+        select r.product_id, r.grade, r.max_ts, ln(r.price) as log_price,
+               greatest(0, (r.max_ts - r.ts) / 86400) as days_ago
+        from referenced r
+        where r.price > 0
+    ),
+    weighted as (
+        -- Exponents capped so power() can't underflow (2^-1000 is already negligible)
+        select a.product_id, a.grade, a.max_ts, a.log_price,
+               power(2::double precision, -least(a.days_ago / 21, 1000)) as w,
+               power(2::double precision, -least(a.days_ago / 7, 1000)) as w_7d,
+               power(2::double precision, -least(a.days_ago / 90, 1000)) as w_90d
+        from aged a
+    ),
+    sums as (
+        select p.product_id, p.grade,
+               coalesce(max(w.max_ts), 0) as ref_ts,
+               coalesce(sum(w.w), 0) as sum_w,
+               coalesce(sum(w.w * w.log_price), 0) as sum_wlog,
+               coalesce(sum(w.w_7d), 0) as sum_w_7d,
+               coalesce(sum(w.w_7d * w.log_price), 0) as sum_wlog_7d,
+               coalesce(sum(w.w_90d), 0) as sum_w_90d,
+               coalesce(sum(w.w_90d * w.log_price), 0) as sum_wlog_90d,
+               count(w.w)::integer as sample_size
+        from (select distinct priced.product_id, priced.grade from priced) p
+        left join weighted w on w.product_id = p.product_id and w.grade = p.grade
+        group by p.product_id, p.grade
+    )
+    select s.product_id, s.grade, s.ref_ts,
+           s.sum_w, s.sum_wlog, s.sum_w_7d, s.sum_wlog_7d, s.sum_w_90d, s.sum_wlog_90d,
+           s.sample_size,
+           case when s.sum_w > 0 then exp(s.sum_wlog / s.sum_w) * least(1, sqrt(s.sum_w)) else -1 end,
+           case when s.sum_w_7d > 0 then exp(s.sum_wlog_7d / s.sum_w_7d) * least(1, sqrt(s.sum_w_7d)) else -1 end,
+           case when s.sum_w_90d > 0 then exp(s.sum_wlog_90d / s.sum_w_90d) * least(1, sqrt(s.sum_w_90d)) else -1 end,
+           case when s.sum_w_7d > 0 and s.sum_w_90d > 0
+                then exp(s.sum_wlog_7d / s.sum_w_7d - s.sum_wlog_90d / s.sum_w_90d) - 1
+           end
+    from sums s;
+$$;
+
+
+create or replace function public.refresh_graded_prices(p_product_ids uuid[] default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    with aggregates as (
+        select * from public.graded_price_aggregates(p_product_ids)
+    ),
+    state as (
+        insert into graded_price_state (product_id, grade, ref_ts, sum_w, sum_wlog, sum_w_7d, sum_wlog_7d,
+                                        sum_w_90d, sum_wlog_90d, sample_size, updated_at)
+        select a.product_id, a.grade, a.ref_ts, a.sum_w, a.sum_wlog, a.sum_w_7d, a.sum_wlog_7d,
+               a.sum_w_90d, a.sum_wlog_90d, a.sample_size, now()
+        from aggregates a
+        on conflict (product_id, grade) do update
+            set ref_ts = excluded.ref_ts,
+                sum_w = excluded.sum_w,
+                sum_wlog = excluded.sum_wlog,
+                sum_w_7d = excluded.sum_w_7d,
+                sum_wlog_7d = excluded.sum_wlog_7d,
+                sum_w_90d = excluded.sum_w_90d,
+                sum_wlog_90d = excluded.sum_wlog_90d,
+                sample_size = excluded.sample_size,
+                updated_at = excluded.updated_at
+    )
+    -- psa_pop is left out of the column list, so existing pop counts survive
+    insert into graded_prices (product_id, grade, market_price, market_price_7d, market_price_90d,
+                               price_trend, sample_size, last_updated)
+    select a.product_id, a.grade, a.market_price, a.market_price_7d, a.market_price_90d,
+           a.price_trend, a.sample_size, now()
+    from aggregates a
+    on conflict (product_id, grade) do update
+        set market_price = excluded.market_price,
+            market_price_7d = excluded.market_price_7d,
+            market_price_90d = excluded.market_price_90d,
+            price_trend = excluded.price_trend,
+            sample_size = excluded.sample_size,
+            last_updated = excluded.last_updated;
+
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+revoke all on function public.refresh_graded_prices(uuid[]) from public, anon, authenticated;
+grant execute on function public.refresh_graded_prices(uuid[]) to service_role;
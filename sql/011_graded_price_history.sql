@@ -0,0 +1,191 @@
+-- Append-only graded price history with change-only snapshots.
+--
+-- graded_prices only holds the current price. graded_price_history gets a row
+-- for a (product_id, grade) when its market_price or psa_pop moved by more than
+-- p_threshold (relative, default 2%) since the group's last snapshot, or when it
+-- has none yet. Unchanged re-scrapes append nothing, so the table grows with
+-- actual price movement rather than with scrape frequency.
+--
+-- Every graded_prices writer snapshots in the same call:
+--   upsert_graded_prices(rows)          process_db / rebuild_graded_prices.py price writes
+--   record_graded_price_history(ids)    after psa_pop-only updates (bulk_update)
+--   refresh_graded_prices(ids)          database-side pricing (redefined below)
+--
+-- graded_price_history_series returns the latest points per group as one compact
+-- JSON array ([[date, price, pop], ...]) for export_to_app_format.py.
+
+create table if not exists graded_price_history (
+    product_id uuid not null references products (id) on delete cascade,
+    grade integer not null,
+    recorded_at timestamptz not null default now(),
+    market_price double precision,
+    psa_pop integer,
+    primary key (product_id, grade, recorded_at)
+);
+
+
+-- Snapshot the products' graded_prices rows that changed beyond p_threshold.
+-- Returns the number of history rows appended.
+create or replace function public.record_graded_price_history(
+    p_product_ids uuid[],
+    p_threshold double precision default 0.02
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    insert into graded_price_history (product_id, grade, market_price, psa_pop)
+    select g.product_id, g.grade, g.market_price, g.psa_pop
+    from graded_prices g
+    left join lateral (
+        select h.recorded_at, h.market_price, h.psa_pop
+        from graded_price_history h
+        where h.product_id = g.product_id and h.grade = g.grade
+        order by h.recorded_at desc
+        limit 1
+    ) last on true
+    where g.product_id = any(p_product_ids)
+      and (
+          last.recorded_at is null
+          or (g.market_price is distinct from last.market_price
+              and (g.market_price is null or last.market_price is null
+                   or g.market_price <= 0 or last.market_price <= 0
+                   or abs(g.market_price / last.market_price - 1) > p_threshold))
+          or (g.psa_pop is distinct from last.psa_pop
+              and (g.psa_pop is null or last.psa_pop is null
+                   or abs(g.psa_pop - last.psa_pop) > p_threshold * greatest(last.psa_pop, 1)))
+      )
+    on conflict do nothing;
+
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+
+-- Upsert graded_prices rows and snapshot their changes in one call. Every row
+-- must carry the same keys (product_id, grade and the columns to set), as with
+-- bulk_update. Returns the number of history rows appended.
+create or replace function public.upsert_graded_prices(p_rows jsonb, p_threshold double precision default 0.02)
+returns integer
+language plpgsql
+as $$
+declare
+    v_columns text[];
+    v_set text;
+    v_product_ids uuid[];
+begin
+    if p_rows is null or jsonb_typeof(p_rows) <> 'array' or jsonb_array_length(p_rows) = 0 then
+        return 0;
+    end if;
+
+    select array_agg(k) into v_columns from jsonb_object_keys(p_rows -> 0) as k;
+    select string_agg(format('%I = excluded.%I', c, c), ', ') into v_set
+    from unnest(v_columns) as c
+    where c not in ('product_id', 'grade');
+
+    execute format(
+        'insert into graded_prices (%s) select %s from jsonb_populate_recordset(null::graded_prices, $1) as r '
+        'on conflict (product_id, grade) do update set %s',
+        (select string_agg(format('%I', c), ', ') from unnest(v_columns) as c),
+        (select string_agg(format('r.%I', c), ', ') from unnest(v_columns) as c),
+        v_set
+    ) using p_rows;
+
+    select array_agg(distinct (r ->> 'product_id')::uuid) into v_product_ids
+    from jsonb_array_elements(p_rows) as r;
+
+    return public.record_graded_price_history(v_product_ids, p_threshold);
+end;
+$$;
+
+
+-- Same as sql/010, plus the history snapshot
+create or replace function public.refresh_graded_prices(p_product_ids uuid[] default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    with aggregates as (
+        select * from public.graded_price_aggregates(p_product_ids)
+    ),
+    state as (
+        insert into graded_price_state (product_id, grade, ref_ts, sum_w, sum_wlog, sum_w_7d, sum_wlog_7d,
+                                        sum_w_90d, sum_wlog_90d, sample_size, updated_at)
+        select a.product_id, a.grade, a.ref_ts, a.sum_w, a.sum_wlog, a.sum_w_7d, a.sum_wlog_7d,
+               a.sum_w_90d, a.sum_wlog_90d, a.sample_size, now()
+        from aggregates a
+        on conflict (product_id, grade) do update
+            set ref_ts = excluded.ref_ts,
+                sum_w = excluded.sum_w,
+                sum_wlog = excluded.sum_wlog,
+                sum_w_7d = excluded.sum_w_7d,
+                sum_wlog_7d = excluded.sum_wlog_7d,
+                sum_w_90d = excluded.sum_w_90d,
+                sum_wlog_90d = excluded.sum_wlog_90d,
+                sample_size = excluded.sample_size,
+                updated_at = excluded.updated_at
+    )
+    -- psa_pop is left out of the column list, so existing pop counts survive
+    insert into graded_prices (product_id, grade, market_price, market_price_7d, market_price_90d,
+                               price_trend, sample_size, last_updated)
+    select a.product_id, a.grade, a.market_price, a.market_price_7d, a.market_price_90d,
+           a.price_trend, a.sample_size, now()
+    from aggregates a
+    on conflict (product_id, grade) do update
+        set market_price = excluded.market_price,
+            market_price_7d = excluded.market_price_7d,
+            market_price_90d = excluded.market_price_90d,
+            price_trend = excluded.price_trend,
+            sample_size = excluded.sample_size,
+            last_updated = excluded.last_updated;
+
+    get diagnostics v_count = row_count;
+
+    if p_product_ids is null then
+        perform public.record_graded_price_history(array(select distinct g.product_id from graded_prices g));
+    else
+        perform public.record_graded_price_history(p_product_ids);
+    end if;
+
+    return v_count;
+end;
+$$;
+
+
+-- Latest p_max_points snapshots since p_since per (product_id, grade), oldest first:
+-- [["2026-01-31", 123.45, 42], ...] (date, market_price rounded to cents, psa_pop)
+create or replace function public.graded_price_history_series(
+    p_product_ids uuid[],
+    p_since timestamptz default now() - interval '365 days',
+    p_max_points integer default 52
+)
+returns table (product_id uuid, grade integer, points jsonb)
+language sql
+stable
+as $$
+    select h.product_id, h.grade,
+           jsonb_agg(jsonb_build_array(to_char(h.recorded_at, 'YYYY-MM-DD'),
+                                       round(h.market_price::numeric, 2),
+                                       h.psa_pop)
+                     order by h.recorded_at)
+    from (
+        select h.*, row_number() over (partition by h.product_id, h.grade order by h.recorded_at desc) as rn
+        from graded_price_history h
+        where h.product_id = any(p_product_ids)
+          and h.recorded_at >= p_since
+    ) h
+    where h.rn <= p_max_points
+    group by h.product_id, h.grade;
+$$;
+
+revoke all on function public.record_graded_price_history(uuid[], double precision) from public, anon, authenticated;
+revoke all on function public.upsert_graded_prices(jsonb, double precision) from public, anon, authenticated;
+revoke all on function public.refresh_graded_prices(uuid[]) from public, anon, authenticated;
+grant execute on function public.record_graded_price_history(uuid[], double precision) to service_role;
+grant execute on function public.upsert_graded_prices(jsonb, double precision) to service_role;
+grant execute on function public.refresh_graded_prices(uuid[]) to service_role;
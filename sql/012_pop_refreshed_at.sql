@@ -0,0 +1,9 @@
+-- When a product's /pop/item/ counts were last fetched.
+--
+-- page_fingerprint (sql/002) only covers the /game/ page, so an unchanged page
+-- would skip the pop fetch indefinitely. process_db.py refetches the pop page, and
+-- bypasses the unchanged-page skip, once this is more than POP_REFRESH_DAYS old
+-- (or null, so every product gets one full scrape after this migration).
+
+alter table products
+    add column if not exists pop_refreshed_at timestamptz;
@@ -0,0 +1,86 @@
+-- Grade 0 (Ungraded) is not priced.
+--
+-- Only the PSA grades get graded_prices rows: the exporter and app read grades
+-- 7-10, and update_product.py's original pricing loop skipped grade 0. The
+-- graded_price_aggregates from sql/010 took every non-null grade, so pricing a
+-- product through refresh_graded_prices (update_product.py, --pricing database)
+-- added grade-0 rows. Same definition as sql/010 with grade > 0; process_db.py's
+-- priceable_sales() applies the same rule on the Python side.
+
+create or replace function public.graded_price_aggregates(p_product_ids uuid[] default null)
+returns table (
+    product_id uuid,
+    grade integer,
+    ref_ts double precision,
+    sum_w double precision,
+    sum_wlog double precision,
+    sum_w_7d double precision,
+    sum_wlog_7d double precision,
+    sum_w_90d double precision,
+    sum_wlog_90d double precision,
+    sample_size integer,
+    market_price double precision,
+    market_price_7d double precision,
+    market_price_90d double precision,
+    price_trend double precision
+)
+language sql
+stable
+as $$
+    with priced as (
+        select s.product_id, s.grade, s.price::double precision as price,
+               extract(epoch from s.sale_date::timestamp)::double precision as ts
+        from graded_sales s
+        where (p_product_ids is null or s.product_id = any(p_product_ids))
+          and s.grade > 0
+          and s.price is not null
+    ),
+    referenced as (
+        select p.*,
+               greatest(0, max(p.ts) filter (where p.price > 0) over (partition by p.product_id, p.grade)) as max_ts
+        from priced p
+    ),
+    aged as (
+        select r.product_id, r.grade, r.max_ts, ln(r.price) as log_price,
+               greatest(0, (r.max_ts - r.ts) / 86400) as days_ago
+        from referenced r
+        where r.price > 0
+    ),
+    weighted as (
+        -- Exponents capped so power() can't underflow (2^-1000 is already negligible)
+        select a.product_id, a.grade, a.max_ts, a.log_price,
+               power(2::double precision, -least(a.days_ago / 21, 1000)) as w,
+               power(2::double precision, -least(a.days_ago / 7, 1000)) as w_7d,
+               power(2::double precision, -least(a.days_ago / 90, 1000)) as w_90d
+        from aged a
+    ),
+    sums as (
+        select p.product_id, p.grade,
+               coalesce(max(w.max_ts), 0) as ref_ts,
+               coalesce(sum(w.w), 0) as sum_w,
+               coalesce(sum(w.w * w.log_price), 0) as sum_wlog,
+               coalesce(sum(w.w_7d), 0) as sum_w_7d,
+               coalesce(sum(w.w_7d * w.log_price), 0) as sum_wlog_7d,
+               coalesce(sum(w.w_90d), 0) as sum_w_90d,
+               coalesce(sum(w.w_90d * w.log_price), 0) as sum_wlog_90d,
+               count(w.w)::integer as sample_size
+        from (select distinct priced.product_id, priced.grade from priced) p
+        left join weighted w on w.product_id = p.product_id and w.grade = p.grade
+        group by p.product_id, p.grade
+    )
+    select s.product_id, s.grade, s.ref_ts,
+           s.sum_w, s.sum_wlog, s.sum_w_7d, s.sum_wlog_7d, s.sum_w_90d, s.sum_wlog_90d,
+           s.sample_size,
+           case when s.sum_w > 0 then exp(s.sum_wlog / s.sum_w) * least(1, sqrt(s.sum_w)) else -1 end,
+           case when s.sum_w_7d > 0 then exp(s.sum_wlog_7d / s.sum_w_7d) * least(1, sqrt(s.sum_w_7d)) else -1 end,
+           case when s.sum_w_90d > 0 then exp(s.sum_wlog_90d / s.sum_w_90d) * least(1, sqrt(s.sum_w_90d)) else -1 end,
+           case when s.sum_w_7d > 0 and s.sum_w_90d > 0
+                then exp(s.sum_wlog_7d / s.sum_w_7d - s.sum_wlog_90d / s.sum_w_90d) - 1
+           end
+    from sums s;
+$$;
+
+-- Rows priced for grade 0 before this migration
+delete from graded_price_history where grade = 0;
+delete from graded_price_state where grade = 0;
+delete from graded_prices where grade = 0;
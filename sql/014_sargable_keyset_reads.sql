@@ -0,0 +1,100 @@
+-- Keyset reads that are index range scans.
+--
+-- stream_graded_sales (sql/009) and pricing_sales_window (sql/007) OR-ed
+-- "p_after_product_id is null" / "p_after_grade is null" with the row comparison.
+-- PostgREST passes RPC arguments through a json_to_record lateral, so those ORs are
+-- never constant-folded and can't bound an index scan: every page scanned the
+-- index from the start and sorted on price and coalesce(ebay_url, ''), which made
+-- a catalog-wide rebuild quadratic in the size of graded_sales. pricing_sales_window
+-- also re-aggregated every requested product's sales on every page.
+--
+-- Both now use a single row comparison against the cursor, with sentinels for the
+-- missing parts (grades are > 0, so grade 0 starts before every row and the
+-- largest integer skips the rest of a product), served by an index on the full
+-- ORDER BY. pricing_sales_window looks up each row's group latest sale and count
+-- with index probes, only for the groups on the page. Callers are unchanged.
+
+create index if not exists graded_sales_keyset_idx
+    on graded_sales (product_id, grade, sale_date, price, (coalesce(ebay_url, '')));
+
+-- Prefix of graded_sales_keyset_idx
+drop index if exists graded_sales_product_grade_date_idx;
+
+
+create or replace function public.stream_graded_sales(
+    p_after_product_id uuid default null,
+    p_after_grade integer default null,
+    p_after_sale_date timestamptz default null,
+    p_after_price numeric default null,
+    p_after_ebay_url text default null,
+    p_limit integer default 1000
+)
+returns table (product_id uuid, grade integer, sale_date date, price numeric, ebay_url text)
+language sql
+stable
+as $$
+    select s.product_id, s.grade, s.sale_date::date, s.price, coalesce(s.ebay_url, '')
+    from graded_sales s
+    where s.grade > 0
+      and s.price is not null
+      -- No cursor: (nil uuid, 0) precedes every row. Only p_after_product_id: grade
+      -- 2147483647 skips the rest of that product. The remaining columns only matter
+      -- for a full cursor.
+      and (s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, ''))
+          > (coalesce(p_after_product_id, '00000000-0000-0000-0000-000000000000'::uuid),
+             coalesce(p_after_grade, case when p_after_product_id is null then 0 else 2147483647 end),
+             p_after_sale_date, p_after_price, p_after_ebay_url)
+    order by s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, '')
+    limit p_limit;
+$$;
+
+
+create or replace function public.pricing_sales_window(
+    p_product_ids uuid[],
+    p_horizon_days integer,
+    p_after_product_id uuid default null,
+    p_after_grade integer default null,
+    p_after_sale_date timestamptz default null,
+    p_after_price numeric default null,
+    p_after_ebay_url text default null,
+    p_limit integer default 1000
+)
+returns table (product_id uuid, grade integer, sale_date date, price numeric, ebay_url text, group_sales integer)
+language sql
+stable
+as $$
+    with page as (
+        select s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, '') as ebay_url
+        from graded_sales s
+        where s.product_id = any(p_product_ids)
+          -- Upper bound so the range scan stops after the last requested product
+          and s.product_id <= (select max(id) from unnest(p_product_ids) as id)
+          and s.grade > 0
+          and s.price is not null
+          and (s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, ''))
+              > (coalesce(p_after_product_id, '00000000-0000-0000-0000-000000000000'::uuid),
+                 coalesce(p_after_grade, 0),
+                 p_after_sale_date, p_after_price, p_after_ebay_url)
+          -- Inside the horizon of the group's latest priced sale (all rows if it has none)
+          and s.sale_date >= coalesce(
+              (select max(l.sale_date) from graded_sales l
+               where l.product_id = s.product_id and l.grade = s.grade and l.price > 0)
+              - make_interval(days => p_horizon_days),
+              s.sale_date)
+        order by s.product_id, s.grade, s.sale_date, s.price, coalesce(s.ebay_url, '')
+        limit p_limit
+    ),
+    groups as (
+        select d.product_id, d.grade,
+               (select count(*) from graded_sales c
+                where c.product_id = d.product_id and c.grade = d.grade and c.price > 0)::integer as group_sales
+        from (select distinct page.product_id, page.grade from page) d
+    )
+    select p.product_id, p.grade, p.sale_date::date, p.price, p.ebay_url, g.group_sales
+    from page p
+    join groups g on g.product_id = p.product_id and g.grade = p.grade
+    order by p.product_id, p.grade, p.sale_date, p.price, p.ebay_url;
+$$;
+
+revoke all on function public.stream_graded_sales(uuid, integer, timestamptz, numeric, text, integer) from public, anon, authenticated;
+grant execute on function public.stream_graded_sales(uuid, integer, timestamptz, numeric, text, integer) to service_role;
@@ -0,0 +1,134 @@
+-- graded_price_history snapshots for the whole catalog without an id array.
+--
+-- refresh_graded_prices(null) used to hand every product id in graded_prices to
+-- record_graded_price_history as one array for "= any(...)". A null p_product_ids
+-- now means every graded_prices row, scanned without an id filter. Both paths
+-- share the change test (graded_price_changed).
+--
+-- backfill_psa_pop.py also calls record_graded_price_history after each page of
+-- psa_pop updates, so every graded_prices writer listed in sql/011 (plus the
+-- backfill) snapshots.
+
+create or replace function public.graded_price_changed(
+    p_price double precision,
+    p_last_price double precision,
+    p_pop integer,
+    p_last_pop integer,
+    p_threshold double precision
+)
+returns boolean
+language sql
+immutable
+as $$
+    select (p_price is distinct from p_last_price
+            and (p_price is null or p_last_price is null
+                 or p_price <= 0 or p_last_price <= 0
+                 or abs(p_price / p_last_price - 1) > p_threshold))
+        or (p_pop is distinct from p_last_pop
+            and (p_pop is null or p_last_pop is null
+                 or abs(p_pop - p_last_pop) > p_threshold * greatest(p_last_pop, 1)));
+$$;
+
+
+-- Same as sql/011; a null p_product_ids snapshots every graded_prices row
+create or replace function public.record_graded_price_history(
+    p_product_ids uuid[],
+    p_threshold double precision default 0.02
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    if p_product_ids is null then
+        insert into graded_price_history (product_id, grade, market_price, psa_pop)
+        select g.product_id, g.grade, g.market_price, g.psa_pop
+        from graded_prices g
+        left join lateral (
+            select h.recorded_at, h.market_price, h.psa_pop
+            from graded_price_history h
+            where h.product_id = g.product_id and h.grade = g.grade
+            order by h.recorded_at desc
+            limit 1
+        ) last on true
+        where last.recorded_at is null
+           or public.graded_price_changed(g.market_price, last.market_price, g.psa_pop, last.psa_pop, p_threshold)
+        on conflict do nothing;
+    else
+        insert into graded_price_history (product_id, grade, market_price, psa_pop)
+        select g.product_id, g.grade, g.market_price, g.psa_pop
+        from graded_prices g
+        left join lateral (
+            select h.recorded_at, h.market_price, h.psa_pop
+            from graded_price_history h
+            where h.product_id = g.product_id and h.grade = g.grade
+            order by h.recorded_at desc
+            limit 1
+        ) last on true
+        where g.product_id = any(p_product_ids)
+          and (last.recorded_at is null
+               or public.graded_price_changed(g.market_price, last.market_price, g.psa_pop, last.psa_pop, p_threshold))
+        on conflict do nothing;
+    end if;
+
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+
+-- Same as sql/011, passing p_product_ids (null = whole catalog) straight through
+create or replace function public.refresh_graded_prices(p_product_ids uuid[] default null)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    with aggregates as (
+        select * from public.graded_price_aggregates(p_product_ids)
+    ),
+    state as (
+        insert into graded_price_state (product_id, grade, ref_ts, sum_w, sum_wlog, sum_w_7d, sum_wlog_7d,
+                                        sum_w_90d, sum_wlog_90d, sample_size, updated_at)
+        select a.product_id, a.grade, a.ref_ts, a.sum_w, a.sum_wlog, a.sum_w_7d, a.sum_wlog_7d,
+               a.sum_w_90d, a.sum_wlog_90d, a.sample_size, now()
+        from aggregates a
+        on conflict (product_id, grade) do update
+            set ref_ts = excluded.ref_ts,
+                sum_w = excluded.sum_w,
+                sum_wlog = excluded.sum_wlog,
+                sum_w_7d = excluded.sum_w_7d,
+                sum_wlog_7d = excluded.sum_wlog_7d,
+                sum_w_90d = excluded.sum_w_90d,
+                sum_wlog_90d = excluded.sum_wlog_90d,
+                sample_size = excluded.sample_size,
+                updated_at = excluded.updated_at
+    )
+    -- psa_pop is left out of the column list, so existing pop counts survive
+    insert into graded_prices (product_id, grade, market_price, market_price_7d, market_price_90d,
+                               price_trend, sample_size, last_updated)
+    select a.product_id, a.grade, a.market_price, a.market_price_7d, a.market_price_90d,
+           a.price_trend, a.sample_size, now()
+    from aggregates a
+    on conflict (product_id, grade) do update
+        set market_price = excluded.market_price,
+            market_price_7d = excluded.market_price_7d,
+            market_price_90d = excluded.market_price_90d,
+            price_trend = excluded.price_trend,
+            sample_size = excluded.sample_size,
+            last_updated = excluded.last_updated;
+
+    get diagnostics v_count = row_count;
+
+    perform public.record_graded_price_history(p_product_ids);
+
+    return v_count;
+end;
+$$;
+
+revoke all on function public.record_graded_price_history(uuid[], double precision) from public, anon, authenticated;
+revoke all on function public.refresh_graded_prices(uuid[]) from public, anon, authenticated;
+grant execute on function public.record_graded_price_history(uuid[], double precision) to service_role;
+grant execute on function public.refresh_graded_prices(uuid[]) to service_role;
@@ -18,8 +18,8 @@ import argparse
 import logging
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import requests
 from bs4 import BeautifulSoup
+import http_client
 
 # Load environment variables from .env file
 load_dotenv()
@@ -69,15 +69,12 @@ GAME_CONFIGS = {
 
 
 def fetch_page(url):
-    """Fetch HTML content from the given URL."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
+    """Fetch HTML content through the shared client (pooled, rate-limited, retried)."""
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = http_client.get(url)
         response.raise_for_status()
         return response.text
-    except requests.RequestException as e:
+    except Exception as e:
         logger.error(f"Error fetching URL {url}: {e}")
         return None
 
@@ -1,7 +1,10 @@
 import os
+import math
 from collections import defaultdict
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from supabase import create_client
+from scrape_helpers import parse_timestamp
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,6 +23,18 @@ LOG_PREFIX_COLLISION = "[URL_COLLISION]"
 LOG_PREFIX_EXCLUDED = "[EXCLUDED]"
 
 
+# Scrape priority (see priority_score): higher-priority products are claimed first
+VELOCITY_WINDOW_DAYS = 30   # graded_sales window for sales velocity
+SCRAPE_CYCLE_DAYS = 5       # scrape_grades.yml runs every 5 days
+MAX_STALE_DAYS = 30         # staleness stops growing after this (and for never-scraped products)
+PRIORITY_WEIGHTS = {
+    "value": 1.0,           # per power of ten of market_price ($15 -> 1.2, $2,000 -> 3.3)
+    "velocity": 1.0,        # per e-fold of recent sales (log1p)
+    "staleness": 0.5,       # per scrape cycle since last scrape
+    "new_sales": 0.5,       # last scrape found new sales (or never scraped)
+}
+
+
 GAME_CATEGORY_IDS = {
     "pokemon":   None,  # NULL in DB = English Pokemon
     "magic":     1,
@@ -94,7 +109,8 @@ def fetch_all_eligible_products(game=None):
         while True:
             query = (
                 supabase.table("products")
-                .select("id, name, pricecharting_url, variant_key, market_price, rarity, number")
+                .select("id, name, pricecharting_url, variant_key, market_price, rarity, number, "
+                        "last_scraped_at, last_scrape_new_sales")
                 .gte("market_price", 15)
                 .order("id", desc=False)
                 .limit(limit)
@@ -185,6 +201,64 @@ def detect_url_collisions(products):
     return clean_products, collisions
 
 
+def fetch_sales_velocity(product_ids, days=VELOCITY_WINDOW_DAYS):
+    """Return {product_id: graded sales in the last `days` days} (missing = 0)."""
+    print(f"\n📈 Fetching {days}-day sales velocity for {len(product_ids):,} products...")
+    velocity = {}
+    for i in range(0, len(product_ids), 500):
+        try:
+            response = supabase.rpc("recent_sales_counts", {
+                "p_product_ids": product_ids[i:i + 500],
+                "p_days": days,
+            }).execute()
+        except Exception as e:
+            print(f"   ⚠️  Error fetching sales velocity batch {i}-{i+500}: {e}")
+            continue
+        for row in response.data or []:
+            velocity[row["product_id"]] = row["sales"]
+    print(f"   ✅ {len(velocity):,} products had sales in the last {days} days")
+    return velocity
+
+
+def priority_score(market_price, recent_sales, last_scraped_at, last_scrape_new_sales, now=None):
+    """
+    Scrape priority: a weighted sum of log value, log sales velocity, scrape cycles
+    since the last scrape and whether the last scrape found anything new.
+    """
+    now = now or datetime.now(timezone.utc)
+
+    if last_scraped_at:
+        scraped = parse_timestamp(last_scraped_at)
+        stale_days = min(MAX_STALE_DAYS, max(0.0, (now - scraped).total_seconds() / 86400))
+    else:
+        stale_days = MAX_STALE_DAYS
+
+    productive = last_scrape_new_sales is None or last_scrape_new_sales > 0
+
+    return (
+        PRIORITY_WEIGHTS["value"] * math.log10(max(float(market_price or 0), 1.0))
+        + PRIORITY_WEIGHTS["velocity"] * math.log1p(recent_sales or 0)
+        + PRIORITY_WEIGHTS["staleness"] * stale_days / SCRAPE_CYCLE_DAYS
+        + PRIORITY_WEIGHTS["new_sales"] * (1.0 if productive else 0.0)
+    )
+
+
+def compute_priorities(products):
+    """Return {product_id: priority_score} for the products being queued."""
+    velocity = fetch_sales_velocity([p["id"] for p in products])
+    now = datetime.now(timezone.utc)
+    return {
+        p["id"]: round(priority_score(
+            p.get("market_price"),
+            velocity.get(p["id"], 0),
+            p.get("last_scraped_at"),
+            p.get("last_scrape_new_sales"),
+            now=now,
+        ), 4)
+        for p in products
+    }
+
+
 def sync_progress_table(clean_products):
     """
     Sync the product_grade_progress table with clean products only.
@@ -195,6 +269,7 @@ def sync_progress_table(clean_products):
     print(f"\n📝 Syncing product_grade_progress table...")
     
     clean_ids = [p["id"] for p in clean_products]
+    priorities = compute_priorities(clean_products)
 
     # Step 1: Delete ALL existing rows
     print("   🗑️  Wiping all existing progress records...")
@@ -251,7 +326,7 @@ def sync_progress_table(clean_products):
     success_count = 0
     for i in range(0, len(clean_ids), 100):
         batch = clean_ids[i:i + 100]
-        rows = [{"product_id": pid, "completed": False} for pid in batch]
+        rows = [{"product_id": pid, "completed": False, "priority": priorities[pid]} for pid in batch]
         try:
             supabase.table("product_grade_progress").upsert(rows, on_conflict="product_id").execute()
             success_count += len(batch)
@@ -301,6 +376,8 @@ def main():
     1. Cursor-based pagination to fetch ALL eligible products
     2. URL collision detection - products sharing same pricecharting_url are excluded
     3. Only clean products are synced to product_grade_progress with completed=false
+    4. Each queued product gets a priority (value, sales velocity, staleness, last
+       scrape yield); process_db claims the highest priorities first
     """
     import argparse
     
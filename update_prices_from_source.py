@@ -20,6 +20,7 @@ import json
 import re
 from dotenv import load_dotenv
 from supabase import create_client
+from bulk_writes import bulk_update
 
 load_dotenv()
 
@@ -125,7 +126,7 @@ def update_prices():
 
     # Update prices in batches
     print("\n🔄 Updating prices...")
-    batch_size = 100
+    batch_size = 1000
     updates = []
 
     for product in all_products:
@@ -160,10 +161,7 @@ def update_prices():
             batch = updates[i:i + batch_size]
 
             try:
-                for update in batch:
-                    supabase.table("products").update({
-                        'market_price': update['market_price']
-                    }).eq('variant_key', update['variant_key']).execute()
+                bulk_update(supabase, "products", batch, key_columns=("variant_key",))
 
                 products_updated += len(batch)
                 print(f"   Updated {products_updated}/{len(updates)} products...")
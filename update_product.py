@@ -1,10 +1,8 @@
 import os
 import sys
 import argparse
-import math
 import re
 from datetime import datetime
-from collections import defaultdict
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -19,7 +17,7 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     sys.exit(1)
 
 from supabase import create_client, Client
-from main import scrape_pricecharting, parse_sales_for_grade, parse_pop_report, fetch
+from main import scrape_pricecharting, extract_product_page, fetch_tree, GRADE_TABS
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
@@ -131,41 +129,19 @@ def scrape_and_save(product, verbose=True):
             if verbose:
                 print(f"   Using existing URL: {pricecharting_url}")
             
-            soup = fetch(pricecharting_url)
+            tree = fetch_tree(pricecharting_url)
             result = {
                 "product_url": pricecharting_url,
                 "grades": {},
                 "pop_report": {}
             }
 
-            # Grade mapping
-            grade_tabs = {
-                "completed-auctions-used": "Ungraded",  # Raw/ungraded sales
-                "completed-auctions-grade-twenty": "BGS 10 Black Label",
-                "completed-auctions-grade-nineteen": "CGC 10 Pristine",
-                "completed-auctions-manual-only": "PSA 10",
-                "completed-auctions-loose-and-box": "BGS 10",
-                "completed-auctions-grade-seventeen": "CGC 10",
-                "completed-auctions-grade-eighteen": "SGC 10",
-                "completed-auctions-grade-twenty-one": "TAG 10",
-                "completed-auctions-grade-twenty-two": "ACE 10",
-                "completed-auctions-box-only": "PSA 9.5",
-                "completed-auctions-graded": "PSA 9",
-                "completed-auctions-new": "PSA 8",
-                "completed-auctions-cib": "PSA 7",
-                "completed-auctions-grade-six": "PSA 6",
-                "completed-auctions-grade-five": "PSA 5",
-                "completed-auctions-grade-four": "PSA 4",
-                "completed-auctions-grade-three": "PSA 3",
-                "completed-auctions-box-and-manual": "PSA 2",
-                "completed-auctions-loose-and-manual": "PSA 1"
-            }
-
-            for css_class, grade_label in grade_tabs.items():
-                sales = parse_sales_for_grade(pricecharting_url, css_class, soup=soup)
-                result["grades"][grade_label] = sales
+            # Single pass over the page for every grade tab and the POP table
+            page = extract_product_page(tree)
+            for css_class, grade_label in GRADE_TABS.items():
+                result["grades"][grade_label] = page["sales"].get(css_class, [])
 
-            result["pop_report"] = parse_pop_report(pricecharting_url, soup=soup)
+            result["pop_report"] = page["pop_report"]
 
         else:
             # Search
@@ -198,116 +174,37 @@ def scrape_and_save(product, verbose=True):
 
 
 # ==========================================
-# PRICING LOGIC (from backfill_graded_prices.ts)
+# PRICING LOGIC (refresh_graded_prices, sql/008_graded_price_functions.sql)
 # ==========================================
 
-def calculate_market_price(sales, half_life=21):
-    """
-    Calculate the market price using liquidity-aware formula.
-    """
-    if not sales:
-        return {"price": -1, "sample_size": 0, "effective_liquidity": 0, "liquidity_factor": 0}
-
-    parsed_sales = []
-    max_timestamp = 0
-    
-    for sale in sales:
-        try:
-            dt = datetime.fromisoformat(sale['sale_date'])
-            ts = dt.timestamp()
-            if ts > max_timestamp:
-                max_timestamp = ts
-            parsed_sales.append({"sale": sale, "ts": ts})
-        except Exception:
-            continue
-            
-    if not parsed_sales:
-        return {"price": -1, "sample_size": 0, "effective_liquidity": 0, "liquidity_factor": 0}
-
-    sales_with_weights = []
-    for item in parsed_sales:
-        sale = item["sale"]
-        ts = item["ts"]
-        days_since = (max_timestamp - ts) / (24 * 60 * 60)
-        safe_days_since = max(0, days_since)
-        weight = math.pow(2, -safe_days_since / half_life)
-        sales_with_weights.append({"sale": sale, "weight": weight})
-
-    sum_weights = sum(item["weight"] for item in sales_with_weights)
-    
-    if sum_weights == 0:
-        return {"price": -1, "sample_size": len(sales), "effective_liquidity": 0, "liquidity_factor": 0}
-
-    weighted_log_sum = sum(item["weight"] * math.log(item["sale"]["price"]) for item in sales_with_weights)
-    fair_price = math.exp(weighted_log_sum / sum_weights)
-    effective_liquidity = sum_weights
-    liquidity_factor = min(1, math.sqrt(effective_liquidity))
-    market_value = fair_price * liquidity_factor
-    
-    return {
-        "price": market_value,
-        "sample_size": len(sales),
-        "effective_liquidity": effective_liquidity,
-        "liquidity_factor": liquidity_factor
-    }
-
 def update_graded_prices(product_id):
     """
-    Fetch sales, calculate prices, and upsert to graded_prices.
+    Recompute graded_prices for the product inside Postgres and mark it completed.
     """
     print(f"\n🧮 Calculating graded prices...")
-    
-    # Fetch all sales
-    all_sales = []
-    page = 0
-    while True:
-        try:
-            r = supabase.table("graded_sales").select("*").eq("product_id", product_id).range(page*1000, (page+1)*1000-1).execute()
-            if not r.data: break
-            all_sales.extend(r.data)
-            if len(r.data) < 1000: break
-            page += 1
-        except Exception as e:
-            print(f"❌ Error fetching sales: {e}")
-            return False
-
-    if not all_sales:
+
+    try:
+        written = supabase.rpc("refresh_graded_prices", {"p_product_ids": [product_id]}).execute().data
+    except Exception as e:
+        print(f"❌ Error updating prices: {e}")
+        return False
+
+    if not written:
         print("   ⚠️ No sales to calculate.")
         return True
 
-    # Group by grade
-    grade_sales_map = defaultdict(list)
-    for sale in all_sales:
-        if sale.get("grade"):
-            grade_sales_map[sale.get("grade")].append(sale)
-
-    # Calculate
-    all_prices = []
-    for grade, group in grade_sales_map.items():
-        res = calculate_market_price(group)
-        all_prices.append({
-            "product_id": product_id,
-            "grade": grade,
-            "market_price": res["price"],
-            "sample_size": res["sample_size"],
-            "last_updated": datetime.now().isoformat()
-        })
-
-    # Upsert
-    if all_prices:
-        try:
-            supabase.table("graded_prices").upsert(all_prices, on_conflict="product_id,grade").execute()
-            print(f"   ✅ Updated prices for {len(all_prices)} grades")
-            
-            supabase.table("product_grade_progress").update({
-                "completed": True,
-                "updated_at": datetime.now().isoformat()
-            }).eq("product_id", product_id).execute()
-            
-        except Exception as e:
-            print(f"❌ Error updating prices: {e}")
-            return False
-            
+    print(f"   ✅ Updated prices for {written} grades")
+    try:
+        supabase.table("product_grade_progress").update({
+            "completed": True,
+            "updated_at": datetime.now().isoformat(),
+            "lease_owner": None,
+            "lease_expires_at": None
+        }).eq("product_id", product_id).execute()
+    except Exception as e:
+        print(f"❌ Error updating progress: {e}")
+        return False
+
     return True
 
 # ==========================================